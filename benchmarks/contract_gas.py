@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sys
+
+from web3 import Web3, EthereumTesterProvider
+
+# Gas per 1,000 anchored hashes on a local py-evm (eth-tester) chain:
+#
+#   v1  addRecord(string)     one tx per hash, hex string in storage (old contract)
+#   v2  addRecord(bytes32)    one tx per hash, packed 2-slot record
+#   v2  addRecords(bytes32[]) CHUNK hashes per tx
+#
+# plus the eth_call cost of reading the history back whole vs one page.
+#
+#   python benchmarks/contract_gas.py [--readings 1000] [--chunk 100]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The pre-bytes32 contract, kept as source (the baseline HealthContract.sol) and compiled on demand
+LEGACY_SOURCE = os.path.join(ROOT, "benchmarks", "HealthRecord_v1_string.sol")
+CURRENT_ARTIFACT = os.path.join(ROOT, "blockchain", "artifacts", "HealthRecord.json")
+SOURCE = os.path.join(ROOT, "blockchain", "HealthContract.sol")
+PAGE_SIZE = 100
+
+def load_artifact(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def compile_source(path):
+    """Compiles the HealthRecord contract in `path` with solc 0.8.19 (same settings as blockchain/compile.py)."""
+    try:
+        from solcx import compile_standard, install_solc
+        install_solc("0.8.19")
+        with open(path, "r") as f:
+            source = f.read()
+        compiled = compile_standard({
+            "language": "Solidity",
+            "sources": {"HealthContract.sol": {"content": source}},
+            "settings": {"outputSelection": {"*": {"*": ["abi", "evm.bytecode"]}}},
+        }, solc_version="0.8.19")
+    except Exception as e:
+        print(f"❌ Compiling {path} failed ({e}).")
+        sys.exit(1)
+    out = compiled["contracts"]["HealthContract.sol"]["HealthRecord"]
+    return {"abi": out["abi"], "bytecode": out["evm"]["bytecode"]["object"]}
+
+def current_artifact():
+    """The compiled artifact if it already has addRecords, otherwise compile the source."""
+    artifact = load_artifact(CURRENT_ARTIFACT)
+    if any(item.get("name") == "addRecords" for item in artifact["abi"]):
+        return artifact
+    print(f"⚠️ {CURRENT_ARTIFACT} is out of date, run 'python blockchain/compile.py'. Compiling the source...")
+    return compile_source(SOURCE)
+
+def deploy(w3, artifact, account):
+    tx = w3.eth.contract(abi=artifact["abi"], bytecode=artifact["bytecode"]).constructor().transact({"from": account})
+    address = w3.eth.get_transaction_receipt(tx).contractAddress
+    return w3.eth.contract(address=address, abi=artifact["abi"])
+
+def send(w3, call, account) -> int:
+    tx = call.transact({"from": account, "gas": 30_000_000})
+    return w3.eth.get_transaction_receipt(tx).gasUsed
+
+def hashes(n):
+    return [hashlib.sha256(str(i).encode()).digest() for i in range(n)]
+
+def run(readings: int, chunk: int):
+    w3 = Web3(EthereumTesterProvider())
+    patient = w3.eth.accounts[0]
+    roots = hashes(readings)
+    flags = [i % 10 == 0 for i in range(readings)]
+    results = []
+
+    # v1: string storage, one tx per hash
+    v1 = deploy(w3, compile_source(LEGACY_SOURCE), patient)
+    gas = sum(send(w3, v1.functions.addRecord(patient, r.hex(), c), patient) for r, c in zip(roots, flags))
+    read = v1.functions.getRecords(patient).estimate_gas({"from": patient})
+    results.append(("v1 addRecord(string)", readings, gas, read, None))
+
+    artifact = current_artifact()
+
+    # v2: bytes32 storage, one tx per hash
+    v2 = deploy(w3, artifact, patient)
+    gas = sum(send(w3, v2.functions.addRecord(patient, r, c), patient) for r, c in zip(roots, flags))
+    read = v2.functions.getRecords(patient).estimate_gas({"from": patient})
+    page = v2.functions.getRecordsPage(patient, 0, PAGE_SIZE).estimate_gas({"from": patient})
+    results.append(("v2 addRecord(bytes32)", readings, gas, read, page))
+
+    # v2: batched
+    v2 = deploy(w3, artifact, patient)
+    gas = 0
+    txs = 0
+    for i in range(0, readings, chunk):
+        gas += send(w3, v2.functions.addRecords(patient, roots[i:i + chunk], flags[i:i + chunk]), patient)
+        txs += 1
+    assert v2.functions.getRecordCount(patient).call({"from": patient}) == readings
+    read = v2.functions.getRecords(patient).estimate_gas({"from": patient})
+    page = v2.functions.getRecordsPage(patient, 0, PAGE_SIZE).estimate_gas({"from": patient})
+    results.append((f"v2 addRecords(x{chunk})", txs, gas, read, page))
+
+    baseline = results[0][2]
+    print(f"\n⛽ Gas for {readings} anchored hashes (py-evm)\n")
+    print(f"{'path':<24}{'txs':>6}{'write gas':>14}{'per hash':>10}{'vs v1':>8}"
+          f"{'getRecords':>13}{f'page({PAGE_SIZE})':>12}")
+    for name, txs, gas, read, page in results:
+        page = f"{page:,}" if page is not None else "-"
+        print(f"{name:<24}{txs:>6}{gas:>14,}{gas // readings:>10,}{baseline / gas:>7.2f}x{read:>13,}{page:>12}")
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    readings = int(args[args.index("--readings") + 1]) if "--readings" in args else 1000
+    chunk = int(args[args.index("--chunk") + 1]) if "--chunk" in args else 100
+    run(readings, chunk)
@@ -0,0 +1,388 @@
+import argparse
+import glob
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from eth_account import Account
+
+# End-to-end ingest benchmark.
+#
+#   1. an eth-tester (py-evm) chain behind a local JSON-RPC endpoint, HealthRecord deployed
+#   2. the FastAPI backend (uvicorn subprocess) on a fresh SQLite file, anchoring to that chain
+#   3. N patients, then vitals batches at a target rate/concurrency from one of
+#        synthetic         random readings, --batch-size per request
+#        batch_*.json      gateway batch files, timestamps shifted to now on every pass
+#        *.jsonl           recorded requests, one {"method", "path", "body"} per line
+#                          ("{patient_id}" in the path is filled in; other lines are skipped)
+#      mixed with vitals reads (--read-ratio)
+#   4. waits until every queued anchor is settled, then sums gas over the successful receipts
+#
+# Bench patients authorize the hospital on-chain, so every anchor must end up confirmed.
+# A reverted transaction or an unconfirmed anchor marks the summary "valid": false and
+# the run exits 1: its gas figure is not comparable across commits.
+#
+# The JSON summary (stdout and --out) is meant to be diffed across commits:
+#
+#   python benchmarks/ingest.py --duration 30 --rate 50 --concurrency 8
+#   python benchmarks/ingest.py --source 'batch_*.json' --compare benchmarks/results/<old>.json
+#
+# Sync vs async database path (EMR_ASYNC_DB) under the same concurrent ingest:
+#
+#   python benchmarks/ingest.py --db-mode sync --concurrency 32 --out sync.json
+#   python benchmarks/ingest.py --db-mode async --concurrency 32 --compare sync.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "emr_platform", "backend")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# --- 1. Local chain: shared with the backend tests ----------------------------
+sys.path.insert(0, os.path.join(BACKEND_DIR, "tests"))
+from local_chain import LocalChain, free_port
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 3),
+        "p50_ms": round(1000 * pick(0.50), 3),
+        "p95_ms": round(1000 * pick(0.95), 3),
+        "p99_ms": round(1000 * pick(0.99), 3),
+        "max_ms": round(1000 * ordered[-1], 3),
+    }
+
+# --- 2. Backend -------------------------------------------------------------
+
+class Backend:
+    def __init__(self, chain: LocalChain, workdir: str, indexer: bool, db_mode: str = "sync"):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.db_path = os.path.join(workdir, "bench.db")
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{self.db_path}",
+            GANACHE_URL=chain.url,
+            CONTRACT_ADDRESS=chain.contract_address,
+            HOSPITAL_PRIVATE_KEY=chain.hospital_key,
+            CHAIN_INDEXER_ENABLED="1" if indexer else "0",
+            EMR_ASYNC_DB="1" if db_mode == "async" else "0",
+            ANCHOR_POLL_INTERVAL="0.2",
+        )
+        self.log = open(os.path.join(workdir, "backend.log"), "w")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"backend exited, see {self.log.name}")
+            try:
+                if requests.get(self.url + "/", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("backend did not start within 60s")
+
+    def anchor_counts(self) -> dict:
+        """Outbox rows per status; pending rows that already failed once are reported as `retrying`."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            return dict(conn.execute(
+                "SELECT CASE WHEN status = 'pending' AND attempts > 0 THEN 'retrying' ELSE status END, COUNT(*) "
+                "FROM anchor_outbox GROUP BY 1"
+            ).fetchall())
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+# --- 3. Workloads -----------------------------------------------------------
+
+def synthetic_source(batch_size: int):
+    def batches():
+        while True:
+            now = time.time()
+            yield [
+                {"bpm": random.randint(55, 160), "spo2": random.randint(86, 100), "timestamp": now + i / 1000}
+                for i in range(batch_size)
+            ]
+    return batches
+
+def batch_file_source(paths):
+    files = []
+    for path in paths:
+        with open(path, "r") as f:
+            files.append(json.load(f))
+    if not files:
+        raise SystemExit("no batch files matched")
+
+    def batches():
+        while True:
+            for readings in files:
+                shift = time.time() - min(r["timestamp"] for r in readings)
+                yield [
+                    {"bpm": int(r["bpm"]), "spo2": int(r["spo2"]), "timestamp": r["timestamp"] + shift}
+                    for r in readings
+                ]
+    return batches
+
+def jsonl_source(path):
+    recorded = []
+    skipped = 0
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if isinstance(item, dict) and "method" in item and "path" in item:
+                recorded.append(item)
+            else:
+                skipped += 1
+    if not recorded:
+        raise SystemExit(f"{path}: no recorded requests ({skipped} lines skipped)")
+    return recorded, skipped
+
+class LoadDriver:
+    def __init__(self, api: str, patient_ids, concurrency: int, rate: float, read_ratio: float):
+        self.api = api
+        self.patient_ids = patient_ids
+        self.concurrency = concurrency
+        self.rate = rate
+        self.read_ratio = read_ratio
+        self.latency = {"ingest": [], "read": [], "recorded": []}
+        self.errors = {"ingest": 0, "read": 0, "recorded": 0}
+        self.readings = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _timed(self, kind, method, path, body=None, readings=0):
+        started = time.perf_counter()
+        try:
+            resp = self._session().request(method, self.api + path, json=body, timeout=30)
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latency[kind].append(elapsed)
+            if ok:
+                self.readings += readings
+            else:
+                self.errors[kind] += 1
+
+    def _op(self, n, next_batch, recorded):
+        patient_id = self.patient_ids[n % len(self.patient_ids)]
+        if recorded:
+            item = recorded[n % len(recorded)]
+            path = item["path"].replace("{patient_id}", str(patient_id))
+            self._timed("recorded", item["method"].upper(), path, item.get("body"))
+        elif random.random() < self.read_ratio:
+            self._timed("read", "GET", f"/patients/{patient_id}/vitals/?order=desc&limit=100")
+        else:
+            batch = next_batch()
+            payload = [dict(r, is_critical=r["bpm"] > 140) for r in batch]
+            self._timed("ingest", "POST", f"/patients/{patient_id}/vitals/batch", payload, readings=len(payload))
+
+    def run(self, duration: float, batches=None, recorded=None) -> float:
+        """Open-loop at `rate` ops/s (0 = as fast as `concurrency` allows). Returns elapsed seconds."""
+        batch_lock = threading.Lock()
+        gen = batches() if batches else None
+
+        def next_batch():
+            with batch_lock:
+                return next(gen)
+
+        started = time.perf_counter()
+        n = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            inflight = threading.BoundedSemaphore(self.concurrency * 4)
+            while time.perf_counter() - started < duration:
+                if self.rate:
+                    due = started + n / self.rate
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                inflight.acquire()
+                future = pool.submit(self._op, n, next_batch, recorded)
+                future.add_done_callback(lambda _: inflight.release())
+                n += 1
+        return time.perf_counter() - started
+
+# --- 4. Report --------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+UNSETTLED = ("pending", "retrying", "sent")
+
+def wait_for_anchors(backend: Backend, timeout: float) -> dict:
+    """Waits until every anchor is settled (confirmed, external or failed), retries included."""
+    deadline = time.time() + timeout
+    counts = backend.anchor_counts()
+    while time.time() < deadline and any(counts.get(s, 0) for s in UNSETTLED):
+        time.sleep(0.5)
+        counts = backend.anchor_counts()
+    return counts
+
+def invalid_reasons(gas: dict, anchors: dict) -> list:
+    reasons = []
+    if gas["reverted"]:
+        reasons.append(f"{gas['reverted']} transactions reverted")
+    unconfirmed = {status: n for status, n in anchors.items() if status not in ("confirmed", "external")}
+    if unconfirmed:
+        reasons.append(f"anchors not confirmed: {unconfirmed}")
+    return reasons
+
+def compare(summary: dict, baseline_path: str):
+    with open(baseline_path, "r") as f:
+        base = json.load(f)
+    rows = [
+        ("ingest readings/s", ("ingest", "readings_per_sec")),
+        ("ingest p95 ms", ("ingest", "latency", "p95_ms")),
+        ("ingest p99 ms", ("ingest", "latency", "p99_ms")),
+        ("read p95 ms", ("reads", "latency", "p95_ms")),
+        ("gas per reading", ("chain", "gas_per_reading")),
+    ]
+    mode = lambda s: (s.get("config") or {}).get("db_mode", "sync")
+    print(f"\n📊 vs {base.get('commit')} [{mode(base)} db] ({baseline_path}) -> [{mode(summary)} db]")
+    for name, s in (("baseline", base), ("this run", summary)):
+        if not s.get("valid", False):
+            print(f"   ⚠️ {name} is not a valid run ({'; '.join(s.get('invalid_reasons') or ['no validity check'])}), gas is not comparable")
+    for label, keys in rows:
+        old, new = base, summary
+        for k in keys:
+            old = (old or {}).get(k)
+            new = (new or {}).get(k)
+        if old and new is not None:
+            print(f"   {label:<20} {old:>12} -> {new:>12}  ({new / old:.2f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end vitals ingest benchmark")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--rate", type=float, default=0, help="target requests/s (0 = unthrottled)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--patients", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=50, help="readings per synthetic batch")
+    parser.add_argument("--read-ratio", type=float, default=0.2, help="share of requests that are vitals reads")
+    parser.add_argument("--source", default="synthetic", help="'synthetic', a batch_*.json glob or a .jsonl recording")
+    parser.add_argument("--indexer", action="store_true", help="run the chain indexer in the backend")
+    parser.add_argument("--db-mode", choices=("sync", "async"), default="sync", help="backend database path (EMR_ASYNC_DB)")
+    parser.add_argument("--anchor-timeout", type=float, default=60, help="seconds to wait for the anchor outbox")
+    parser.add_argument("--out", help="summary path (default benchmarks/results/ingest-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="previous summary to diff against")
+    args = parser.parse_args()
+
+    batches, recorded, skipped = None, None, 0
+    if args.source == "synthetic":
+        batches = synthetic_source(args.batch_size)
+    elif args.source.endswith(".jsonl"):
+        recorded, skipped = jsonl_source(args.source)
+    else:
+        batches = batch_file_source(sorted(glob.glob(args.source)))
+
+    workdir = tempfile.mkdtemp(prefix="care-bench-")
+    chain = LocalChain()
+    backend = Backend(chain, workdir, args.indexer, args.db_mode)
+    print(f"⛓️ chain {chain.url}  🏥 backend {backend.url}  📁 {workdir}")
+    try:
+        api = backend.url + "/api/v1"
+        patient_ids = []
+        for i in range(args.patients):
+            patient = Account.create()
+            chain.authorize_hospital(patient) # else every anchor is rejected by onlyAuthorized
+            resp = requests.post(api + "/patients/", json={
+                "name": f"Bench Patient {i}", "age": 30 + i % 50, "wallet_address": patient.address
+            })
+            resp.raise_for_status()
+            patient_ids.append(resp.json()["id"])
+
+        driver = LoadDriver(api, patient_ids, args.concurrency, args.rate, args.read_ratio)
+        print(f"🚀 {args.duration:.0f}s of load from '{args.source}' "
+              f"(rate={args.rate or 'max'}/s, concurrency={args.concurrency})")
+        elapsed = driver.run(args.duration, batches, recorded)
+
+        anchors = wait_for_anchors(backend, args.anchor_timeout)
+        gas = chain.gas_report()
+        reasons = invalid_reasons(gas, anchors)
+        ingest_count = len(driver.latency["ingest"])
+        summary = {
+            "commit": git_commit(),
+            "valid": not reasons,
+            "invalid_reasons": reasons,
+            "timestamp": time.time(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            "elapsed_sec": round(elapsed, 3),
+            "ingest": {
+                "requests": ingest_count,
+                "errors": driver.errors["ingest"],
+                "readings": driver.readings,
+                "requests_per_sec": round(ingest_count / elapsed, 3),
+                "readings_per_sec": round(driver.readings / elapsed, 3),
+                "latency": percentiles(driver.latency["ingest"]),
+            },
+            "reads": {
+                "requests": len(driver.latency["read"]),
+                "errors": driver.errors["read"],
+                "latency": percentiles(driver.latency["read"]),
+            },
+            "chain": dict(
+                gas,
+                anchors=anchors,
+                gas_per_reading=round(gas["gas_used"] / driver.readings, 3) if driver.readings else None,
+                transactions_per_reading=round(gas["transactions"] / driver.readings, 6) if driver.readings else None,
+            ),
+        }
+        if recorded is not None:
+            summary["recorded"] = {
+                "requests": len(driver.latency["recorded"]),
+                "errors": driver.errors["recorded"],
+                "skipped_lines": skipped,
+                "latency": percentiles(driver.latency["recorded"]),
+            }
+    finally:
+        backend.stop()
+        chain.stop()
+
+    out = args.out or os.path.join(RESULTS_DIR, f"ingest-{summary['commit'] or 'local'}-{int(summary['timestamp'])}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    print(f"\n💾 Summary saved to {out}")
+    if args.compare:
+        compare(summary, args.compare)
+    if not summary["valid"]:
+        print(f"\n❌ Invalid run: {'; '.join(summary['invalid_reasons'])}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
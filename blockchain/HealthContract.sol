@@ -2,10 +2,11 @@
 pragma solidity ^0.8.0;
 
 contract HealthRecord {
-    
+
+    // Packed into 2 storage slots: [ipfsHash] [timestamp | isCritical | deviceId]
     struct Record {
-        string ipfsHash;
-        uint256 timestamp;
+        bytes32 ipfsHash;   // Merkle root / content hash (32 bytes, no dynamic string storage)
+        uint64 timestamp;
         bool isCritical;
         address deviceId;
     }
@@ -14,11 +15,11 @@ contract HealthRecord {
     mapping(address => Record[]) public patientRecords;
     // Access Control: Patient Address -> Device Address -> Is Authorized to WRITE?
     mapping(address => mapping(address => bool)) public authorizedDevices;
-    
+
     // Data Sharing: Patient Address -> Doctor/Viewer Address -> Is Authorized to VIEW?
     mapping(address => mapping(address => bool)) public dataAccessList;
 
-    event RecordAdded(address indexed patient, string ipfsHash, bool isCritical, uint256 timestamp);
+    event RecordAdded(address indexed patient, bytes32 ipfsHash, bool isCritical, uint256 timestamp);
     event AccessGranted(address indexed patient, address indexed device);
     event AccessRevoked(address indexed patient, address indexed device);
     event DataShared(address indexed patient, address indexed doctor);
@@ -33,6 +34,15 @@ contract HealthRecord {
         _;
     }
 
+    // Modifier: Only the patient OR a doctor they shared data with can read
+    modifier onlyViewer(address _patient) {
+        require(
+            msg.sender == _patient || dataAccessList[_patient][msg.sender],
+            "Access Denied: You do not have permission to view this patient's records."
+        );
+        _;
+    }
+
     // 1. Authorize a Gateway/Doctor to write to my records
     function authorizeDevice(address _device) public {
         authorizedDevices[msg.sender][_device] = true;
@@ -46,7 +56,7 @@ contract HealthRecord {
     }
 
     // --- NEW: DATA SHARING (VIEW PERMISSIONS) ---
-    
+
     // 3. Share Data (Grant View Access)
     function grantDataAccess(address _doctor) public {
         dataAccessList[msg.sender][_doctor] = true;
@@ -60,25 +70,52 @@ contract HealthRecord {
     }
 
     // 5. Add Record (Protected Write)
-    function addRecord(address _patient, string memory _ipfsHash, bool _isCritical) public onlyAuthorized(_patient) {
-        Record memory newRecord = Record({
+    function addRecord(address _patient, bytes32 _ipfsHash, bool _isCritical) public onlyAuthorized(_patient) {
+        _push(_patient, _ipfsHash, _isCritical);
+    }
+
+    // 5b. Add many records in ONE transaction (one auth check, one tx overhead)
+    function addRecords(address _patient, bytes32[] calldata _ipfsHashes, bool[] calldata _isCritical) external onlyAuthorized(_patient) {
+        require(_ipfsHashes.length == _isCritical.length, "Length mismatch");
+        for (uint256 i = 0; i < _ipfsHashes.length; i++) {
+            _push(_patient, _ipfsHashes[i], _isCritical[i]);
+        }
+    }
+
+    function _push(address _patient, bytes32 _ipfsHash, bool _isCritical) internal {
+        patientRecords[_patient].push(Record({
             ipfsHash: _ipfsHash,
-            timestamp: block.timestamp,
+            timestamp: uint64(block.timestamp),
             isCritical: _isCritical,
             deviceId: msg.sender
-        });
-
-        patientRecords[_patient].push(newRecord);
+        }));
         emit RecordAdded(_patient, _ipfsHash, _isCritical, block.timestamp);
     }
 
     // 6. Secure Fetch (Protected View)
     // Only the Patient OR an Authorized Doctor can view the records
-    function getRecords(address _patient) public view returns (Record[] memory) {
-        require(
-            msg.sender == _patient || dataAccessList[_patient][msg.sender],
-            "Access Denied: You do not have permission to view this patient's records."
-        );
+    function getRecordCount(address _patient) public view onlyViewer(_patient) returns (uint256) {
+        return patientRecords[_patient].length;
+    }
+
+    // Bounded read: stays under the node's eth_call gas cap however long the history
+    function getRecordsPage(address _patient, uint256 _offset, uint256 _limit) public view onlyViewer(_patient) returns (Record[] memory page) {
+        Record[] storage records = patientRecords[_patient];
+        if (_offset >= records.length) {
+            return new Record[](0);
+        }
+        uint256 end = _offset + _limit;
+        if (end > records.length) {
+            end = records.length;
+        }
+        page = new Record[](end - _offset);
+        for (uint256 i = _offset; i < end; i++) {
+            page[i - _offset] = records[i];
+        }
+    }
+
+    // Whole history (kept for existing clients, prefer getRecordsPage)
+    function getRecords(address _patient) public view onlyViewer(_patient) returns (Record[] memory) {
         return patientRecords[_patient];
     }
-}
\ No newline at end of file
+}
@@ -42,3 +42,22 @@ with open(artifact_path, "w") as f:
     json.dump({"abi": abi, "bytecode": bytecode}, f, indent=4)
 
 print(f"✅ Compilation Successful! Artifacts saved to {artifact_path}")
+
+# Keep every consumer on the same ABI (addRecords / bytes32 / getRecordsPage)
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for copy_path in [
+    os.path.join(root_dir, "emr_platform", "frontend", "src", "HealthRecord.json"),
+    os.path.join(root_dir, "patient-dashboard-app", "config", "HealthRecord.json"),
+]:
+    if os.path.isdir(os.path.dirname(copy_path)):
+        with open(copy_path, "w") as f:
+            json.dump({"abi": abi, "bytecode": bytecode}, f, indent=4)
+        print(f"   ↪ {copy_path}")
+
+for abi_path in [
+    os.path.join(artifacts_dir, "abi.json"),
+    os.path.join(root_dir, "emr_platform", "backend", "abi.json"),
+]:
+    with open(abi_path, "w") as f:
+        json.dump(abi, f, indent="\t")
+    print(f"   ↪ {abi_path}")
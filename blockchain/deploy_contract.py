@@ -45,7 +45,7 @@ def deploy():
     construct_txn = HealthRecord.constructor().build_transaction({
         'from': account.address,
         'nonce': w3.eth.get_transaction_count(account.address),
-        'gas': 2000000,
+        'gas': HealthRecord.constructor().estimate_gas({'from': account.address}) * 12 // 10, # +20% headroom
         'gasPrice': w3.to_wei('20', 'gwei')
     })
 
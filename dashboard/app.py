@@ -1,11 +1,15 @@
 import streamlit as st
 import pandas as pd
 import time
-import sqlite3
+import threading
 from web3 import Web3
 import os
+import sys
 import json
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../emr_platform/backend"))
+from sqlite_tuning import connect_readonly
+
 # --- ⚙️ CONFIGURATION ---
 from dotenv import load_dotenv
 load_dotenv()
@@ -29,46 +33,124 @@ def get_contract():
         st.error("❌ Blockchain Unreachable! Is Ganache running?")
         return None
     
-    # ABI must match the deployed HealthRecord contract
-    # We only need the read functions and events usually, but here is the full view needed
-    abi = [
-        {"inputs":[{"internalType":"address","name":"_patient","type":"address"}],"name":"getRecords","outputs":[{"components":[{"internalType":"string","name":"ipfsHash","type":"string"},{"internalType":"uint256","name":"timestamp","type":"uint256"},{"internalType":"bool","name":"isCritical","type":"bool"},{"internalType":"address","name":"deviceId","type":"address"}],"internalType":"struct HealthRecord.Record[]","name":"","type":"tuple[]"}],"stateMutability":"view","type":"function"},
-        {"inputs":[],"name":"owner","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"}
-    ]
+    # ABI must match the deployed HealthRecord contract -> read it from the compiled artifact
+    artifact_path = os.path.join(os.path.dirname(__file__), "../blockchain/artifacts/HealthRecord.json")
+    try:
+        with open(artifact_path, "r") as f:
+            abi = json.load(f)["abi"]
+    except FileNotFoundError:
+        st.error("❌ Artifact not found. Please run 'python blockchain/compile.py' first.")
+        return None
     return w3.eth.contract(address=CONTRACT_ADDRESS, abi=abi)
 
 contract = get_contract()
 
-# Helper: Get Patient by Wallet
-def get_patient_by_wallet(wallet_address):
+# 2. One read-only SQLite connection shared by every session (no connect per rerun)
+# mode=ro + WAL (set by the backend): dashboard reads never block ingestion
+class ReadOnlyDB:
+    def __init__(self, path):
+        self.conn = connect_readonly(path)
+        self.lock = threading.Lock() # one sqlite3 connection, many Streamlit threads
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+@st.cache_resource
+def get_db():
     if not os.path.exists(DB_PATH):
+        return None
+    return ReadOnlyDB(DB_PATH)
+
+# Helper: Get Patient by Wallet (identity rarely changes -> short TTL cache)
+@st.cache_data(ttl=30, show_spinner=False)
+def get_patient_by_wallet(wallet_address):
+    db = get_db()
+    if db is None:
         st.error(f"DB not found at {DB_PATH}")
         return None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT id, name, age FROM patients WHERE wallet_address=?", (wallet_address,))
-        result = c.fetchone()
-        conn.close()
-        if result:
-            return {"id": result[0], "name": result[1], "age": result[2]}
+        rows = db.query("SELECT id, name, age FROM patients WHERE wallet_address=?", (wallet_address,))
+        if rows:
+            return {"id": rows[0][0], "name": rows[0][1], "age": rows[0][2]}
     except Exception as e:
         st.error(f"DB Read Error (Patient): {e}")
     return None
 
+class VitalsTail:
+    """
+    Rolling window of a patient's latest vitals, shared by every viewer of that
+    patient. Each refresh only fetches rows after the last (timestamp, id) seen,
+    and at most once per `min_interval` however many sessions ask.
+    """
+
+    def __init__(self, patient_id, limit=50, min_interval=1.0):
+        self.patient_id = patient_id
+        self.limit = limit
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.frame = pd.DataFrame(columns=["id", "bpm", "spo2", "timestamp"])
+        self.last_key = None # (timestamp, id) of the newest row in the frame
+        self.last_refresh = 0.0
+
+    def refresh(self, db):
+        with self.lock:
+            if time.time() - self.last_refresh < self.min_interval:
+                return self.frame
+            self.last_refresh = time.time()
+            rows = None
+            if self.last_key is not None:
+                ts, rid = self.last_key
+                rows = db.query(
+                    "SELECT id, bpm, spo2, timestamp FROM vitals_records WHERE patient_id=? "
+                    "AND (timestamp > ? OR (timestamp = ? AND id > ?)) ORDER BY timestamp, id LIMIT ?",
+                    (self.patient_id, ts, ts, rid, self.limit))
+                if len(rows) == self.limit:
+                    rows = None # Fell a full window behind -> just take the newest window
+            if rows is None:
+                rows = db.query(
+                    "SELECT id, bpm, spo2, timestamp FROM vitals_records WHERE patient_id=? "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?", (self.patient_id, self.limit))
+                rows.reverse()
+                self.frame = self.frame.iloc[0:0]
+            if rows:
+                new = pd.DataFrame(rows, columns=["id", "bpm", "spo2", "timestamp"])
+                frame = new if self.frame.empty else pd.concat([self.frame, new], ignore_index=True)
+                self.frame = frame.tail(self.limit).reset_index(drop=True)
+                self.last_key = (rows[-1][3], rows[-1][0])
+            return self.frame
+
+@st.cache_resource
+def get_vitals_tail(patient_id, limit=50):
+    return VitalsTail(patient_id, limit=limit)
+
 # Helper: Get Latest Vitals
 def get_latest_vitals(patient_id, limit=50):
-    if not os.path.exists(DB_PATH):
+    db = get_db()
+    if db is None:
         return pd.DataFrame()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(f"SELECT bpm, spo2, timestamp FROM vitals_records WHERE patient_id=? ORDER BY timestamp DESC LIMIT {limit}", conn, params=(patient_id,))
-        conn.close()
-        return df.sort_values(by="timestamp") # Sort Time Ascending for Chart
+        return get_vitals_tail(patient_id, limit).refresh(db) # Already time ascending for the chart
     except Exception as e:
         st.error(f"DB Read Error (Vitals): {e}")
         return pd.DataFrame()
 
+# Helper: On-chain records, re-read only when a new block was mined
+CHAIN_RECORDS_LIMIT = 200 # newest records shown (one bounded getRecordsPage call)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_chain_records(patient_address, doctor_address, block_number):
+    # block_number is only part of the cache key
+    fn_names = {item.get("name") for item in contract.abi}
+    if "getRecordsPage" in fn_names:
+        total = contract.functions.getRecordCount(patient_address).call({'from': doctor_address})
+        offset = max(0, total - CHAIN_RECORDS_LIMIT)
+        records = contract.functions.getRecordsPage(patient_address, offset, total - offset).call({'from': doctor_address})
+    else:
+        records = contract.functions.getRecords(patient_address).call({'from': doctor_address})[-CHAIN_RECORDS_LIMIT:]
+    # bytes32 hashes -> hex so they display (and cache) like the old string hashes
+    return [(r[0].hex() if isinstance(r[0], bytes) else r[0], *r[1:]) for r in records]
+
 # --- UI LAYOUT ---
 st.set_page_config(page_title="C.A.R.E. Provider Console", page_icon="🩺", layout="wide")
 
@@ -134,7 +216,7 @@ if patient_address:
     if contract and Web3.is_address(doctor_address) and Web3.is_address(patient_address):
         try:
              # CALL (View) - Will fail if no access
-             records = contract.functions.getRecords(patient_address).call({'from': doctor_address})
+             records = get_chain_records(patient_address, doctor_address, w3.eth.block_number)
              
              if not records:
                  st.info("No records found on-chain.")
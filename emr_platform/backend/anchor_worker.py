@@ -0,0 +1,226 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import update
+
+import blockchain_utils
+import crud
+import models
+from database import WriteSessionLocal
+
+# --- CONFIGURATION ---
+ANCHOR_WORKERS = int(os.getenv("ANCHOR_WORKERS", "4"))
+ANCHOR_POLL_INTERVAL = float(os.getenv("ANCHOR_POLL_INTERVAL", "1.0"))   # seconds between outbox scans
+ANCHOR_MAX_ATTEMPTS = int(os.getenv("ANCHOR_MAX_ATTEMPTS", "8"))
+ANCHOR_BACKOFF_BASE = float(os.getenv("ANCHOR_BACKOFF_BASE", "2.0"))     # seconds, doubled per attempt
+ANCHOR_BACKOFF_MAX = float(os.getenv("ANCHOR_BACKOFF_MAX", "300"))
+ANCHOR_LEASE = float(os.getenv("ANCHOR_LEASE", "60"))                    # claim time for one send attempt
+ANCHOR_RESEND_AFTER = float(os.getenv("ANCHOR_RESEND_AFTER", "600"))     # sent but never mined -> retry
+ANCHOR_MINT_GRACE = float(os.getenv("ANCHOR_MINT_GRACE", "30"))          # wait for a gateway mint to show up on-chain
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(ANCHOR_BACKOFF_MAX, ANCHOR_BACKOFF_BASE * (2 ** attempts)))
+
+class AnchorWorker:
+    """
+    Drains `anchor_outbox` to the chain in the background.
+
+    pending   -> a worker sends the tx                    -> sent
+    sent      -> receipt mined with status 1              -> confirmed
+    revert    -> simulated or mined revert, not resent    -> failed
+    gateway_minted and the root is on-chain               -> external (nothing sent)
+    any error -> attempts += 1, rescheduled with backoff  -> pending (failed after ANCHOR_MAX_ATTEMPTS)
+
+    Roots are anchored under the patient's wallet, which must have authorized
+    the hospital account (authorizeDevice). `failed` rows go back to pending
+    through `retry_failed` (POST /anchors/retry), e.g. once it has.
+
+    No DB transaction is held across an RPC call, so the worker never keeps
+    ingestion waiting on the chain (SQLite: one writer at a time).
+    """
+
+    def __init__(self, session_factory=WriteSessionLocal, workers: int = ANCHOR_WORKERS, poll_interval: float = ANCHOR_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="anchor")
+        self._thread = threading.Thread(target=self._run, name="anchor-dispatcher", daemon=True)
+        self._thread.start()
+        print(f"⛓️ Anchor worker started ({self.workers} workers)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._pool:
+            self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.dispatch_pending()
+                self.confirm_sent()
+            except Exception as e:
+                print(f"⚠️ Anchor worker loop error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def dispatch_pending(self):
+        now = time.time()
+        db = self.session_factory()
+        try:
+            due = db.query(models.AnchorOutbox.id).filter(
+                models.AnchorOutbox.status == "pending",
+                models.AnchorOutbox.next_attempt_at <= now
+            ).order_by(
+                models.AnchorOutbox.is_critical.desc(), models.AnchorOutbox.id
+            ).limit(self.workers * 4).all()
+        finally:
+            db.close()
+
+        for (anchor_id,) in due:
+            with self._lock:
+                if anchor_id in self._inflight:
+                    continue
+                self._inflight.add(anchor_id)
+            self._pool.submit(self._send, anchor_id)
+
+    def _claim(self, db, anchor_id: int) -> bool:
+        # Lease the row so another backend process does not send it concurrently
+        now = time.time()
+        result = db.execute(
+            update(models.AnchorOutbox)
+            .where(
+                models.AnchorOutbox.id == anchor_id,
+                models.AnchorOutbox.status == "pending",
+                models.AnchorOutbox.next_attempt_at <= now
+            )
+            .values(next_attempt_at=now + ANCHOR_LEASE)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def _send(self, anchor_id: int):
+        db = self.session_factory()
+        try:
+            if not self._claim(db, anchor_id):
+                return
+            anchor = db.get(models.AnchorOutbox, anchor_id)
+            record = dict(patient_address=self._patient_wallet(db, anchor_id), ipfs_hash=anchor.ipfs_hash, is_critical=anchor.is_critical)
+            minted = anchor.gateway_minted and crud.is_hash_indexed(db, [record["patient_address"]], anchor.ipfs_hash)
+            db.commit() # the row is leased; no transaction stays open during the RPC
+            if anchor.gateway_minted and not minted:
+                minted = bool(blockchain_utils.is_hash_anchored([record["patient_address"]], anchor.ipfs_hash))
+            if minted:
+                anchor.status = "external"
+                anchor.last_error = None
+                db.commit()
+                return
+            if anchor.gateway_minted and time.time() < (anchor.created_at or 0) + ANCHOR_MINT_GRACE:
+                # The gateway's mint may still be in the mempool: look again before paying for a second anchor
+                anchor.next_attempt_at = anchor.created_at + ANCHOR_MINT_GRACE
+                db.commit()
+                return
+            error, rejected = None, False
+            try:
+                tx_hash = blockchain_utils.add_record_to_chain(**record)
+                if not tx_hash:
+                    raise RuntimeError("Blockchain not available")
+            except blockchain_utils.AnchorRejected as e:
+                error, rejected = f"Rejected by contract: {e}", True
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                anchor.status = "sent"
+                anchor.tx_hash = tx_hash
+                anchor.last_error = None
+            elif rejected:
+                self._fail(anchor, error)
+            else:
+                self._reschedule(anchor, error)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Anchor {anchor_id} failed to update outbox: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._inflight.discard(anchor_id)
+
+    def _patient_wallet(self, db, anchor_id: int):
+        # Every row of a batch belongs to the same patient
+        return db.query(models.Patient.wallet_address).join(
+            models.VitalsRecord, models.VitalsRecord.patient_id == models.Patient.id
+        ).filter(models.VitalsRecord.anchor_id == anchor_id).limit(1).scalar()
+
+    def _fail(self, anchor, error: str):
+        # Permanent: the same tx would revert again, so it is not rescheduled
+        anchor.attempts = (anchor.attempts or 0) + 1
+        anchor.last_error = error[:500]
+        anchor.status = "failed"
+        print(f"❌ Anchor {anchor.id} failed: {error}")
+
+    def _reschedule(self, anchor, error: str):
+        anchor.attempts = (anchor.attempts or 0) + 1
+        anchor.last_error = error[:500]
+        if anchor.attempts >= ANCHOR_MAX_ATTEMPTS:
+            anchor.status = "failed"
+            print(f"❌ Anchor {anchor.id} gave up after {anchor.attempts} attempts: {error}")
+        else:
+            anchor.status = "pending"
+            anchor.next_attempt_at = time.time() + backoff_delay(anchor.attempts)
+
+    def retry_failed(self, anchor_ids: list[int] = None) -> int:
+        """Puts `failed` rows (all, or just `anchor_ids`) back to pending with a fresh attempt budget."""
+        db = self.session_factory()
+        try:
+            query = update(models.AnchorOutbox).where(models.AnchorOutbox.status == "failed")
+            if anchor_ids:
+                query = query.where(models.AnchorOutbox.id.in_(anchor_ids))
+            result = db.execute(query.values(status="pending", attempts=0, next_attempt_at=time.time()))
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+    def confirm_sent(self):
+        db = self.session_factory()
+        try:
+            sent = [(a.id, a.tx_hash) for a in db.query(models.AnchorOutbox).filter(
+                models.AnchorOutbox.status == "sent"
+            ).order_by(models.AnchorOutbox.id).limit(100)]
+            db.commit()
+
+            # Receipts first, then every status change in one short transaction
+            receipts = [(anchor_id, blockchain_utils.get_transaction_receipt(tx_hash)) for anchor_id, tx_hash in sent]
+            for anchor_id, receipt in receipts:
+                anchor = db.get(models.AnchorOutbox, anchor_id)
+                if anchor is None or anchor.status != "sent":
+                    continue
+                if receipt is None:
+                    # Dropped from the mempool (e.g. node restart) -> send again
+                    if time.time() - (anchor.updated_at or 0) > ANCHOR_RESEND_AFTER:
+                        self._reschedule(anchor, "Transaction not mined")
+                    continue
+                if receipt["status"] == 1:
+                    anchor.status = "confirmed"
+                else:
+                    self._fail(anchor, f"Transaction reverted in block {receipt['blockNumber']}")
+            db.commit()
+        finally:
+            db.close()
+
+worker = AnchorWorker()
@@ -0,0 +1,72 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, models, schemas
+import pubsub
+import response_cache
+
+# Async equivalents of the hot crud.py paths (patients, vitals ingest and
+# vitals reads) for async_router.py. Row building, cursors and rollup upserts
+# are shared with crud.py; the heavier read-only queries run the sync code on
+# the async connection via `run_sync` rather than being duplicated.
+
+async def get_patient(db: AsyncSession, patient_id: int):
+    return await db.get(models.Patient, patient_id)
+
+async def get_patient_by_wallet(db: AsyncSession, wallet_address: str):
+    result = await db.execute(select(models.Patient).where(models.Patient.wallet_address == wallet_address).limit(1))
+    return result.scalars().first()
+
+async def get_patient_summaries(db: AsyncSession, **kwargs):
+    return await db.run_sync(crud.get_patient_summaries, **kwargs)
+
+async def create_patient(db: AsyncSession, patient: schemas.PatientCreate):
+    db_patient = models.Patient(name=patient.name, age=patient.age, wallet_address=patient.wallet_address)
+    db.add(db_patient)
+    await db.commit()
+    # schemas.Patient serializes `records`: load it here, lazy loads cannot run outside the session's await
+    await db.refresh(db_patient, attribute_names=["id", "name", "age", "wallet_address", "records"])
+    response_cache.cache.invalidate(response_cache.wallet_tag(patient.wallet_address))
+    return db_patient
+
+async def create_patient_vitals(db: AsyncSession, vitals: schemas.VitalsCreate, patient_id: int):
+    db_vitals = crud.build_vitals_record(vitals, patient_id)
+    db.add(db_vitals)
+    await db.run_sync(crud._update_rollups, patient_id, [vitals])
+    await db.commit()
+    await db.refresh(db_vitals)
+
+    pubsub.broker.publish(patient_id, crud.vitals_message(db_vitals))
+    response_cache.cache.invalidate(response_cache.patient_tag(patient_id))
+    return db_vitals
+
+async def create_patient_vitals_batch(db: AsyncSession, vitals_list: list[schemas.VitalsCreate], patient_id: int):
+    """Same transaction shape as crud.create_patient_vitals_batch: one flush, one commit."""
+    if not vitals_list:
+        return []
+
+    db_rows = crud.build_vitals_batch(vitals_list, patient_id)
+    db.add_all(db_rows)
+    await db.flush()
+    ids = [row.id for row in db_rows]
+    messages = [crud.vitals_message(row) for row in db_rows]
+    await db.run_sync(crud._update_rollups, patient_id, vitals_list)
+    await db.commit()
+
+    for message in messages:
+        pubsub.broker.publish(patient_id, message)
+    response_cache.cache.invalidate(response_cache.patient_tag(patient_id))
+    return ids
+
+async def get_vitals_page(db: AsyncSession, patient_id: int, since: float = None, until: float = None,
+                          limit: int = None, cursor: str = None, order: str = "asc"):
+    """Returns (rows, next_cursor); next_cursor is None on the last page."""
+    criteria, ordering = crud.vitals_criteria(patient_id, since, until, cursor, order)
+    stmt = select(models.VitalsRecord).where(*criteria).order_by(*ordering)
+    if limit is None:
+        return (await db.execute(stmt)).scalars().all(), None
+    rows = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    return crud.page_with_cursor(rows, limit)
+
+async def get_vitals_rollup(db: AsyncSession, patient_id: int, resolution: str, since: float = None, until: float = None):
+    return await db.run_sync(crud.get_vitals_rollup, patient_id, resolution, since=since, until=until)
@@ -0,0 +1,59 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from database import SQLALCHEMY_DATABASE_URL, pool_options, use_sqlite_profile
+
+# Opt-in async engine (EMR_ASYNC_DB=1) for the routes in async_router.py.
+# Same database as the sync engine, driven through an asyncio driver:
+#
+#   sqlite://      -> sqlite+aiosqlite://      (dev)
+#   postgresql://  -> postgresql+asyncpg://    (docker-compose)
+#
+# Created on first use, so the drivers are only required when the mode is on.
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        dialect, driver = scheme.split("+", 1)
+        if driver in ("aiosqlite", "asyncpg"):
+            return url
+        scheme = dialect # e.g. postgresql+psycopg2 -> postgresql
+    if scheme not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{scheme}' databases")
+    return ASYNC_DRIVERS[scheme] + sep + rest
+
+_engine = None
+_sessionmaker = None
+_write_sessionmaker = None
+
+def get_async_engine():
+    global _engine, _sessionmaker, _write_sessionmaker
+    if _engine is None:
+        url = to_async_url(SQLALCHEMY_DATABASE_URL)
+        connect_args = {"timeout": 30} if url.startswith("sqlite") else {}
+        _engine = create_async_engine(url, connect_args=connect_args, **pool_options(SQLALCHEMY_DATABASE_URL))
+        use_sqlite_profile(_engine.sync_engine)
+        _sessionmaker = async_sessionmaker(_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        _write_sessionmaker = async_sessionmaker(_engine.execution_options(sqlite_immediate=True), class_=AsyncSession,
+                                                 autoflush=False, expire_on_commit=False)
+    return _engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _sessionmaker()
+
+def AsyncWriteSessionLocal() -> AsyncSession:
+    """Session for read-then-write requests (see database.WriteSessionLocal)."""
+    get_async_engine()
+    return _write_sessionmaker()
+
+async def dispose_async_engine():
+    global _engine, _sessionmaker, _write_sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine, _sessionmaker, _write_sessionmaker = None, None, None
@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+
+import async_crud, crud, models, schemas
+import response_cache
+from async_database import AsyncSessionLocal, AsyncWriteSessionLocal
+from main_router import MAX_EMBEDDED_RECORDS, MAX_VITALS_PAGE
+
+# Async versions of the ingest and hot read routes (EMR_ASYNC_DB=1).
+# Mounted in front of main_router with the same paths and response models, so
+# they take precedence; every other route keeps its sync handler. Requests
+# here wait on the database without holding one of the threadpool's workers.
+
+router = APIRouter()
+
+# Dependency
+async def get_async_db():
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def get_async_write_db():
+    db = AsyncWriteSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+@router.post("/patients/", response_model=schemas.Patient)
+async def create_patient(patient: schemas.PatientCreate, db: AsyncSession = Depends(get_async_write_db)):
+    if await async_crud.get_patient_by_wallet(db, wallet_address=patient.wallet_address):
+        raise HTTPException(status_code=400, detail="Patient already registered")
+    return await async_crud.create_patient(db=db, patient=patient)
+
+@router.get("/patients/", response_model=List[schemas.PatientSummary], response_model_exclude_unset=True)
+async def read_patients(
+    skip: int = 0,
+    limit: int = 100,
+    include: Optional[str] = None,
+    records_limit: int = Query(100, ge=1, le=MAX_EMBEDDED_RECORDS),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await async_crud.get_patient_summaries(
+        db, skip=skip, limit=limit, include_records=include == "records", records_limit=records_limit
+    )
+
+@router.get("/patients/by-wallet/{wallet_address}", response_model=schemas.PatientSummary, response_model_exclude_unset=True)
+async def read_patient_by_wallet(
+    wallet_address: str,
+    request: Request,
+    include: Optional[str] = None,
+    records_limit: int = Query(100, ge=1, le=MAX_EMBEDDED_RECORDS),
+    db: AsyncSession = Depends(get_async_db)
+):
+    include_records = include == "records"
+
+    async def load():
+        summaries = await async_crud.get_patient_summaries(
+            db, wallet_address=wallet_address, limit=1, include_records=include_records, records_limit=records_limit
+        )
+        if not summaries:
+            # Cached briefly as "not found"; creating the patient drops it via the wallet tag
+            return None, (response_cache.wallet_tag(wallet_address),)
+        body = response_cache.render(schemas.PatientSummary, summaries[0], exclude_unset=True)
+        return body, (response_cache.wallet_tag(wallet_address), response_cache.patient_tag(summaries[0]["id"]))
+
+    key = (wallet_address, records_limit if include_records else None)
+    entry = await response_cache.cache.aget("patient_by_wallet", key, load)
+    if not entry.found:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return response_cache.cache.respond(request, "patient_by_wallet", entry)
+
+@router.post("/patients/{patient_id}/vitals/", response_model=schemas.Vitals)
+async def create_vitals_for_patient(
+    patient_id: int, vitals: schemas.VitalsCreate, db: AsyncSession = Depends(get_async_write_db)
+):
+    return await async_crud.create_patient_vitals(db=db, vitals=vitals, patient_id=patient_id)
+
+@router.post("/patients/{patient_id}/vitals/batch", response_model=schemas.VitalsBatchResult)
+async def create_vitals_batch_for_patient(
+    patient_id: int, vitals: List[schemas.VitalsCreate], db: AsyncSession = Depends(get_async_write_db)
+):
+    if await async_crud.get_patient(db, patient_id=patient_id) is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    ids = await async_crud.create_patient_vitals_batch(db=db, vitals_list=vitals, patient_id=patient_id)
+    return {"patient_id": patient_id, "count": len(ids), "ids": ids}
+
+@router.get("/patients/{patient_id}/vitals/", response_model=Union[List[schemas.Vitals], List[schemas.VitalsRollup]])
+async def read_vitals(
+    patient_id: int,
+    response: Response,
+    resolution: str = "raw",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_VITALS_PAGE),
+    cursor: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if resolution == "auto":
+        resolution = crud.pick_resolution(since, until)
+    if resolution != "raw":
+        if resolution not in models.ROLLUP_TABLES:
+            raise HTTPException(status_code=400, detail=f"Unknown resolution '{resolution}'")
+        return await async_crud.get_vitals_rollup(db, patient_id=patient_id, resolution=resolution, since=since, until=until)
+
+    if cursor:
+        try:
+            crud.decode_vitals_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        # Long exports keep the sync server-side cursor (iterated in the threadpool)
+        return StreamingResponse(
+            crud.stream_vitals(patient_id, since=since, until=until, cursor=cursor, order=order),
+            media_type="application/x-ndjson"
+        )
+
+    rows, next_cursor = await async_crud.get_vitals_page(
+        db, patient_id=patient_id, since=since, until=until, limit=limit, cursor=cursor, order=order
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
@@ -1,8 +1,11 @@
+import hashlib
 import json
 import os
 from web3 import Web3
 from eth_account import Account
+from web3.exceptions import ContractLogicError, TransactionNotFound
 from dotenv import load_dotenv
+from nonce_manager import NonceManager
 
 # Load environment variables from .env file
 load_dotenv()
@@ -48,6 +51,10 @@ def get_web3_provider():
 
 w3 = get_web3_provider()
 
+# One nonce allocator per process: concurrent anchors never race on get_transaction_count
+nonce_manager = NonceManager(w3) if w3 else None
+CHAIN_ID = w3.eth.chain_id if w3 else None
+
 def load_contract():
     if not w3:
         return None
@@ -60,6 +67,35 @@ def load_contract():
 
 contract = load_contract()
 
+# Page size for getRecordsPage reads (bounded eth_call instead of the whole array)
+RECORDS_PAGE_SIZE = int(os.getenv("RECORDS_PAGE_SIZE", "500"))
+
+def contract_has(name: str) -> bool:
+    """ABI feature check, so older deployments (string hashes, no batching) keep working."""
+    return bool(contract) and any(item.get("name") == name for item in contract.abi)
+
+def _hash_is_bytes32() -> bool:
+    for item in contract.abi if contract else []:
+        if item.get("name") == "addRecord" and item.get("type") == "function":
+            return item["inputs"][1]["type"] == "bytes32"
+    return False
+
+def to_chain_hash(ipfs_hash: str):
+    """Merkle roots (64 hex chars) go on-chain as raw bytes32; anything else is sha256'd to fit."""
+    if not _hash_is_bytes32():
+        return ipfs_hash
+    value = ipfs_hash[2:] if ipfs_hash.startswith("0x") else ipfs_hash
+    try:
+        raw = bytes.fromhex(value)
+        if len(raw) == 32:
+            return raw
+    except ValueError:
+        pass
+    return hashlib.sha256(ipfs_hash.encode()).digest()
+
+def from_chain_hash(value) -> str:
+    return bytes(value).hex() if isinstance(value, (bytes, bytearray)) else value
+
 def generate_session_account():
     """
     Generates a brand new, random Ethereum account.
@@ -68,12 +104,23 @@ def generate_session_account():
     account = Account.create()
     return account.address, account.key.hex()
 
-def add_record_to_chain(session_address: str, ipfs_hash: str, is_critical: bool):
+class AnchorRejected(Exception):
+    """The contract would revert the write (e.g. the patient never authorized the hospital); resending cannot help."""
+
+def _estimate_gas(call, sender: str) -> int:
+    # Simulates the call first: a revert is caught here instead of being mined (and paid for)
+    try:
+        return call.estimate_gas({'from': sender}) * 12 // 10
+    except ContractLogicError as e:
+        raise AnchorRejected(str(e)) from e
+
+def add_record_to_chain(patient_address: str, ipfs_hash: str, is_critical: bool):
     """
     Writes the record to the blockchain.
-    
+
     Sender: Hospital (Pays Gas)
-    Patient Argument: session_address (The privacy-preserving identity)
+    Patient Argument: a wallet that authorized the hospital (authorizeDevice), else
+    the contract reverts -> AnchorRejected, raised before anything is sent.
     """
     if not w3 or not contract:
         print("⚠️ Blockchain not available. Skipping on-chain write.")
@@ -83,24 +130,102 @@ def add_record_to_chain(session_address: str, ipfs_hash: str, is_critical: bool)
         print("❌ HOSPITAL_PRIVATE_KEY is not set. Please check your .env file.")
         return None
 
+    if not patient_address or not Web3.is_address(patient_address):
+        raise AnchorRejected(f"'{patient_address}' is not a chain address")
+    patient_address = Web3.to_checksum_address(patient_address)
     hospital_account = w3.eth.account.from_key(HOSPITAL_PRIVATE_KEY)
     
     # Build Transaction
     # calling addRecord(_patient, _ipfsHash, _isCritical)
-    tx = contract.functions.addRecord(
-        session_address, 
-        ipfs_hash, 
-        is_critical
-    ).build_transaction({
-        'from': hospital_account.address,
-        'nonce': w3.eth.get_transaction_count(hospital_account.address),
-        'gas': 2000000,
-        'gasPrice': w3.to_wei('20', 'gwei')
-    })
-
-    # Sign & Send
-    signed_tx = w3.eth.account.sign_transaction(tx, HOSPITAL_PRIVATE_KEY)
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    call = contract.functions.addRecord(patient_address, to_chain_hash(ipfs_hash), is_critical)
+    gas = _estimate_gas(call, hospital_account.address)
+
+    def build_tx(nonce):
+        return call.build_transaction({
+            'from': hospital_account.address,
+            'nonce': nonce,
+            'chainId': CHAIN_ID,
+            'gas': gas,
+            'gasPrice': w3.to_wei('20', 'gwei')
+        })
+
+    # Sign & Send (nonce allocated locally)
+    tx_hash = nonce_manager.send_transaction(HOSPITAL_PRIVATE_KEY, build_tx)
     
     print(f"🔗 Transaction Sent! Hash: {tx_hash.hex()}")
     return tx_hash.hex()
+
+def add_records_to_chain(patient_address: str, ipfs_hashes: list[str], is_critical: list[bool]):
+    """
+    Anchors many hashes for one patient in a single addRecords transaction
+    (falls back to one addRecord per hash on older deployments).
+    """
+    if not w3 or not contract or not HOSPITAL_PRIVATE_KEY:
+        print("⚠️ Blockchain not available. Skipping on-chain write.")
+        return None
+    if not contract_has("addRecords"):
+        tx_hash = None
+        for ipfs_hash, critical in zip(ipfs_hashes, is_critical):
+            tx_hash = add_record_to_chain(patient_address, ipfs_hash, critical)
+        return tx_hash
+
+    hospital_account = w3.eth.account.from_key(HOSPITAL_PRIVATE_KEY)
+    call = contract.functions.addRecords(patient_address, [to_chain_hash(h) for h in ipfs_hashes], list(is_critical))
+    gas = _estimate_gas(call, hospital_account.address)
+
+    def build_tx(nonce):
+        return call.build_transaction({
+            'from': hospital_account.address,
+            'nonce': nonce,
+            'chainId': CHAIN_ID,
+            'gas': gas,
+            'gasPrice': w3.to_wei('20', 'gwei')
+        })
+
+    tx_hash = nonce_manager.send_transaction(HOSPITAL_PRIVATE_KEY, build_tx)
+    print(f"🔗 Batch Transaction Sent ({len(ipfs_hashes)} records)! Hash: {tx_hash.hex()}")
+    return tx_hash.hex()
+
+def iter_chain_records(patient_address: str, viewer_address: str):
+    """Yields the patient's on-chain records newest first, one bounded page per call."""
+    if not contract_has("getRecordsPage"):
+        yield from reversed(contract.functions.getRecords(patient_address).call({'from': viewer_address}))
+        return
+    end = contract.functions.getRecordCount(patient_address).call({'from': viewer_address})
+    while end > 0:
+        offset = max(0, end - RECORDS_PAGE_SIZE)
+        page = contract.functions.getRecordsPage(patient_address, offset, end - offset).call({'from': viewer_address})
+        yield from reversed(page)
+        end = offset
+
+def is_hash_anchored(patient_addresses: list[str], ipfs_hash: str):
+    """
+    Checks whether `ipfs_hash` was anchored under any of the given patient addresses.
+    Returns None when the chain cannot be queried.
+    """
+    if not w3 or not contract:
+        return None
+
+    target = to_chain_hash(ipfs_hash)
+    for address in patient_addresses:
+        if not address or not Web3.is_address(address):
+            continue
+        address = Web3.to_checksum_address(address)
+        try:
+            # Reads are restricted to the patient (or a granted viewer), so call as the patient
+            # Recent anchors are the likely match -> newest page first, stop at the first hit
+            if any(from_chain_hash(r[0]) == from_chain_hash(target) for r in iter_chain_records(address, address)):
+                return True
+        except Exception as e:
+            print(f"⚠️ Could not read records for {address}: {e}")
+            continue
+    return False
+
+def get_transaction_receipt(tx_hash: str):
+    """Returns the mined receipt, or None if the transaction is still pending/unknown."""
+    if not w3:
+        return None
+    try:
+        return w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionNotFound:
+        return None
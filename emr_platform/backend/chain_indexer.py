@@ -0,0 +1,228 @@
+import os
+import threading
+
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+
+import blockchain_utils
+import models
+import permission_cache
+import response_cache
+from database import WriteSessionLocal
+
+# --- CONFIGURATION ---
+CHAIN_INDEXER_POLL_INTERVAL = float(os.getenv("CHAIN_INDEXER_POLL_INTERVAL", "2.0"))
+CHAIN_INDEXER_BATCH_BLOCKS = int(os.getenv("CHAIN_INDEXER_BATCH_BLOCKS", "2000"))   # max get_logs range
+CHAIN_INDEXER_CONFIRMATIONS = int(os.getenv("CHAIN_INDEXER_CONFIRMATIONS", "0"))    # stay this far behind head
+CHAIN_INDEXER_START_BLOCK = int(os.getenv("CHAIN_INDEXER_START_BLOCK", "0"))
+
+# event name -> argument holding the counterparty (device / doctor)
+INDEXED_EVENTS = {
+    "RecordAdded": None,
+    "AccessGranted": "device",
+    "AccessRevoked": "device",
+    "DataShared": "doctor",
+    "DataUnshared": "doctor",
+}
+
+class ChainIndexer:
+    """
+    Follows HealthRecord logs into `chain_events`.
+
+    Each tick reads [checkpoint + 1, head - confirmations] in ranges of at most
+    CHAIN_INDEXER_BATCH_BLOCKS, writes the decoded logs and advances the
+    checkpoint in the same transaction. If the block under the checkpoint no
+    longer has the hash we saw, the chain reorganised: indexing rewinds to the
+    newest indexed block whose stored hash is still on the chain (a block hash
+    commits to all its ancestors, so everything up to it is unchanged, however
+    deep the reorg) and the events after it are deleted and indexed again.
+    RPC calls happen between two short transactions, never inside one.
+    """
+
+    def __init__(self, w3=None, contract=None, session_factory=WriteSessionLocal,
+                 batch_blocks: int = CHAIN_INDEXER_BATCH_BLOCKS, confirmations: int = CHAIN_INDEXER_CONFIRMATIONS, start_block: int = CHAIN_INDEXER_START_BLOCK,
+                 poll_interval: float = CHAIN_INDEXER_POLL_INTERVAL):
+        self.w3 = w3 or blockchain_utils.w3
+        self.contract = contract or blockchain_utils.contract
+        self.session_factory = session_factory
+        self.batch_blocks = batch_blocks
+        self.confirmations = confirmations
+        self.start_block = start_block
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._decoders = {}
+        if self.contract is not None:
+            for name in INDEXED_EVENTS:
+                event = getattr(self.contract.events, name)
+                topic = Web3.keccak(text=self._signature(event.abi))
+                self._decoders[topic.hex().removeprefix("0x")] = (name, event())
+
+    @staticmethod
+    def _signature(abi) -> str:
+        return f"{abi['name']}({','.join(i['type'] for i in abi['inputs'])})"
+
+    @property
+    def name(self) -> str:
+        return f"HealthRecord:{self.contract.address}"
+
+    def start(self):
+        if self.contract is None:
+            print("⚠️ Chain indexer disabled (no contract)")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chain-indexer", daemon=True)
+        self._thread.start()
+        print("🔎 Chain indexer started")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.tick() and not self._stop.is_set():
+                    pass # catching up, no sleep between ranges
+            except Exception as e:
+                print(f"⚠️ Chain indexer error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    # --- one step ------------------------------------------------------
+
+    def _checkpoint(self, db):
+        checkpoint = db.query(models.ChainCheckpoint).filter_by(name=self.name).first()
+        if checkpoint is None:
+            checkpoint = models.ChainCheckpoint(name=self.name, block_number=self.start_block - 1, block_hash=None)
+            db.add(checkpoint)
+        return checkpoint
+
+    def _block_hash(self, number: int):
+        if number < 0:
+            return None
+        try:
+            return self.w3.eth.get_block(number)["hash"].hex().removeprefix("0x")
+        except BlockNotFound:
+            return None # past the head of a chain that got shorter in a reorg
+
+    def _reorg_point(self, block_number: int, block_hash):
+        """Block to rewind to if the checkpointed block is no longer on the chain, else None."""
+        if block_hash is None or block_number < 0:
+            return None
+        if self._block_hash(block_number) == block_hash:
+            return None
+        return self._last_canonical_block(block_number - 1)
+
+    def _last_canonical_block(self, block_number: int, page: int = 100) -> int:
+        """Newest indexed block at or below `block_number` that is still on the chain (start - 1 if none)."""
+        while True:
+            db = self.session_factory()
+            try:
+                blocks = (
+                    db.query(models.ChainEvent.block_number, models.ChainEvent.block_hash)
+                    .filter(models.ChainEvent.block_number <= block_number)
+                    .distinct()
+                    .order_by(models.ChainEvent.block_number.desc())
+                    .limit(page)
+                    .all()
+                )
+                db.rollback()
+            finally:
+                db.close()
+            for number, stored_hash in blocks:
+                if self._block_hash(number) == stored_hash:
+                    return number
+            if len(blocks) < page:
+                return self.start_block - 1
+            block_number = blocks[-1][0] - 1
+
+    def tick(self) -> bool:
+        """Indexes at most one range. Returns True if more blocks are waiting."""
+        # 1. Where we are
+        db = self.session_factory()
+        try:
+            checkpoint = self._checkpoint(db)
+            seen = (checkpoint.block_number, checkpoint.block_hash)
+            db.rollback()
+        finally:
+            db.close()
+
+        # 2. Chain reads, outside any transaction
+        block_number, block_hash = seen
+        rewind_to = self._reorg_point(block_number, block_hash)
+        if rewind_to is not None:
+            print(f"♻️ Reorg detected at block {block_number}, rewinding to {rewind_to}")
+            block_number, block_hash = rewind_to, self._block_hash(rewind_to)
+
+        head = self.w3.eth.block_number - self.confirmations
+        from_block = block_number + 1
+        events = []
+        if from_block <= head:
+            to_block = min(head, from_block + self.batch_blocks - 1)
+            logs = self.w3.eth.get_logs({
+                "address": self.contract.address,
+                "fromBlock": from_block,
+                "toBlock": to_block,
+            })
+            events = [e for e in (self._decode(log) for log in logs) if e is not None]
+            block_number, block_hash = to_block, self._block_hash(to_block)
+        elif rewind_to is None:
+            return False # up to date
+        shares = [(e.patient, e.counterparty) for e in events if e.event in ("DataShared", "DataUnshared")]
+
+        # 3. Events + checkpoint in one short transaction
+        db = self.session_factory()
+        try:
+            checkpoint = self._checkpoint(db)
+            if (checkpoint.block_number, checkpoint.block_hash) != seen:
+                db.rollback()
+                return True # moved on meanwhile (another backend process), start over
+            if rewind_to is not None:
+                db.query(models.ChainEvent).filter(models.ChainEvent.block_number > rewind_to).delete()
+            db.add_all(events)
+            checkpoint.block_number = block_number
+            checkpoint.block_hash = block_hash
+            db.commit()
+        finally:
+            db.close()
+
+        if rewind_to is not None:
+            permission_cache.cache.invalidate() # rewound DataShared/DataUnshared events
+            response_cache.cache.invalidate()
+        for patient, viewer in shares:
+            permission_cache.cache.invalidate(patient, viewer)
+            response_cache.cache.invalidate(response_cache.viewer_tag(viewer))
+        if events:
+            print(f"🔎 Indexed {len(events)} chain events in blocks {from_block}-{block_number}")
+        return block_number < head
+
+    def _decode(self, log):
+        topics = log["topics"]
+        if not topics:
+            return None
+        decoder = self._decoders.get(bytes(topics[0]).hex().removeprefix("0x"))
+        if decoder is None:
+            return None
+        name, event = decoder
+        args = event.process_log(log)["args"]
+        row = models.ChainEvent(
+            block_number=log["blockNumber"],
+            block_hash=bytes(log["blockHash"]).hex().removeprefix("0x"),
+            tx_hash=bytes(log["transactionHash"]).hex().removeprefix("0x"),
+            log_index=log["logIndex"],
+            event=name,
+            patient=args["patient"],
+        )
+        if name == "RecordAdded":
+            row.ipfs_hash = blockchain_utils.from_chain_hash(args["ipfsHash"]) # bytes32 -> hex
+            row.is_critical = args["isCritical"]
+            row.timestamp = args["timestamp"]
+        else:
+            row.counterparty = args[INDEXED_EVENTS[name]]
+        return row
+
+indexer = ChainIndexer()
@@ -1,6 +1,16 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, cast, Integer, and_, or_, select, literal, inspect
+from sqlalchemy.dialects import sqlite, postgresql
 import models, schemas
 import blockchain_utils
+import pubsub
+import permission_cache
+import response_cache
+from database import SessionLocal
+import merkle
+import base64
+import json
+import time
 import uuid
 
 def get_patient(db: Session, patient_id: int):
@@ -12,57 +22,495 @@ def get_patient_by_wallet(db: Session, wallet_address: str):
 def get_patients(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Patient).offset(skip).limit(limit).all()
 
+def _ranked_vitals(patient_ids):
+    """vitals of the given patients numbered newest-first per patient, with each patient's total."""
+    vr = models.VitalsRecord
+    return select(
+        vr,
+        func.row_number().over(partition_by=vr.patient_id, order_by=(vr.timestamp.desc(), vr.id.desc())).label("rn"),
+        func.count(vr.id).over(partition_by=vr.patient_id).label("record_count")
+    ).where(vr.patient_id.in_(patient_ids)).subquery()
+
+def get_patient_summaries(db: Session, skip: int = 0, limit: int = 100, wallet_address: str = None,
+                          include_records: bool = False, records_limit: int = 100):
+    """
+    Patients with their latest vitals and record count in ONE query (window
+    functions over vitals_records), instead of lazy-loading every patient's history.
+    With `include_records`, each patient's newest `records_limit` rows are loaded
+    with one more capped IN query.
+    """
+    patients = db.query(models.Patient)
+    if wallet_address is not None:
+        patients = patients.filter(models.Patient.wallet_address == wallet_address)
+    page = patients.order_by(models.Patient.id).offset(skip).limit(limit).subquery()
+
+    ranked = _ranked_vitals(select(page.c.id))
+    patient = aliased(models.Patient, page)
+    latest = aliased(models.VitalsRecord, ranked)
+    rows = db.query(patient, latest, ranked.c.record_count).outerjoin(
+        ranked, and_(ranked.c.patient_id == page.c.id, ranked.c.rn == 1)
+    ).order_by(page.c.id).all()
+
+    summaries = [
+        {
+            "id": p.id,
+            "name": p.name,
+            "age": p.age,
+            "wallet_address": p.wallet_address,
+            "record_count": count or 0,
+            "latest_vitals": vitals
+        }
+        for p, vitals, count in rows
+    ]
+
+    if include_records and summaries:
+        ranked = _ranked_vitals([s["id"] for s in summaries])
+        records = db.query(aliased(models.VitalsRecord, ranked)).filter(ranked.c.rn <= records_limit).order_by(
+            ranked.c.patient_id, ranked.c.timestamp, ranked.c.id
+        ).all()
+        by_patient = {}
+        for record in records:
+            by_patient.setdefault(record.patient_id, []).append(record)
+        for summary in summaries:
+            summary["records"] = by_patient.get(summary["id"], [])
+
+    return summaries
+
 def create_patient(db: Session, patient: schemas.PatientCreate):
     db_patient = models.Patient(name=patient.name, age=patient.age, wallet_address=patient.wallet_address)
     db.add(db_patient)
     db.commit()
     db.refresh(db_patient)
+    response_cache.cache.invalidate(response_cache.wallet_tag(patient.wallet_address))
     return db_patient
 
-def get_vitals(db: Session, patient_id: int):
-    return db.query(models.VitalsRecord).filter(models.VitalsRecord.patient_id == patient_id).all()
+def encode_vitals_cursor(timestamp: float, record_id: int) -> str:
+    """Opaque keyset cursor: the (timestamp, id) of the last row a client has seen."""
+    raw = json.dumps([timestamp, record_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-def create_patient_vitals(db: Session, vitals: schemas.VitalsCreate, patient_id: int):
+def decode_vitals_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, record_id = json.loads(raw)
+        return float(timestamp), int(record_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def vitals_criteria(patient_id: int, since: float = None, until: float = None,
+                    cursor: str = None, order: str = "asc"):
+    """(filters, ordering) of a vitals range read, shared by the sync and async paths."""
+    vr = models.VitalsRecord
+    criteria = [vr.patient_id == patient_id]
+    if since is not None:
+        criteria.append(vr.timestamp >= since)
+    if until is not None:
+        criteria.append(vr.timestamp < until)
+    if cursor:
+        ts, record_id = decode_vitals_cursor(cursor)
+        if order == "desc":
+            criteria.append(or_(vr.timestamp < ts, and_(vr.timestamp == ts, vr.id < record_id)))
+        else:
+            criteria.append(or_(vr.timestamp > ts, and_(vr.timestamp == ts, vr.id > record_id)))
+    if order == "desc":
+        return criteria, (vr.timestamp.desc(), vr.id.desc())
+    return criteria, (vr.timestamp, vr.id)
+
+def query_vitals(db: Session, patient_id: int, since: float = None, until: float = None,
+                 cursor: str = None, order: str = "asc"):
+    """
+    Vitals for a patient in (timestamp, id) order. Served by ix_vitals_records_patient_ts
+    (range scan, already in timestamp order); `cursor` continues strictly after
+    the row it was issued for, so pages never skip or repeat rows.
+    """
+    criteria, ordering = vitals_criteria(patient_id, since, until, cursor, order)
+    return db.query(models.VitalsRecord).filter(*criteria).order_by(*ordering)
+
+VITALS_FIELDS = list(schemas.Vitals.__fields__)
+
+def vitals_message(record: models.VitalsRecord) -> dict:
+    """JSON-ready vitals row, as served by the read API and pushed to live subscribers."""
+    return {name: getattr(record, name) for name in VITALS_FIELDS}
+
+def get_vitals(db: Session, patient_id: int, since: float = None, until: float = None):
+    return query_vitals(db, patient_id, since=since, until=until).all()
+
+def get_vitals_page(db: Session, patient_id: int, since: float = None, until: float = None,
+                    limit: int = None, cursor: str = None, order: str = "asc"):
+    """Returns (rows, next_cursor); next_cursor is None on the last page."""
+    query = query_vitals(db, patient_id, since=since, until=until, cursor=cursor, order=order)
+    if limit is None:
+        return query.all(), None
+    return page_with_cursor(query.limit(limit + 1).all(), limit)
+
+def page_with_cursor(rows, limit: int):
+    """`rows` fetched with limit + 1: trims the extra row and issues the next cursor."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_vitals_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows, None
+
+def stream_vitals(patient_id: int, since: float = None, until: float = None,
+                  cursor: str = None, order: str = "asc", batch_size: int = 1000):
+    """
+    Yields NDJSON lines from a server-side cursor. Opens its own session because
+    the response body is produced after the request's dependency has closed.
+    """
+    db = SessionLocal()
+    try:
+        query = query_vitals(db, patient_id, since=since, until=until, cursor=cursor, order=order)
+        for row in query.execution_options(stream_results=True).yield_per(batch_size):
+            yield json.dumps(vitals_message(row)) + "\n"
+    finally:
+        db.close()
+
+# --- Rollups (1m / 1h) -------------------------------------------------
+
+# Widest span each tier is picked for by resolution="auto" (about <= 720 rows per chart)
+AUTO_RESOLUTION = [(2 * 3600, "raw"), (12 * 3600, "1m")]
+
+def pick_resolution(since: float = None, until: float = None) -> str:
+    if since is None:
+        return "raw"
+    span = (until if until is not None else time.time()) - since
+    for max_span, resolution in AUTO_RESOLUTION:
+        if span <= max_span:
+            return resolution
+    return "1h"
+
+def get_vitals_rollup(db: Session, patient_id: int, resolution: str, since: float = None, until: float = None):
+    model = models.ROLLUP_TABLES[resolution]
+    query = db.query(model).filter(model.patient_id == patient_id)
+    if since is not None:
+        query = query.filter(model.bucket >= int(since // model.BUCKET_SECONDS) * model.BUCKET_SECONDS)
+    if until is not None:
+        query = query.filter(model.bucket < until)
+    return query.order_by(model.bucket).all()
+
+def _rollup_deltas(patient_id: int, vitals_list, bucket_seconds: int):
+    """Aggregates one ingest's readings per bucket, so each bucket is upserted once."""
+    groups = {}
+    for v in vitals_list:
+        bucket = int(v.timestamp // bucket_seconds) * bucket_seconds
+        g = groups.get(bucket)
+        if g is None:
+            g = groups[bucket] = {
+                "patient_id": patient_id, "bucket": bucket, "count": 0, "critical_count": 0,
+                "bpm_min": v.bpm, "bpm_max": v.bpm, "bpm_sum": 0,
+                "spo2_min": v.spo2, "spo2_max": v.spo2, "spo2_sum": 0
+            }
+        g["count"] += 1
+        g["critical_count"] += 1 if v.is_critical else 0
+        g["bpm_min"], g["bpm_max"] = min(g["bpm_min"], v.bpm), max(g["bpm_max"], v.bpm)
+        g["spo2_min"], g["spo2_max"] = min(g["spo2_min"], v.spo2), max(g["spo2_max"], v.spo2)
+        g["bpm_sum"] += v.bpm
+        g["spo2_sum"] += v.spo2
+    return list(groups.values())
+
+def _update_rollups(db: Session, patient_id: int, vitals_list):
+    """
+    Folds new readings into the 1m/1h rollups inside the caller's transaction.
+    SQLite and Postgres use INSERT .. ON CONFLICT DO UPDATE; other databases
+    fall back to read-modify-write.
+    """
+    dialect = db.get_bind().dialect.name
+    for model in models.ROLLUP_TABLES.values():
+        deltas = _rollup_deltas(patient_id, vitals_list, model.BUCKET_SECONDS)
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            # SQLite's scalar min()/max() take two arguments, Postgres spells them least()/greatest()
+            least = func.min if dialect == "sqlite" else func.least
+            greatest = func.max if dialect == "sqlite" else func.greatest
+            stmt = insert(model).values(deltas)
+            new = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["patient_id", "bucket"],
+                set_={
+                    "count": model.count + new["count"],
+                    "critical_count": model.critical_count + new.critical_count,
+                    "bpm_min": least(model.bpm_min, new.bpm_min),
+                    "bpm_max": greatest(model.bpm_max, new.bpm_max),
+                    "bpm_sum": model.bpm_sum + new.bpm_sum,
+                    "spo2_min": least(model.spo2_min, new.spo2_min),
+                    "spo2_max": greatest(model.spo2_max, new.spo2_max),
+                    "spo2_sum": model.spo2_sum + new.spo2_sum
+                }
+            )
+            db.execute(stmt)
+            continue
+
+        for d in deltas:
+            row = db.query(model).filter_by(patient_id=patient_id, bucket=d["bucket"]).first()
+            if row is None:
+                db.add(model(**d))
+                continue
+            row.count += d["count"]
+            row.critical_count += d["critical_count"]
+            row.bpm_min, row.bpm_max = min(row.bpm_min, d["bpm_min"]), max(row.bpm_max, d["bpm_max"])
+            row.spo2_min, row.spo2_max = min(row.spo2_min, d["spo2_min"]), max(row.spo2_max, d["spo2_max"])
+            row.bpm_sum += d["bpm_sum"]
+            row.spo2_sum += d["spo2_sum"]
+
+def rebuild_rollups(db: Session):
+    """Recomputes every rollup tier from vitals_records (backfill for existing databases)."""
+    dialect = db.get_bind().dialect.name
+    vr = models.VitalsRecord
+    for model in models.ROLLUP_TABLES.values():
+        seconds = model.BUCKET_SECONDS
+        # SQLite CAST truncates, Postgres CAST rounds -> floor() there
+        bucket_index = cast(vr.timestamp / seconds, Integer) if dialect == "sqlite" else cast(func.floor(vr.timestamp / seconds), Integer)
+        bucket = (bucket_index * seconds).label("bucket")
+        grouped = db.query(
+            vr.patient_id, bucket, func.count(vr.id),
+            func.sum(cast(vr.is_critical, Integer)),
+            func.min(vr.bpm), func.max(vr.bpm), func.sum(vr.bpm),
+            func.min(vr.spo2), func.max(vr.spo2), func.sum(vr.spo2)
+        ).filter(vr.patient_id.isnot(None), vr.timestamp.isnot(None)).group_by(vr.patient_id, bucket)
+
+        db.query(model).delete()
+        db.execute(model.__table__.insert().from_select(
+            ["patient_id", "bucket", "count", "critical_count", "bpm_min", "bpm_max", "bpm_sum",
+             "spo2_min", "spo2_max", "spo2_sum"],
+            grouped.statement
+        ))
+    db.commit()
+
+def rollups_need_backfill(db: Session) -> bool:
+    return db.query(models.VitalsRollup1h.id).first() is None and db.query(models.VitalsRecord.id).first() is not None
+
+def _merkle_fields(vitals_list: list[schemas.VitalsCreate]):
+    """Builds the batch Merkle tree and returns (root, per-row column values)."""
+    leaves = [merkle.vitals_leaf(v.bpm, v.spo2, v.timestamp, v.is_critical) for v in vitals_list]
+    root, proofs = merkle.build_tree(leaves)
+    fields = [
+        {"merkle_root": root, "merkle_index": i, "merkle_proof": json.dumps(proof)}
+        for i, proof in enumerate(proofs)
+    ]
+    return root, fields
+
+def _same_root(ipfs_hash: str, merkle_root: str) -> bool:
+    return bool(ipfs_hash) and ipfs_hash.lower().removeprefix("0x") == merkle_root
+
+def _queue_anchor(session_address: str, merkle_root: str, is_critical: bool, ipfs_hash: str = None):
+    # Drained to the chain by anchor_worker.AnchorWorker, never on the request path.
+    # The gateway sends the root as ipfs_hash only when its own mint succeeded. That is
+    # just a claim: the worker marks the row `external` once it finds the root on-chain,
+    # and anchors it itself otherwise.
+    return models.AnchorOutbox(
+        session_address=session_address,
+        ipfs_hash=merkle_root,
+        is_critical=is_critical,
+        gateway_minted=_same_root(ipfs_hash, merkle_root),
+        status="pending"
+    )
+
+def build_vitals_record(vitals: schemas.VitalsCreate, patient_id: int) -> models.VitalsRecord:
+    """Unsaved row for a single reading, with its queued anchor (shared by the sync and async paths)."""
     # 1. Privacy: Generate a fresh Session Address for this transaction
     session_addr, _ = blockchain_utils.generate_session_account()
     
     # 2. Ensure IPFS Hash (Mocking it if not provided by sensor)
     final_ipfs = vitals.ipfs_hash if vitals.ipfs_hash else f"Qm{uuid.uuid4().hex}"
+
+    # 3. Single-leaf Merkle tree (root == leaf) so every row is verifiable the same way
+    merkle_root, (merkle_cols,) = _merkle_fields([vitals])
     
-    # 3. Create DB Object
-    db_vitals = models.VitalsRecord(
-        **vitals.dict(exclude={"session_address", "ipfs_hash"}), # Exclude to avoid double kwarg if schema has it
+    # 4. Queue the chain write (Hospital pays gas) in the SAME transaction as the row
+    anchor = _queue_anchor(session_addr, merkle_root, vitals.is_critical, vitals.ipfs_hash)
+
+    # 5. Create DB Object
+    return models.VitalsRecord(
+        **vitals.model_dump(exclude={"session_address", "ipfs_hash"}), # Exclude to avoid double kwarg if schema has it
+        **merkle_cols,
         session_address=session_addr,
         ipfs_hash=final_ipfs,
-        patient_id=patient_id
+        patient_id=patient_id,
+        anchor=anchor
     )
-    
+
+def create_patient_vitals(db: Session, vitals: schemas.VitalsCreate, patient_id: int):
+    db_vitals = build_vitals_record(vitals, patient_id)
     db.add(db_vitals)
+    _update_rollups(db, patient_id, [vitals])
     db.commit()
     db.refresh(db_vitals)
-    
-    # 4. Anchor to Blockchain (Hospital pays gas)
-    blockchain_utils.add_record_to_chain(
-        session_address=session_addr,
-        ipfs_hash=final_ipfs,
-        is_critical=vitals.is_critical
-    )
+
+    # 6. Push to live viewers (only once the row is durable); cached summaries are stale now
+    pubsub.broker.publish(patient_id, vitals_message(db_vitals))
+    response_cache.cache.invalidate(response_cache.patient_tag(patient_id))
     
     return db_vitals
 
+def build_vitals_batch(vitals_list: list[schemas.VitalsCreate], patient_id: int) -> list[models.VitalsRecord]:
+    """Unsaved rows for a gateway batch sharing one anchor for its Merkle root."""
+    # 1. One Session Address for the whole batch (one on-chain write)
+    session_addr, _ = blockchain_utils.generate_session_account()
+    batch_ipfs = vitals_list[0].ipfs_hash or f"Qm{uuid.uuid4().hex}"
+
+    merkle_root, merkle_cols = _merkle_fields(vitals_list)
+
+    # 2. One anchor for the batch root (critical if any reading is critical)
+    anchor = _queue_anchor(session_addr, merkle_root, any(v.is_critical for v in vitals_list), vitals_list[0].ipfs_hash)
+
+    return [
+        models.VitalsRecord(
+            **v.model_dump(exclude={"session_address", "ipfs_hash"}),
+            **cols,
+            session_address=session_addr,
+            ipfs_hash=v.ipfs_hash or batch_ipfs,
+            patient_id=patient_id,
+            anchor=anchor
+        )
+        for v, cols in zip(vitals_list, merkle_cols)
+    ]
+
+def create_patient_vitals_batch(db: Session, vitals_list: list[schemas.VitalsCreate], patient_id: int):
+    """
+    Inserts a whole gateway batch in one DB transaction and queues one anchor
+    for its Merkle root. Returns the new row ids in the same order as `vitals_list`.
+    """
+    if not vitals_list:
+        return []
+
+    # 3. Bulk insert (single flush, single commit)
+    db_rows = build_vitals_batch(vitals_list, patient_id)
+    db.add_all(db_rows)
+    db.flush()
+    ids = [row.id for row in db_rows]
+    messages = [vitals_message(row) for row in db_rows] # before commit expires the rows
+    _update_rollups(db, patient_id, vitals_list)
+    db.commit()
+
+    # 4. Push to live viewers (only once the batch is durable)
+    for message in messages:
+        pubsub.broker.publish(patient_id, message)
+    response_cache.cache.invalidate(response_cache.patient_tag(patient_id))
+
+    return ids
+
+def get_vitals_record(db: Session, record_id: int):
+    return db.query(models.VitalsRecord).filter(models.VitalsRecord.id == record_id).first()
+
+def verify_vitals_record(db: Session, record: models.VitalsRecord):
+    """
+    Recomputes the record's leaf, folds its inclusion proof up to the root (O(log n))
+    and checks that the root is anchored on-chain.
+    """
+    leaf = merkle.vitals_leaf(record.bpm, record.spo2, record.timestamp, record.is_critical)
+    proof = json.loads(record.merkle_proof) if record.merkle_proof else []
+    index = record.merkle_index or 0
+    computed_root = merkle.compute_root(leaf, index, proof)
+    proof_valid = record.merkle_root is not None and computed_root == record.merkle_root
+
+    anchored = None
+    if proof_valid:
+        # Roots are anchored under the patient's wallet; older rows under their session address
+        addresses = [record.patient.wallet_address if record.patient else None, record.session_address]
+        # Indexed chain events first; fall back to an RPC read if the indexer hasn't seen it yet
+        anchored = is_hash_indexed(db, addresses, record.merkle_root) or \
+            blockchain_utils.is_hash_anchored(addresses, record.merkle_root)
+
+    return {
+        "record_id": record.id,
+        "leaf": leaf,
+        "merkle_root": record.merkle_root,
+        "merkle_index": index,
+        "proof": proof,
+        "computed_root": computed_root,
+        "proof_valid": proof_valid,
+        "anchored": anchored,
+        "verified": bool(proof_valid and anchored)
+    }
+
+# --- Chain state (from chain_indexer, no RPC) --------------------------
+
+def _chain_address(address: str):
+    return blockchain_utils.Web3.to_checksum_address(address) if blockchain_utils.Web3.is_address(address) else address
+
+def get_chain_records(db: Session, patient_address: str, skip: int = 0, limit: int = 100):
+    ev = models.ChainEvent
+    return db.query(ev).filter(
+        ev.patient == _chain_address(patient_address), ev.event == "RecordAdded"
+    ).order_by(ev.block_number, ev.log_index).offset(skip).limit(limit).all()
+
+def get_chain_access(db: Session, patient_address: str):
+    """Current grants per counterparty: the latest access event of each kind wins."""
+    ev = models.ChainEvent
+    events = db.query(ev).filter(
+        ev.patient == _chain_address(patient_address), ev.event != "RecordAdded"
+    ).order_by(ev.block_number, ev.log_index).all()
+    state = {}
+    for e in events:
+        kind = "device" if e.event.startswith("Access") else "data"
+        state[(e.counterparty, kind)] = {
+            "counterparty": e.counterparty,
+            "kind": kind,
+            "granted": e.event in ("AccessGranted", "DataShared"),
+            "block_number": e.block_number
+        }
+    return list(state.values())
+
+def has_chain_data_access(db: Session, patient_address: str, viewer_address: str) -> bool:
+    """Indexed equivalent of the getRecords() permission check."""
+    patient, viewer = _chain_address(patient_address), _chain_address(viewer_address)
+    if patient == viewer:
+        return True
+    ev = models.ChainEvent
+    latest = db.query(ev.event).filter(
+        ev.patient == patient, ev.counterparty == viewer, ev.event.in_(("DataShared", "DataUnshared"))
+    ).order_by(ev.block_number.desc(), ev.log_index.desc()).first()
+    return latest is not None and latest.event == "DataShared"
+
+def is_hash_indexed(db: Session, patient_addresses: list, ipfs_hash: str) -> bool:
+    addresses = [_chain_address(a) for a in patient_addresses if a]
+    ev = models.ChainEvent
+    return db.query(ev.id).filter(
+        ev.event == "RecordAdded", ev.ipfs_hash == ipfs_hash, ev.patient.in_(addresses)
+    ).first() is not None
+
+def get_anchor_status(db: Session, record: models.VitalsRecord):
+    anchor = record.anchor
+    return {
+        "record_id": record.id,
+        "anchor_id": anchor.id if anchor else None,
+        "status": anchor.status if anchor else "untracked",
+        "attempts": anchor.attempts if anchor else 0,
+        "tx_hash": anchor.tx_hash if anchor else None,
+        "last_error": anchor.last_error if anchor else None,
+        "next_attempt_at": anchor.next_attempt_at if anchor else None,
+        "updated_at": anchor.updated_at if anchor else None
+    }
+
+def get_permission(db: Session, patient_wallet: str, viewer_wallet: str) -> permission_cache.Permission:
+    """(patient, viewer) view rights from document grants + on-chain data share, cached."""
+    def load(patient, viewer):
+        is_owner = patient.lower() == viewer.lower()
+        doc_ids = []
+        if not is_owner:
+            doc_ids = [row.doc_id for row in db.query(models.DocumentPermission.doc_id).join(
+                models.MedicalDocument, models.MedicalDocument.id == models.DocumentPermission.doc_id
+            ).filter(
+                func.lower(models.MedicalDocument.patient_wallet) == patient.lower(),
+                func.lower(models.DocumentPermission.viewer_wallet) == viewer.lower()
+            )]
+        chain_access = is_owner or has_chain_data_access(db, patient, viewer)
+        return permission_cache.Permission(doc_ids, chain_access, is_owner)
+
+    return permission_cache.cache.get(patient_wallet, viewer_wallet, load)
+
 def get_documents_by_wallet(db: Session, wallet_address: str, viewer_wallet: str = None):
     # 1. If viewer is owner, return all
     if viewer_wallet and viewer_wallet.lower() == wallet_address.lower():
         return db.query(models.MedicalDocument).filter(models.MedicalDocument.patient_wallet == wallet_address).all()
         
-    # 2. If viewer is specified, filter by permissions
+    # 2. If viewer is specified, filter by permissions (cached grant set, no JOIN per call)
     if viewer_wallet:
-        return db.query(models.MedicalDocument).join(
-            models.DocumentPermission, 
-            models.MedicalDocument.id == models.DocumentPermission.doc_id
-        ).filter(
+        permission = get_permission(db, wallet_address, viewer_wallet)
+        if not permission.doc_ids:
+            return []
+        return db.query(models.MedicalDocument).filter(
             models.MedicalDocument.patient_wallet == wallet_address,
-            models.DocumentPermission.viewer_wallet == viewer_wallet
+            models.MedicalDocument.id.in_(permission.doc_ids)
         ).all()
         
     # 3. Fallback (Current Behavior for backward compat if no viewer sent): Return all ??
@@ -72,27 +520,72 @@ def get_documents_by_wallet(db: Session, wallet_address: str, viewer_wallet: str
     return db.query(models.MedicalDocument).filter(models.MedicalDocument.patient_wallet == wallet_address).all()
 
 def grant_document_access(db: Session, doc_ids: list[int], viewer_wallet: str):
-    # Clear existing permissions for this tuple (optional, or just add)
-    # Let's just add if not exists
-    created = 0
-    for did in doc_ids:
-        exists = db.query(models.DocumentPermission).filter_by(doc_id=did, viewer_wallet=viewer_wallet).first()
-        if not exists:
-            perm = models.DocumentPermission(doc_id=did, viewer_wallet=viewer_wallet)
-            db.add(perm)
-            created += 1
+    """
+    Shares existing documents with a viewer in ONE statement:
+    INSERT .. SELECT .. ON CONFLICT DO NOTHING. Returns the number of new grants.
+    """
+    doc_ids = list(set(doc_ids))
+    if not doc_ids:
+        return 0
+    viewer_wallet = viewer_wallet.lower() # one grant per viewer however the address is checksummed
+    dialect = db.get_bind().dialect.name
+    docs = select(models.MedicalDocument.id, literal(viewer_wallet)).where(models.MedicalDocument.id.in_(doc_ids))
+
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(models.DocumentPermission).from_select(["doc_id", "viewer_wallet"], docs)
+        stmt = stmt.on_conflict_do_nothing(index_elements=["doc_id", "viewer_wallet"])
+        created = db.execute(stmt).rowcount
+    else:
+        existing = {row.doc_id for row in db.query(models.DocumentPermission.doc_id).filter(
+            models.DocumentPermission.viewer_wallet == viewer_wallet,
+            models.DocumentPermission.doc_id.in_(doc_ids)
+        )}
+        new_ids = [row.id for row in db.execute(docs) if row.id not in existing]
+        db.add_all(models.DocumentPermission(doc_id=did, viewer_wallet=viewer_wallet) for did in new_ids)
+        created = len(new_ids)
     db.commit()
+    permission_cache.cache.invalidate(viewer_wallet=viewer_wallet)
+    response_cache.cache.invalidate(response_cache.viewer_tag(viewer_wallet))
     return created
 
-def revoke_document_access(db: Session, viewer_wallet: str):
-    # Revoke ALL permissions for this viewer
-    # For safety, in real app we'd verify "patient" context too, but here we assume keys are unique-ish or just revoke globally.
-    # To be safer: DELETE FROM permissions WHERE viewer_wallet = X
-    # It might delete permissions to OTHER patients' docs too if the viewer sees many patients. 
-    # Current MVP assumes viewer_wallet is unique session or we blindly revoke.
-    # To do it correctly we should probably filter by doc_ids belonging to the current patient. 
-    # But current dashboard flow passes patient implicitly via access logic.
-    # Let's just delete by viewer_wallet for now as per simple req.
-    deleted = db.query(models.DocumentPermission).filter(models.DocumentPermission.viewer_wallet == viewer_wallet).delete()
+def revoke_document_access(db: Session, viewer_wallet: str, patient_wallet: str = None, doc_ids: list[int] = None):
+    """
+    Revokes a viewer's grants in ONE DELETE, scoped to `patient_wallet`'s documents
+    (DELETE .. WHERE doc_id IN (SELECT ..)) and optionally to `doc_ids`.
+    Without a patient it revokes the viewer everywhere (legacy behaviour).
+    Returns the number of grants removed.
+    """
+    perms = models.DocumentPermission
+    viewer_wallet = viewer_wallet.lower() # stored lowercased, see grant_document_access
+    query = db.query(perms).filter(perms.viewer_wallet == viewer_wallet)
+    if patient_wallet:
+        patient_docs = select(models.MedicalDocument.id).where(
+            func.lower(models.MedicalDocument.patient_wallet) == patient_wallet.lower()
+        )
+        query = query.filter(perms.doc_id.in_(patient_docs))
+    if doc_ids:
+        query = query.filter(perms.doc_id.in_(doc_ids))
+    deleted = query.delete(synchronize_session=False)
     db.commit()
+    permission_cache.cache.invalidate(patient_wallet=patient_wallet, viewer_wallet=viewer_wallet)
+    response_cache.cache.invalidate(response_cache.viewer_tag(viewer_wallet))
     return deleted
+
+def dedupe_document_permissions(bind):
+    """
+    Drops duplicate grants left by the old check-then-insert path (including the
+    same viewer in different letter case) and lowercases the rest, so the unique
+    index can be built and grant/revoke match every row.
+    """
+    with bind.begin() as conn:
+        if not inspect(conn).has_table(models.DocumentPermission.__tablename__):
+            return 0
+        perms = models.DocumentPermission.__table__
+        keep = select(func.min(perms.c.id)).group_by(perms.c.doc_id, func.lower(perms.c.viewer_wallet))
+        removed = conn.execute(perms.delete().where(perms.c.id.not_in(keep))).rowcount
+        conn.execute(perms.update().where(perms.c.viewer_wallet != func.lower(perms.c.viewer_wallet))
+                     .values(viewer_wallet=func.lower(perms.c.viewer_wallet)))
+    if removed:
+        print(f"🧹 Removed {removed} duplicate document permissions")
+    return removed
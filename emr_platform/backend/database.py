@@ -1,17 +1,106 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import sqlite_tuning
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./emr_data.db")
 
+# Connection pool (shared by the sync engine and, when enabled, the async one in async_database.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))    # extra connections allowed above the pool size under bursts
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # reconnect connections older than this (-1 = never)
+ASYNC_DB_ENABLED = os.getenv("EMR_ASYNC_DB", "0") == "1"     # serve the hot routes from async_router.py
+
+def pool_options(url: str) -> dict:
+    # In-memory SQLite uses a single-connection pool that takes no sizing options
+    if url.startswith("sqlite") and not sqlite_tuning.is_file_database(url):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": not url.startswith("sqlite"),
+    }
+
 if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+        **pool_options(SQLALCHEMY_DATABASE_URL)
     )
 else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL))
+
+def use_sqlite_profile(sync_engine):
+    """
+    WAL / synchronous / busy_timeout / cache / mmap pragmas on every new connection
+    (sqlite_tuning.py), and SQLAlchemy-issued BEGINs so write sessions can take
+    the write lock up front (the driver's own implicit BEGIN is switched off).
+    """
+    if sync_engine.dialect.name != "sqlite" or not sqlite_tuning.is_file_database(str(sync_engine.url)):
+        return
+
+    def on_connect(dbapi_conn, _):
+        sqlite_tuning.apply_pragmas(dbapi_conn)
+        dbapi_conn.isolation_level = None
+
+    def on_begin(conn):
+        conn.exec_driver_sql(sqlite_tuning.begin_statement(conn.get_execution_options()))
+
+    event.listen(sync_engine, "connect", on_connect)
+    event.listen(sync_engine, "begin", on_begin)
+
+use_sqlite_profile(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Request sessions that read and then write (ingest); no-op option outside SQLite
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine.execution_options(sqlite_immediate=True))
+
+# Readers outside the request path (show_records.py, reports): mode=ro connections
+# that cannot write and, under WAL, never hold up ingestion
+if engine.dialect.name == "sqlite" and sqlite_tuning.is_file_database(SQLALCHEMY_DATABASE_URL):
+    SQLITE_PATH = engine.url.database
+    readonly_engine = create_engine(
+        "sqlite://", creator=lambda: sqlite_tuning.connect_readonly(SQLITE_PATH),
+        poolclass=QueuePool, **pool_options(SQLALCHEMY_DATABASE_URL)
+    )
+    checkpointer = sqlite_tuning.WalCheckpointer(SQLITE_PATH)
+else:
+    SQLITE_PATH = None
+    readonly_engine = engine
+    checkpointer = None
+
+ReadOnlySessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=readonly_engine)
+
+Base = declarative_base()
+
+def sync_schema(metadata, bind=engine):
+    """
+    Lightweight forward-only migration for existing databases.
+    `create_all` only creates missing tables, so new nullable columns and
+    new indexes on already-existing tables are added here.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_cols = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_cols:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                print(f"🛠️ Added column {table.name}.{column.name}")
 
-Base = declarative_base()
\ No newline at end of file
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=bind, checkfirst=True)
+            except Exception as e:
+                print(f"⚠️ Could not create index {index.name}: {e}")
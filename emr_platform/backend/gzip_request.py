@@ -0,0 +1,58 @@
+import gzip
+import os
+import zlib
+
+# Accepts gzip-encoded request bodies (Content-Encoding: gzip), as sent by
+# emr_client for large vitals batches. Decompression is capped so a small
+# compressed body cannot expand into an unbounded one.
+
+MAX_REQUEST_BODY = int(os.getenv("MAX_REQUEST_BODY", str(50 * 1024 * 1024))) # bytes after decompression
+
+class GzipRequestMiddleware:
+    def __init__(self, app, max_body: int = MAX_REQUEST_BODY):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if headers.get(b"content-encoding", b"").lower() != b"gzip":
+            return await self.app(scope, receive, send)
+
+        compressed = bytearray()
+        more = True
+        while more:
+            message = await receive()
+            compressed += message.get("body", b"")
+            more = message.get("more_body", False)
+        try:
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decoder.decompress(bytes(compressed), self.max_body + 1)
+            if len(body) > self.max_body:
+                return await _reply(send, 413, b'{"detail":"Request body too large"}')
+            if not decoder.eof:
+                raise gzip.BadGzipFile("truncated gzip body")
+        except (zlib.error, gzip.BadGzipFile):
+            return await _reply(send, 400, b'{"detail":"Invalid gzip request body"}')
+
+        # Hand the app a plain body with matching headers
+        scope = dict(scope)
+        scope["headers"] = [
+            (k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode())]
+        sent = False
+
+        async def receive_plain():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, receive_plain, send)
+
+async def _reply(send, status: int, body: bytes):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import main_router, models
-from database import engine
+import main_router, models, crud
+import anchor_worker
+import chain_indexer
+from database import engine, sync_schema, SessionLocal, ASYNC_DB_ENABLED, checkpointer
+from gzip_request import GzipRequestMiddleware
+import os
 import time
 from sqlalchemy.exc import OperationalError
 
@@ -14,7 +18,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # keyset pagination of vitals
 )
+# gzip-encoded request bodies (large gateway batches from emr_client)
+app.add_middleware(GzipRequestMiddleware)
 
 @app.on_event("startup")
 def startup_db_client():
@@ -22,6 +29,8 @@ def startup_db_client():
     while retries > 0:
         try:
             models.Base.metadata.create_all(bind=engine)
+            crud.dedupe_document_permissions(engine)
+            sync_schema(models.Base.metadata)
             print("✅ Database tables created successfully.")
             break
         except OperationalError:
@@ -29,6 +38,46 @@ def startup_db_client():
             print(f"⏳ Database not ready. Retrying in 2 seconds... ({retries} retries left)")
             time.sleep(2)
 
+    # One-off backfill of the 1m/1h rollups for databases that predate them
+    db = SessionLocal()
+    try:
+        if crud.rollups_need_backfill(db):
+            print("📊 Backfilling vitals rollups...")
+            crud.rebuild_rollups(db)
+    finally:
+        db.close()
+
+    # Chain writes are drained from the outbox off the request path
+    if os.getenv("ANCHOR_WORKER_ENABLED", "1") == "1":
+        anchor_worker.worker.start()
+
+    # Chain logs -> chain_events, so chain reads are SQL queries
+    if os.getenv("CHAIN_INDEXER_ENABLED", "1") == "1":
+        chain_indexer.indexer.start()
+
+    # SQLite: fold the WAL back into the database file off the request path
+    if checkpointer is not None:
+        checkpointer.start()
+
+@app.on_event("shutdown")
+def shutdown_background_workers():
+    anchor_worker.worker.stop()
+    chain_indexer.indexer.stop()
+    if checkpointer is not None:
+        checkpointer.stop()
+
+# Opt-in async DB path: its routes are registered first so they shadow the sync ones
+if ASYNC_DB_ENABLED:
+    import async_router
+    from async_database import dispose_async_engine
+    app.include_router(async_router.router, prefix="/api/v1")
+
+    @app.on_event("shutdown")
+    async def shutdown_async_engine():
+        await dispose_async_engine()
+
+    print("⚡ Async database routes enabled")
+
 app.include_router(main_router.router, prefix="/api/v1")
 
 @app.get("/")
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
+import json
+import os
 
 import crud, models, schemas
-from database import SessionLocal, engine
+import pubsub
+import permission_cache
+import response_cache
+import anchor_worker
+from database import SessionLocal, WriteSessionLocal, engine
 
 router = APIRouter()
 
@@ -15,45 +23,252 @@ def get_db():
     finally:
         db.close()
 
+def get_write_db():
+    # Read-then-write requests: takes SQLite's write lock at BEGIN (database.WriteSessionLocal)
+    db = WriteSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 @router.post("/patients/", response_model=schemas.Patient)
-def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)):
+def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_write_db)):
     db_patient = crud.get_patient_by_wallet(db, wallet_address=patient.wallet_address)
     if db_patient:
         raise HTTPException(status_code=400, detail="Patient already registered")
     return crud.create_patient(db=db, patient=patient)
 
-@router.get("/patients/", response_model=List[schemas.Patient])
-def read_patients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    patients = crud.get_patients(db, skip=skip, limit=limit)
-    return patients
+MAX_EMBEDDED_RECORDS = 1000
+
+@router.get("/patients/", response_model=List[schemas.PatientSummary], response_model_exclude_unset=True)
+def read_patients(
+    skip: int = 0,
+    limit: int = 100,
+    include: Optional[str] = None, # "records" embeds each patient's newest vitals
+    records_limit: int = Query(100, ge=1, le=MAX_EMBEDDED_RECORDS),
+    db: Session = Depends(get_db)
+):
+    return crud.get_patient_summaries(
+        db, skip=skip, limit=limit, include_records=include == "records", records_limit=records_limit
+    )
+
+@router.get("/patients/by-wallet/{wallet_address}", response_model=schemas.PatientSummary, response_model_exclude_unset=True)
+def read_patient_by_wallet(
+    wallet_address: str,
+    request: Request,
+    include: Optional[str] = None,
+    records_limit: int = Query(100, ge=1, le=MAX_EMBEDDED_RECORDS),
+    db: Session = Depends(get_db)
+):
+    # Served from response_cache (ETag / 304); the DB is only read on a miss
+    include_records = include == "records"
+
+    def load():
+        summaries = crud.get_patient_summaries(
+            db, wallet_address=wallet_address, limit=1, include_records=include_records, records_limit=records_limit
+        )
+        if not summaries:
+            # Cached briefly as "not found"; creating the patient drops it via the wallet tag
+            return None, (response_cache.wallet_tag(wallet_address),)
+        body = response_cache.render(schemas.PatientSummary, summaries[0], exclude_unset=True)
+        return body, (response_cache.wallet_tag(wallet_address), response_cache.patient_tag(summaries[0]["id"]))
 
-@router.get("/patients/by-wallet/{wallet_address}", response_model=schemas.Patient)
-def read_patient_by_wallet(wallet_address: str, db: Session = Depends(get_db)):
-    db_patient = crud.get_patient_by_wallet(db, wallet_address=wallet_address)
-    if db_patient is None:
+    key = (wallet_address, records_limit if include_records else None)
+    entry = response_cache.cache.get("patient_by_wallet", key, load)
+    if not entry.found:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return db_patient
+    return response_cache.cache.respond(request, "patient_by_wallet", entry)
 
 @router.post("/patients/{patient_id}/vitals/", response_model=schemas.Vitals)
 def create_vitals_for_patient(
-    patient_id: int, vitals: schemas.VitalsCreate, db: Session = Depends(get_db)
+    patient_id: int, vitals: schemas.VitalsCreate, db: Session = Depends(get_write_db)
 ):
     return crud.create_patient_vitals(db=db, vitals=vitals, patient_id=patient_id)
 
-@router.get("/patients/{patient_id}/vitals/", response_model=List[schemas.Vitals])
-def read_vitals(patient_id: int, db: Session = Depends(get_db)):
-    return crud.get_vitals(db, patient_id=patient_id)
+@router.post("/patients/{patient_id}/vitals/batch", response_model=schemas.VitalsBatchResult)
+def create_vitals_batch_for_patient(
+    patient_id: int, vitals: List[schemas.VitalsCreate], db: Session = Depends(get_write_db)
+):
+    if crud.get_patient(db, patient_id=patient_id) is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    ids = crud.create_patient_vitals_batch(db=db, vitals_list=vitals, patient_id=patient_id)
+    return {"patient_id": patient_id, "count": len(ids), "ids": ids}
+
+MAX_VITALS_PAGE = 5000
+
+@router.get("/patients/{patient_id}/vitals/", response_model=Union[List[schemas.Vitals], List[schemas.VitalsRollup]])
+def read_vitals(
+    patient_id: int,
+    response: Response,
+    resolution: str = "raw", # raw / 1m / 1h / auto (picked from the since..until span)
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_VITALS_PAGE),
+    cursor: Optional[str] = None, # from the previous page's X-Next-Cursor header
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    if resolution == "auto":
+        resolution = crud.pick_resolution(since, until)
+    if resolution != "raw":
+        if resolution not in models.ROLLUP_TABLES:
+            raise HTTPException(status_code=400, detail=f"Unknown resolution '{resolution}'")
+        return crud.get_vitals_rollup(db, patient_id=patient_id, resolution=resolution, since=since, until=until)
+
+    if cursor:
+        try:
+            crud.decode_vitals_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        # Whole history, one row per line, constant memory
+        return StreamingResponse(
+            crud.stream_vitals(patient_id, since=since, until=until, cursor=cursor, order=order),
+            media_type="application/x-ndjson"
+        )
+
+    rows, next_cursor = crud.get_vitals_page(
+        db, patient_id=patient_id, since=since, until=until, limit=limit, cursor=cursor, order=order
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+# Live push (Server-Sent Events)
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))   # Per subscriber, oldest dropped when full
+SSE_BACKFILL_LIMIT = 1000                                   # Older history -> paginated GET
+
+def _sse_event(message: dict) -> str:
+    cursor = crud.encode_vitals_cursor(message["timestamp"], message["id"])
+    return f"id: {cursor}\nevent: vitals\ndata: {json.dumps(message)}\n\n"
+
+def _backfill(patient_id: int, since: Optional[float], cursor: Optional[str]):
+    db = SessionLocal()
+    try:
+        rows, _ = crud.get_vitals_page(db, patient_id, since=since, cursor=cursor, limit=SSE_BACKFILL_LIMIT)
+        return [crud.vitals_message(r) for r in rows]
+    finally:
+        db.close()
+
+@router.get("/patients/{patient_id}/vitals/stream")
+async def stream_vitals_live(
+    patient_id: int,
+    request: Request,
+    since: Optional[float] = None, # resume: replay readings newer than this timestamp first
+    last_event_id: Optional[str] = Header(None), # sent by EventSource on reconnect
+):
+    """
+    SSE feed of new vitals, pushed as soon as ingestion commits them.
+    On (re)connect, readings after Last-Event-ID / `since` are replayed from
+    the DB first (up to SSE_BACKFILL_LIMIT), then live events follow.
+    Comment heartbeats keep proxies from closing idle streams; an `overflow`
+    event tells a slow client that readings were dropped and it should resync.
+    """
+    cursor = None
+    if last_event_id:
+        try:
+            crud.decode_vitals_cursor(last_event_id)
+            cursor = last_event_id
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    # Subscribe BEFORE the backfill so nothing committed in between is missed
+    sub = pubsub.broker.subscribe(patient_id, maxsize=SSE_QUEUE_SIZE)
+
+    async def events():
+        try:
+            last_key = None
+            if cursor or since is not None:
+                for message in await run_in_threadpool(_backfill, patient_id, since, cursor):
+                    last_key = (message["timestamp"], message["id"])
+                    yield _sse_event(message)
+            yield "retry: 2000\n: connected\n\n"
+
+            while True:
+                messages = await sub.get(timeout=SSE_HEARTBEAT)
+                if await request.is_disconnected():
+                    break
+                dropped = sub.take_dropped()
+                if dropped:
+                    yield f"event: overflow\ndata: {json.dumps({'dropped': dropped})}\n\n"
+                if not messages:
+                    yield ": heartbeat\n\n"
+                    continue
+                for message in messages:
+                    # Skip rows the backfill already sent
+                    if last_key and (message["timestamp"], message["id"]) <= last_key:
+                        continue
+                    yield _sse_event(message)
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Chain-derived reads (served from chain_indexer tables)
+@router.get("/chain/patients/{patient_address}/records", response_model=List[schemas.ChainRecord])
+def read_chain_records(
+    patient_address: str, viewer_wallet: str, skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)
+):
+    # Same rule as HealthRecord.getRecords: the patient or a doctor they shared data with
+    if not crud.get_permission(db, patient_address, viewer_wallet).can_view_records:
+        raise HTTPException(status_code=403, detail="Access Denied: no data share on-chain for this viewer")
+    return crud.get_chain_records(db, patient_address, skip=skip, limit=limit)
+
+@router.get("/chain/patients/{patient_address}/access", response_model=List[schemas.ChainAccess])
+def read_chain_access(patient_address: str, db: Session = Depends(get_db)):
+    return crud.get_chain_access(db, patient_address)
+
+@router.get("/metrics/cache")
+def read_cache_metrics():
+    return {"permissions": permission_cache.cache.metrics(), "responses": response_cache.cache.metrics()}
+
+@router.get("/vitals/{record_id}/verify", response_model=schemas.VitalsProof)
+def verify_vitals(record_id: int, db: Session = Depends(get_db)):
+    record = crud.get_vitals_record(db, record_id=record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Vitals record not found")
+    return crud.verify_vitals_record(db, record)
+
+@router.get("/vitals/{record_id}/anchor", response_model=schemas.AnchorStatus)
+def read_vitals_anchor(record_id: int, db: Session = Depends(get_db)):
+    record = crud.get_vitals_record(db, record_id=record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Vitals record not found")
+    return crud.get_anchor_status(db, record)
+
+@router.post("/anchors/retry")
+def retry_failed_anchors(req: schemas.AnchorRetryRequest):
+    # Re-drives `failed` anchors, e.g. after the patient authorized the hospital on-chain
+    count = anchor_worker.worker.retry_failed(req.anchor_ids)
+    return {"status": "success", "requeued_count": count}
+
 @router.get("/patients/by-wallet/{wallet_address}/documents", response_model=List[schemas.MedicalDocument])
-def read_documents_by_wallet(wallet_address: str, viewer_wallet: str = None, db: Session = Depends(get_db)):
-    return crud.get_documents_by_wallet(db, wallet_address=wallet_address, viewer_wallet=viewer_wallet)
+def read_documents_by_wallet(request: Request, wallet_address: str, viewer_wallet: str = None, db: Session = Depends(get_db)):
+    def load():
+        docs = crud.get_documents_by_wallet(db, wallet_address=wallet_address, viewer_wallet=viewer_wallet)
+        tags = [response_cache.wallet_tag(wallet_address)] + ([response_cache.viewer_tag(viewer_wallet)] if viewer_wallet else [])
+        return response_cache.render(List[schemas.MedicalDocument], docs), tags
+
+    key = (wallet_address, viewer_wallet.lower() if viewer_wallet else None)
+    entry = response_cache.cache.get("documents_by_wallet", key, load)
+    return response_cache.cache.respond(request, "documents_by_wallet", entry)
 
 @router.post("/documents/share")
-def share_documents(req: schemas.ShareRequest, db: Session = Depends(get_db)):
+def share_documents(req: schemas.ShareRequest, db: Session = Depends(get_write_db)):
     count = crud.grant_document_access(db, req.doc_ids, req.recipient_wallet)
     return {"status": "success", "granted_count": count}
 @router.post("/documents/revoke")
-def revoke_documents(req: schemas.ShareRequest, db: Session = Depends(get_db)):
-    # Using ShareRequest to get recipient_wallet. We'll revoke ALL docs for this viewer.
-    # In a real app we might want specific doc revocations too, but here we align with blockchain logic which revokes relationship.
-    count = crud.revoke_document_access(db, req.recipient_wallet)
+def revoke_documents(req: schemas.ShareRequest, db: Session = Depends(get_write_db)):
+    # Using ShareRequest to get recipient_wallet. Revokes the viewer's grants on `patient_wallet`'s
+    # documents (all of them, or just `doc_ids`), aligned with the on-chain revokeDataAccess.
+    # Without patient_wallet the viewer loses every grant (legacy behaviour).
+    count = crud.revoke_document_access(db, req.recipient_wallet, patient_wallet=req.patient_wallet, doc_ids=req.doc_ids)
     return {"status": "success", "revoked_count": count}
@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+# Binary Merkle tree over SHA-256 (hex encoded).
+# Leaves and inner nodes use different prefixes so a leaf can never be
+# passed off as an inner node. An odd node at any level is paired with itself,
+# which lets a proof be verified from (leaf_index, siblings) alone.
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def vitals_leaf(bpm: int, spo2: int, timestamp: float, is_critical: bool) -> str:
+    """
+    Canonical leaf hash of a single vitals reading.
+    The gateway and the EMR backend MUST both hash readings through this function.
+    """
+    payload = json.dumps(
+        {"bpm": int(bpm), "spo2": int(spo2), "timestamp": float(timestamp), "is_critical": bool(is_critical)},
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return _sha256(LEAF_PREFIX + payload.encode())
+
+def hash_pair(left: str, right: str) -> str:
+    return _sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right))
+
+def build_tree(leaves: list[str]):
+    """
+    Returns (root, proofs) where proofs[i] is the list of sibling hashes
+    from leaf i up to the root.
+    """
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+
+    proofs = [[] for _ in leaves]
+    # positions[i] = index of leaf i's ancestor in the current level
+    positions = list(range(len(leaves)))
+    level = list(leaves)
+
+    while len(level) > 1:
+        if len(level) % 2 == 1:
+            level.append(level[-1])
+        for i, pos in enumerate(positions):
+            proofs[i].append(level[pos ^ 1])
+            positions[i] = pos // 2
+        level = [hash_pair(level[j], level[j + 1]) for j in range(0, len(level), 2)]
+
+    return level[0], proofs
+
+def compute_root(leaf: str, index: int, proof: list[str]) -> str:
+    """Folds an inclusion proof back up to the root in O(log n)."""
+    node = leaf
+    for sibling in proof:
+        if index % 2 == 0:
+            node = hash_pair(node, sibling)
+        else:
+            node = hash_pair(sibling, node)
+        index //= 2
+    return node
+
+def verify_proof(leaf: str, index: int, proof: list[str], root: str) -> bool:
+    return compute_root(leaf, index, proof) == root
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import time
@@ -15,6 +15,10 @@ class Patient(Base):
 
 class VitalsRecord(Base):
     __tablename__ = "vitals_records"
+    __table_args__ = (
+        # Time-range reads per patient (charts, "latest N") walk this index instead of the table
+        Index("ix_vitals_records_patient_ts", "patient_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -26,8 +30,117 @@ class VitalsRecord(Base):
     is_critical = Column(Boolean, default=False)
     ipfs_hash = Column(String, nullable=True) # Anchored on blockchain
     session_address = Column(String, nullable=True) # Privacy-preserving transaction address
+
+    # Merkle anchoring: one root per batch goes on-chain, each row keeps its own proof
+    merkle_root = Column(String, nullable=True, index=True)
+    merkle_index = Column(Integer, nullable=True)
+    merkle_proof = Column(Text, nullable=True) # JSON list of sibling hashes (leaf -> root)
+
+    # Pending/sent/confirmed on-chain anchor for this row's Merkle root
+    anchor_id = Column(Integer, ForeignKey("anchor_outbox.id"), nullable=True, index=True)
     
     patient = relationship("Patient", back_populates="records")
+    anchor = relationship("AnchorOutbox")
+
+class VitalsRollupMixin:
+    """
+    Pre-aggregated vitals per patient and time bucket, upserted on ingest
+    (crud._update_rollups) so trend charts read one row per bucket.
+    """
+    BUCKET_SECONDS = None
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, nullable=False)
+    bucket = Column(Integer, nullable=False) # bucket start, epoch seconds
+
+    count = Column(Integer, default=0)
+    critical_count = Column(Integer, default=0)
+    bpm_min = Column(Integer)
+    bpm_max = Column(Integer)
+    bpm_sum = Column(Integer, default=0)
+    spo2_min = Column(Integer)
+    spo2_max = Column(Integer)
+    spo2_sum = Column(Integer, default=0)
+
+    @property
+    def bucket_seconds(self):
+        return self.BUCKET_SECONDS
+
+    @property
+    def bpm_avg(self):
+        return self.bpm_sum / self.count if self.count else None
+
+    @property
+    def spo2_avg(self):
+        return self.spo2_sum / self.count if self.count else None
+
+class VitalsRollup1m(VitalsRollupMixin, Base):
+    __tablename__ = "vitals_rollup_1m"
+    __table_args__ = (Index("ux_vitals_rollup_1m_patient_bucket", "patient_id", "bucket", unique=True),)
+    BUCKET_SECONDS = 60
+
+class VitalsRollup1h(VitalsRollupMixin, Base):
+    __tablename__ = "vitals_rollup_1h"
+    __table_args__ = (Index("ux_vitals_rollup_1h_patient_bucket", "patient_id", "bucket", unique=True),)
+    BUCKET_SECONDS = 3600
+
+ROLLUP_TABLES = {"1m": VitalsRollup1m, "1h": VitalsRollup1h}
+
+class AnchorOutbox(Base):
+    """
+    Durable queue of chain writes. Rows are inserted in the same DB transaction
+    as the vitals they anchor and drained by anchor_worker.AnchorWorker.
+    """
+    __tablename__ = "anchor_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_address = Column(String)
+    ipfs_hash = Column(String) # Merkle root to anchor
+    is_critical = Column(Boolean, default=False)
+    # The uploader (gateway) says it minted this root itself; the worker looks it up on-chain before sending
+    gateway_minted = Column(Boolean, default=False)
+
+    status = Column(String, default="pending", index=True) # pending / sent / confirmed / failed / external (found on-chain, minted by the gateway)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Float, default=time.time, index=True)
+    tx_hash = Column(String, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    created_at = Column(Float, default=time.time)
+    updated_at = Column(Float, default=time.time, onupdate=time.time)
+
+class ChainEvent(Base):
+    """
+    HealthRecord contract logs, copied by chain_indexer.ChainIndexer so chain
+    reads are indexed SQL queries instead of getRecords() over the whole array.
+    """
+    __tablename__ = "chain_events"
+    __table_args__ = (
+        Index("ux_chain_events_tx_log", "tx_hash", "log_index", unique=True),
+        Index("ix_chain_events_patient_event", "patient", "event", "block_number"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    block_number = Column(Integer, index=True)
+    block_hash = Column(String)
+    tx_hash = Column(String)
+    log_index = Column(Integer)
+
+    # RecordAdded / AccessGranted / AccessRevoked / DataShared / DataUnshared
+    event = Column(String)
+    patient = Column(String)
+    counterparty = Column(String, nullable=True, index=True) # device or doctor for access events
+    ipfs_hash = Column(String, nullable=True, index=True)    # RecordAdded only
+    is_critical = Column(Boolean, nullable=True)
+    timestamp = Column(Integer, nullable=True)
+
+class ChainCheckpoint(Base):
+    __tablename__ = "chain_checkpoints"
+
+    name = Column(String, primary_key=True) # one row per indexed contract
+    block_number = Column(Integer)          # last fully indexed block
+    block_hash = Column(String)             # to detect a reorg under the checkpoint
+    updated_at = Column(Float, default=time.time, onupdate=time.time)
 
 class MedicalDocument(Base):
     __tablename__ = "medical_documents"
@@ -41,6 +154,10 @@ class MedicalDocument(Base):
 
 class DocumentPermission(Base):
     __tablename__ = "document_permissions"
+    __table_args__ = (
+        # One grant per (document, viewer): bulk shares rely on it for ON CONFLICT DO NOTHING
+        Index("ux_document_permissions_doc_viewer", "doc_id", "viewer_wallet", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     doc_id = Column(Integer, index=True)
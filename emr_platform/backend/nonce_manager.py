@@ -0,0 +1,92 @@
+import threading
+
+from eth_account import Account
+
+# Node error messages that mean "our local nonce is out of sync with the chain"
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "invalid transaction nonce",
+    "the tx doesn't have the correct nonce",
+)
+
+# The node already holds this exact signed transaction: it was accepted, re-signing would duplicate it
+KNOWN_TX_ERRORS = (
+    "already known",
+    "known transaction",
+)
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(pattern in message for pattern in NONCE_ERRORS)
+
+def is_known_transaction(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(pattern in message for pattern in KNOWN_TX_ERRORS)
+
+class _AccountNonce:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next = None # None -> fetch from the node on next allocation
+
+class NonceManager:
+    """
+    Hands out nonces locally so transactions from one signing account can be
+    pipelined without a `get_transaction_count` round trip per transaction.
+
+    The node is only asked once per account and again after a resync (a send
+    failed, so the allocated nonce left a gap, or the node reported a nonce error).
+    Submission is ordered per account so nonces reach the node without gaps, but
+    nobody waits for mining: many transactions can be in flight at once.
+    Shared by the EMR backend (blockchain_utils) and the hardware gateway.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._lock = threading.Lock()
+        self._accounts = {}
+
+    def _state(self, address: str) -> _AccountNonce:
+        with self._lock:
+            state = self._accounts.get(address)
+            if state is None:
+                state = self._accounts[address] = _AccountNonce()
+            return state
+
+    def _next(self, state: _AccountNonce, address: str) -> int:
+        if state.next is None:
+            state.next = self.w3.eth.get_transaction_count(address, "pending")
+        return state.next
+
+    def resync(self, address: str):
+        state = self._state(address)
+        with state.lock:
+            state.next = None
+
+    def send_transaction(self, private_key: str, build_tx, retries: int = 3):
+        """
+        Allocates a nonce, builds the tx with `build_tx(nonce)`, signs and sends it.
+        Retries with a fresh nonce when the node rejects the nonce; a node that
+        already has the signed tx counts as sent. Returns the transaction hash.
+        """
+        account = Account.from_key(private_key)
+        state = self._state(account.address)
+        for attempt in range(retries):
+            with state.lock:
+                nonce = self._next(state, account.address)
+                signed = None
+                try:
+                    signed = account.sign_transaction(build_tx(nonce))
+                    tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+                except Exception as e:
+                    if signed is None or not is_known_transaction(e):
+                        # The nonce was not consumed -> refetch so later txs don't queue behind a gap
+                        state.next = None
+                        if not is_nonce_error(e) or attempt == retries - 1:
+                            raise
+                        print(f"🔁 Nonce {nonce} rejected for {account.address[:8]}... ({e}), resyncing")
+                        continue
+                    tx_hash = signed.hash # already in the node's pool under this nonce
+                state.next = nonce + 1
+                return tx_hash
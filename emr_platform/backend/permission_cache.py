@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# In-memory view permissions keyed by (patient wallet, viewer wallet).
+#
+# One entry merges both sources of truth:
+#   doc_ids        off-chain DocumentPermission grants on the patient's documents
+#   chain_access   on-chain DataShared/DataUnshared state (from chain_indexer)
+#
+# Entries are dropped when grants change (crud.grant/revoke_document_access)
+# or when the indexer sees a DataShared/DataUnshared event. The TTL only
+# bounds staleness for writes made by another process.
+
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", "60"))
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", "10000"))
+
+class Permission:
+    __slots__ = ("doc_ids", "chain_access", "is_owner", "loaded_at")
+
+    def __init__(self, doc_ids, chain_access: bool, is_owner: bool):
+        self.doc_ids = frozenset(doc_ids)
+        self.chain_access = chain_access
+        self.is_owner = is_owner
+        self.loaded_at = time.time()
+
+    def can_view_document(self, doc_id: int) -> bool:
+        return self.is_owner or doc_id in self.doc_ids
+
+    @property
+    def can_view_records(self) -> bool:
+        return self.is_owner or self.chain_access
+
+def _key(wallet: str) -> str:
+    return (wallet or "").lower()
+
+class PermissionCache:
+    def __init__(self, ttl: float = PERMISSION_CACHE_TTL, max_entries: int = PERMISSION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (patient, viewer) -> Permission, LRU order
+        self._version = 0              # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, patient_wallet: str, viewer_wallet: str, loader) -> Permission:
+        """Cached permission; `loader(patient, viewer)` builds it on a miss."""
+        key = (_key(patient_wallet), _key(viewer_wallet))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.loaded_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            version = self._version
+
+        entry = loader(patient_wallet, viewer_wallet)
+
+        with self._lock:
+            # Don't cache a result computed while an invalidation happened
+            if version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, patient_wallet: str = None, viewer_wallet: str = None):
+        """Drops matching entries (both None -> everything)."""
+        patient, viewer = _key(patient_wallet), _key(viewer_wallet)
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            if patient_wallet is None and viewer_wallet is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries
+                        if (patient_wallet is None or k[0] == patient) and (viewer_wallet is None or k[1] == viewer)]:
+                del self._entries[key]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl
+            }
+
+cache = PermissionCache()
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from collections import deque
+
+# In-process fan-out of freshly ingested vitals to live subscribers (SSE).
+#
+# Ingestion runs in FastAPI's threadpool and calls `broker.publish` after its
+# commit; every subscriber lives on the event loop and owns a bounded deque.
+# A slow client never blocks ingestion or other clients: when its queue is
+# full the oldest message is dropped and counted, so it can resync.
+
+class Subscription:
+    def __init__(self, broker, topic, loop, maxsize: int):
+        self.broker = broker
+        self.topic = topic
+        self.loop = loop
+        self.queue = deque(maxlen=maxsize)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def _push(self, message):
+        # Runs on the subscriber's event loop (scheduled by publish)
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(message)
+        self._ready.set()
+
+    async def get(self, timeout: float):
+        """Waits up to `timeout` seconds, returns all queued messages (possibly none)."""
+        if not self.queue:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        messages = list(self.queue)
+        self.queue.clear()
+        return messages
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class Broker:
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._topics = {}
+        self.published = 0
+
+    def subscribe(self, topic, maxsize: int = None) -> Subscription:
+        """Call from a coroutine: messages are delivered on the running loop."""
+        sub = Subscription(self, topic, asyncio.get_running_loop(), maxsize or self.queue_size)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._topics.get(sub.topic)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._topics[sub.topic]
+
+    def publish(self, topic, message):
+        """Thread-safe, never blocks. No-op when nobody is listening."""
+        with self._lock:
+            subs = list(self._topics.get(topic, ()))
+        self.published += 1
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._push, message)
+            except RuntimeError:
+                # Loop already closed (server shutting down)
+                self.unsubscribe(sub)
+
+    def subscriber_count(self, topic=None) -> int:
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return sum(len(s) for s in self._topics.values())
+
+broker = Broker()
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+# Read-through cache of serialized JSON responses for hot, rarely changing
+# reads (patient by wallet, documents by wallet). A hit answers from memory
+# without opening a DB connection, and the ETag lets clients revalidate with
+# If-None-Match -> 304 (no body).
+#
+# Entries carry tags ("wallet:<addr>", "patient:<id>", "viewer:<addr>") and
+# crud.py drops them by tag when it writes (patient create, vitals ingest,
+# document share/revoke). The TTL only bounds staleness for writes made by
+# another process (e.g. documents added straight into the database).
+#
+# Not-found results (404) are cached too, for RESPONSE_CACHE_NEGATIVE_TTL, so
+# polling an unregistered wallet does not hit the database on every call.
+#
+# A result loaded while one of ITS tags was invalidated is not stored (it may
+# predate the write); invalidations of other tags do not affect it.
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_NEGATIVE_TTL = float(os.getenv("RESPONSE_CACHE_NEGATIVE_TTL", "5")) # seconds a 404 is remembered
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "tags", "loaded_at", "ttl")
+
+    def __init__(self, body, tags, ttl: float):
+        self.body = body # None: cached "not found"
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"' if body is not None else None
+        self.tags = frozenset(tags)
+        self.loaded_at = time.time()
+        self.ttl = ttl
+
+    @property
+    def found(self) -> bool:
+        return self.body is not None
+
+def wallet_tag(wallet: str) -> str:
+    return f"wallet:{(wallet or '').lower()}"
+
+def viewer_tag(wallet: str) -> str:
+    return f"viewer:{(wallet or '').lower()}"
+
+def patient_tag(patient_id: int) -> str:
+    return f"patient:{patient_id}"
+
+class ResponseCache:
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_SIZE,
+                 negative_ttl: float = RESPONSE_CACHE_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (route name, key) -> CachedResponse, LRU order
+        self._tags = {}                # tag -> set of entry keys (invalidation without a scan)
+        self._generation = 0           # bumped by every invalidation
+        self._tag_generations = OrderedDict() # tag -> generation of its last invalidation (bounded)
+        self._forgotten = 0            # newest generation dropped from _tag_generations, or of a full clear
+        self._stats = {}               # route name -> counters
+        self.invalidations = 0
+
+    def _counter(self, name: str) -> dict:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {"hits": 0, "misses": 0, "not_modified": 0}
+        return stats
+
+    def lookup(self, name: str, key):
+        """(entry or None, version); pass the version to `store` after loading."""
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is not None and time.time() - entry.loaded_at < entry.ttl:
+                self._entries.move_to_end((name, key))
+                self._counter(name)["hits"] += 1
+                return entry, self._generation
+            self._counter(name)["misses"] += 1
+            return None, self._generation
+
+    def _invalidated_since(self, tags, version: int) -> bool:
+        if self._forgotten > version:
+            return True # can't tell for tags no longer tracked: assume the worst
+        return any(self._tag_generations.get(tag, 0) > version for tag in tags)
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(entry_key)
+                if not keys:
+                    del self._tags[tag]
+
+    def store(self, name: str, key, body, tags, version: int) -> CachedResponse:
+        """Caches `body` (None -> "not found", kept for `negative_ttl`) unless its tags changed since `version`."""
+        entry = CachedResponse(body, tags, self.ttl if body is not None else self.negative_ttl)
+        entry_key = (name, key)
+        with self._lock:
+            # Don't cache a result loaded while one of its tags was invalidated
+            if not self._invalidated_since(entry.tags, version):
+                self._remove(entry_key)
+                self._entries[entry_key] = entry
+                for tag in entry.tags:
+                    self._tags.setdefault(tag, set()).add(entry_key)
+                while len(self._entries) > self.max_entries:
+                    self._remove(next(iter(self._entries)))
+        return entry
+
+    def get(self, name: str, key, loader):
+        """
+        Cached entry; `loader()` returns (body, tags), with body None for "not found"
+        (check `entry.found`), or None for nothing to cache.
+        """
+        entry, version = self.lookup(name, key)
+        if entry is not None:
+            return entry
+        loaded = loader()
+        return None if loaded is None else self.store(name, key, *loaded, version)
+
+    async def aget(self, name: str, key, loader):
+        """`get` for an async loader (async_router.py)."""
+        entry, version = self.lookup(name, key)
+        if entry is not None:
+            return entry
+        loaded = await loader()
+        return None if loaded is None else self.store(name, key, *loaded, version)
+
+    def invalidate(self, *tags):
+        """Drops entries carrying any of `tags` (no tags -> everything)."""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if not tags:
+                self._entries.clear()
+                self._tags.clear()
+                self._tag_generations.clear()
+                self._forgotten = self._generation
+                return
+            for tag in tags:
+                self._tag_generations[tag] = self._generation
+                self._tag_generations.move_to_end(tag)
+                for entry_key in list(self._tags.get(tag, ())):
+                    self._remove(entry_key)
+            while len(self._tag_generations) > self.max_entries:
+                self._forgotten = max(self._forgotten, self._tag_generations.popitem(last=False)[1])
+
+    def respond(self, request: Request, name: str, entry: CachedResponse) -> Response:
+        """200 with the cached body, or 304 when the client already has this ETag."""
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"} # always revalidate
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            with self._lock:
+                self._counter(name)["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            hits = sum(s["hits"] for s in self._stats.values())
+            misses = sum(s["misses"] for s in self._stats.values())
+            routes = {
+                name: dict(s, hit_ratio=round(s["hits"] / (s["hits"] + s["misses"]), 4) if s["hits"] + s["misses"] else 0.0)
+                for name, s in self._stats.items()
+            }
+            return {
+                "entries": len(self._entries),
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "invalidations": self.invalidations,
+                "negative_entries": sum(1 for e in self._entries.values() if not e.found),
+                "ttl_seconds": self.ttl,
+                "negative_ttl_seconds": self.negative_ttl,
+                "routes": routes
+            }
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+@lru_cache(maxsize=None)
+def _adapter(model):
+    return TypeAdapter(model)
+
+def render(model, value, exclude_unset: bool = False) -> bytes:
+    """JSON body for `value` (ORM rows / dicts) exactly as the route's response_model would serialize it."""
+    adapter = _adapter(model)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True), exclude_unset=exclude_unset)
+
+cache = ResponseCache()
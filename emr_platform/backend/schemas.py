@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 class VitalsBase(BaseModel):
@@ -15,9 +15,67 @@ class VitalsCreate(VitalsBase):
 class Vitals(VitalsBase):
     id: int
     patient_id: int
+    merkle_root: Optional[str] = None
+    merkle_index: Optional[int] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class VitalsRollup(BaseModel):
+    patient_id: int
+    bucket: int # bucket start, epoch seconds
+    bucket_seconds: int
+    count: int
+    critical_count: int
+    bpm_min: int
+    bpm_max: int
+    bpm_avg: float
+    spo2_min: int
+    spo2_max: int
+    spo2_avg: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+class VitalsBatchResult(BaseModel):
+    patient_id: int
+    count: int
+    ids: List[int]
+
+class VitalsProof(BaseModel):
+    record_id: int
+    leaf: str
+    merkle_root: Optional[str]
+    merkle_index: int
+    proof: List[str]
+    computed_root: str
+    proof_valid: bool
+    anchored: Optional[bool] # None when the chain is unreachable
+    verified: bool
+
+class AnchorStatus(BaseModel):
+    record_id: int
+    anchor_id: Optional[int]
+    status: str # pending / sent / confirmed / failed / external (untracked for legacy rows)
+    attempts: int
+    tx_hash: Optional[str]
+    last_error: Optional[str]
+    next_attempt_at: Optional[float]
+    updated_at: Optional[float]
+
+class ChainRecord(BaseModel):
+    patient: str
+    ipfs_hash: str
+    is_critical: bool
+    timestamp: int
+    block_number: int
+    tx_hash: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ChainAccess(BaseModel):
+    counterparty: str
+    kind: str # device (write) / data (view)
+    granted: bool
+    block_number: int
 
 class PatientBase(BaseModel):
     name: str
@@ -31,8 +89,16 @@ class Patient(PatientBase):
     id: int
     records: List[Vitals] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class PatientSummary(PatientBase):
+    """Patient without its vitals history (records only with ?include=records)."""
+    id: int
+    record_count: int
+    latest_vitals: Optional[Vitals] = None
+    records: Optional[List[Vitals]] = None
+
+    model_config = ConfigDict(from_attributes=True)
 
 class MedicalDocument(BaseModel):
     id: int
@@ -42,9 +108,12 @@ class MedicalDocument(BaseModel):
     is_secure: bool
     timestamp: Optional[str]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class AnchorRetryRequest(BaseModel):
+    anchor_ids: Optional[List[int]] = None # None -> every failed anchor
 
 class ShareRequest(BaseModel):
     recipient_wallet: str
     doc_ids: List[int]
+    patient_wallet: Optional[str] = None # scopes a revoke to this patient's documents
@@ -6,12 +6,13 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import ReadOnlySessionLocal
 import crud
 import schemas
 
 def show_records():
-    db: Session = SessionLocal()
+    # Read-only connection: safe to run while the backend is ingesting
+    db: Session = ReadOnlySessionLocal()
     try:
         print("--- Patients ---")
         patients = crud.get_patients(db, skip=0, limit=100)
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+
+# SQLite concurrency profile, shared by the backend engines and by readers that
+# open the file directly (dashboard, show_records.py). Only needs sqlite3.
+#
+#   journal_mode=WAL      readers see the last commit and never block the writer (or each other)
+#   synchronous=NORMAL    fsync at checkpoints instead of every commit (safe with WAL)
+#   busy_timeout          wait for the write lock instead of failing with "database is locked"
+#   cache_size/mmap_size  keep hot pages in memory
+#
+# WAL appends to emr_data.db-wal; WalCheckpointer copies it back into the
+# database on a timer so the log (and reads through it) stay short.
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))                   # per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))            # bytes, 0 = off
+SQLITE_JOURNAL_SIZE_LIMIT = int(os.getenv("SQLITE_JOURNAL_SIZE_LIMIT", str(64 * 1024 * 1024))) # WAL kept after a checkpoint
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "30"))       # seconds, 0 = SQLite's auto-checkpoint only
+SQLITE_CHECKPOINT_MODE = os.getenv("SQLITE_CHECKPOINT_MODE", "PASSIVE")                 # PASSIVE never waits on readers/writers
+
+def begin_statement(execution_options: dict) -> str:
+    """
+    BEGIN for a SQLAlchemy transaction. Sessions that read and then write
+    (ingest) ask for IMMEDIATE: under WAL a deferred read transaction that later
+    writes fails at once with "database is locked" if another writer committed
+    in between, without waiting out busy_timeout. Plain reads stay deferred and
+    never wait on writers.
+    """
+    return "BEGIN IMMEDIATE" if execution_options.get("sqlite_immediate") else "BEGIN"
+
+def apply_pragmas(conn, read_only: bool = False):
+    """Sets the profile on a fresh DB-API connection (sqlite3 or aiosqlite's adapter)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if not read_only:
+            # Persistent in the file; a read-only connection cannot change it
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA journal_size_limit = {SQLITE_JOURNAL_SIZE_LIMIT}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+def connect_readonly(path: str, check_same_thread: bool = False) -> sqlite3.Connection:
+    """
+    mode=ro connection for readers. Under WAL it reads the last committed
+    snapshot without taking locks the writer waits on, and it cannot write.
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True,
+                           timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=check_same_thread)
+    apply_pragmas(conn, read_only=True)
+    return conn
+
+def is_file_database(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and not url.rstrip("/").endswith(":")
+
+class WalCheckpointer:
+    """Runs PRAGMA wal_checkpoint on its own connection every `interval` seconds."""
+
+    def __init__(self, path: str, interval: float = SQLITE_CHECKPOINT_INTERVAL, mode: str = SQLITE_CHECKPOINT_MODE):
+        self.path = path
+        self.interval = interval
+        self.mode = mode.upper()
+        self.checkpoints = 0
+        self.last = None # (busy, wal pages, pages checkpointed)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="wal-checkpoint", daemon=True)
+        self._thread.start()
+        print(f"🧾 WAL checkpoint every {self.interval:g}s ({self.mode})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        conn = None
+        while not self._stop.wait(self.interval):
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+                self.checkpoint(conn)
+            except Exception as e:
+                print(f"⚠️ WAL checkpoint failed: {e}")
+        if conn is not None:
+            conn.close()
+
+    def checkpoint(self, conn) -> tuple:
+        busy, wal_pages, moved = conn.execute(f"PRAGMA wal_checkpoint({self.mode})").fetchone()
+        self.checkpoints += 1
+        self.last = (busy, wal_pages, moved)
+        return self.last
+
+    def metrics(self) -> dict:
+        busy, wal_pages, moved = self.last or (None, None, None)
+        return {"checkpoints": self.checkpoints, "busy": busy, "wal_pages": wal_pages, "checkpointed_pages": moved}
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules are imported flat (as uvicorn runs them from emr_platform/backend)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture(scope="session")
+def chain():
+    from local_chain import LocalChain # eth-tester behind JSON-RPC, see local_chain.py
+    chain = LocalChain()
+    yield chain
+    chain.stop()
+
+@pytest.fixture(scope="session")
+def client(chain, tmp_path_factory):
+    # blockchain_utils / database read their settings at import time
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{tmp_path_factory.mktemp('db')}/emr.db",
+        GANACHE_URL=chain.url,
+        CONTRACT_ADDRESS=chain.contract_address,
+        HOSPITAL_PRIVATE_KEY=chain.hospital_key,
+        ANCHOR_WORKER_ENABLED="0",
+        CHAIN_INDEXER_ENABLED="0",
+    )
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as client:
+        yield client
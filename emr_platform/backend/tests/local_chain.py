@@ -0,0 +1,122 @@
+import json
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from web3 import Web3, EthereumTesterProvider
+
+# Local chain shared by the backend tests and the ingest benchmark: eth-tester
+# (py-evm) behind a JSON-RPC HTTP endpoint with HealthRecord deployed, so the
+# backend talks to it like Ganache.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+ARTIFACT_PATH = os.path.join(ROOT, "blockchain", "artifacts", "HealthRecord.json")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _hex(value):
+    # eth-tester leaves some fields (e.g. revert data) as raw bytes
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class LocalChain:
+    """eth-tester behind a JSON-RPC HTTP endpoint, so the backend talks to it like Ganache."""
+
+    def __init__(self):
+        self.provider = EthereumTesterProvider()
+        self.w3 = Web3(self.provider)
+        self._lock = threading.Lock()
+        # Only the provider's own eth-tester middleware (snake_case -> JSON-RPC field names)
+        rpc = Web3(self.provider)
+        rpc.middleware_onion.clear()
+        request, lock = self.provider.request_func(rpc, rpc.middleware_onion), self._lock
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                calls = body if isinstance(body, list) else [body]
+                replies = []
+                for call in calls:
+                    try:
+                        with lock:
+                            reply = dict(request(call["method"], call.get("params", [])))
+                    except Exception as e:
+                        # e.g. eth_estimateGas on a reverting call: a JSON-RPC error like a real node
+                        reply = {"jsonrpc": "2.0", "error": {"code": 3, "message": str(e)}}
+                    reply["id"] = call.get("id")
+                    replies.append(reply)
+                data = json.dumps(replies if isinstance(body, list) else replies[0], default=_hex).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.port = free_port()
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="chain-rpc", daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.port}"
+
+        backend = self.provider.ethereum_tester.backend
+        self.hospital_key = backend.account_keys[0].to_hex()
+        self.hospital = self.w3.eth.accounts[0]
+        with open(ARTIFACT_PATH, "r") as f:
+            artifact = json.load(f)
+        tx = self.w3.eth.contract(abi=artifact["abi"], bytecode=artifact["bytecode"]).constructor().transact({"from": self.hospital})
+        self.contract_address = self.w3.eth.get_transaction_receipt(tx).contractAddress
+        self.contract = self.w3.eth.contract(address=self.contract_address, abi=artifact["abi"])
+        self.start_block = self.w3.eth.block_number + 1
+
+    def authorize_hospital(self, patient):
+        """The patient handshake: fund `patient` and have it call authorizeDevice(hospital)."""
+        with self._lock:
+            funder = self.w3.eth.accounts[1] # not the hospital: its nonces belong to the backend
+            self.w3.eth.send_transaction({"from": funder, "to": patient.address, "value": self.w3.to_wei(1, "ether")})
+            tx = self.contract.functions.authorizeDevice(self.hospital).build_transaction({
+                "from": patient.address, "nonce": 0, "gas": 100000,
+                "gasPrice": self.w3.to_wei(1, "gwei"), "chainId": self.w3.eth.chain_id
+            })
+            self.w3.eth.send_raw_transaction(patient.sign_transaction(tx).raw_transaction)
+            self.start_block = self.w3.eth.block_number + 1 # setup transactions are not part of the run
+
+    def snapshot(self) -> int:
+        with self._lock:
+            return self.provider.ethereum_tester.take_snapshot()
+
+    def reorg(self, snapshot: int):
+        """Drops every block mined after `snapshot`: the next blocks fork the chain there."""
+        with self._lock:
+            self.provider.ethereum_tester.revert_to_snapshot(snapshot)
+
+    def mine(self, blocks: int = 1):
+        with self._lock:
+            self.provider.ethereum_tester.mine_blocks(blocks)
+
+    def gas_report(self) -> dict:
+        """Gas of successful transactions only; reverted ones are counted (and their gas) separately."""
+        with self._lock:
+            head = self.w3.eth.block_number
+            txs = reverted = gas = reverted_gas = 0
+            for number in range(self.start_block, head + 1):
+                for tx_hash in self.w3.eth.get_block(number)["transactions"]:
+                    receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+                    if receipt["status"] == 1:
+                        txs += 1
+                        gas += receipt["gasUsed"]
+                    else:
+                        reverted += 1
+                        reverted_gas += receipt["gasUsed"]
+        return {"transactions": txs, "gas_used": gas, "reverted": reverted, "reverted_gas": reverted_gas,
+                "blocks": max(0, head - self.start_block + 1)}
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
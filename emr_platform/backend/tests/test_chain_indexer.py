@@ -0,0 +1,120 @@
+import pytest
+from eth_account import Account
+
+@pytest.fixture
+def start_block(chain, client):
+    """An empty index starting at the next block (the suite shares one chain and database)."""
+    import models
+    from database import WriteSessionLocal
+    with WriteSessionLocal() as db:
+        db.query(models.ChainEvent).delete()
+        db.query(models.ChainCheckpoint).delete()
+        db.commit()
+    return chain.w3.eth.block_number + 1
+
+def indexer(start_block: int, **kwargs):
+    import blockchain_utils
+    from chain_indexer import ChainIndexer
+    return ChainIndexer(w3=blockchain_utils.w3, contract=blockchain_utils.contract, start_block=start_block, **kwargs)
+
+def share(chain, doctor: str, patient: int = 2):
+    """One DataShared event in its own block."""
+    chain.contract.functions.grantDataAccess(doctor).transact({"from": chain.w3.eth.accounts[patient]})
+
+def indexed():
+    import models
+    from database import WriteSessionLocal
+    with WriteSessionLocal() as db:
+        return [(e.block_number, e.counterparty) for e in db.query(models.ChainEvent).order_by(models.ChainEvent.block_number)]
+
+def checkpoint():
+    import models
+    from database import WriteSessionLocal
+    with WriteSessionLocal() as db:
+        return db.query(models.ChainCheckpoint).one().block_number
+
+def catch_up(idx) -> int:
+    ticks = 1
+    while idx.tick():
+        ticks += 1
+    return ticks
+
+def doctors(n: int):
+    return [Account.create().address for _ in range(n)]
+
+def test_resumes_from_checkpoint(chain, start_block):
+    first, second = doctors(3), doctors(2)
+    for doctor in first:
+        share(chain, doctor)
+    assert indexer(start_block).tick() is False
+    assert [d for _, d in indexed()] == first
+    assert checkpoint() == chain.w3.eth.block_number
+
+    # A restarted indexer picks up after the checkpoint: nothing is read or stored twice
+    for doctor in second:
+        share(chain, doctor)
+    restarted = indexer(start_block)
+    assert restarted.tick() is False
+    assert [d for _, d in indexed()] == first + second
+    assert restarted.tick() is False # up to date
+
+def test_reads_bounded_block_ranges(chain, start_block):
+    for doctor in doctors(5):
+        share(chain, doctor)
+    head = chain.w3.eth.block_number
+    idx = indexer(start_block, batch_blocks=2)
+
+    checkpoints = []
+    while True:
+        more = idx.tick()
+        checkpoints.append(checkpoint())
+        if not more:
+            break
+    assert checkpoints == [start_block + 1, start_block + 3, head]
+    assert [n for n, _ in indexed()] == list(range(start_block, head + 1))
+
+def test_reorg_rewinds_and_invalidates_caches(chain, start_block):
+    import permission_cache, response_cache
+    fork = chain.snapshot()
+    orphaned, canonical = doctors(3), doctors(4)
+    for doctor in orphaned:
+        share(chain, doctor)
+    idx = indexer(start_block)
+    catch_up(idx)
+
+    # Cached reads computed from the orphaned events
+    patient = chain.w3.eth.accounts[2]
+    permission_cache.cache.get(patient, orphaned[0], lambda p, v: permission_cache.Permission([], True, False))
+    _, version = response_cache.cache.lookup("test", "key")
+    response_cache.cache.store("test", "key", b"{}", [response_cache.wallet_tag(patient)], version)
+
+    chain.reorg(fork)
+    for doctor in canonical:
+        share(chain, doctor)
+    catch_up(idx)
+
+    assert [d for _, d in indexed()] == canonical
+    assert checkpoint() == chain.w3.eth.block_number
+    assert permission_cache.cache.metrics()["entries"] == 0
+    assert response_cache.cache.lookup("test", "key")[0] is None
+
+def test_reorg_deeper_than_recent_blocks(chain, start_block):
+    kept = doctors(1)
+    share(chain, kept[0])
+    fork = chain.snapshot()
+    orphaned = doctors(2)
+    for doctor in orphaned:
+        share(chain, doctor)
+    chain.mine(30) # the forked events are far below the checkpoint
+    idx = indexer(start_block)
+    catch_up(idx)
+    assert [d for _, d in indexed()] == kept + orphaned
+
+    chain.reorg(fork)
+    canonical = doctors(1)
+    share(chain, canonical[0])
+    catch_up(idx)
+
+    # Rewound to the last block still on the chain (the kept event), not a fixed depth
+    assert [d for _, d in indexed()] == kept + canonical
+    assert checkpoint() == chain.w3.eth.block_number
@@ -0,0 +1,114 @@
+import time
+
+from eth_account import Account
+
+import merkle
+
+API = "/api/v1"
+
+def authorize(chain, patient, device: str):
+    """Funds `patient` and has it authorize `device` to add its records (the gateway handshake)."""
+    import blockchain_utils
+    w3 = chain.w3
+    w3.eth.send_transaction({"from": w3.eth.accounts[1], "to": patient.address, "value": w3.to_wei(1, "ether")})
+    tx = blockchain_utils.contract.functions.authorizeDevice(device).build_transaction({
+        "from": patient.address, "nonce": 0, "gas": 100000, "gasPrice": w3.to_wei(1, "gwei"), "chainId": w3.eth.chain_id
+    })
+    w3.eth.send_raw_transaction(patient.sign_transaction(tx).raw_transaction)
+
+def register(client, patient) -> int:
+    resp = client.post(API + "/patients/", json={"name": "Chain Test", "age": 40, "wallet_address": patient.address})
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+def readings(n: int):
+    now = time.time()
+    return [{"bpm": 70 + i, "spo2": 97, "timestamp": now + i / 10, "is_critical": i == 2} for i in range(n)]
+
+def test_gateway_batch_verifies_against_chain(chain, client):
+    import anchor_worker, blockchain_utils
+    gateway = chain.w3.eth.accounts[1]
+    patient = Account.create()
+    authorize(chain, patient, gateway)
+
+    # The gateway mints the batch root under the patient wallet, then uploads the batch with it
+    batch = readings(5)
+    root, _ = merkle.build_tree([merkle.vitals_leaf(r["bpm"], r["spo2"], r["timestamp"], r["is_critical"]) for r in batch])
+    blockchain_utils.contract.functions.addRecord(patient.address, blockchain_utils.to_chain_hash(root), True).transact({"from": gateway})
+    minted = chain.gas_report()["transactions"]
+
+    patient_id = register(client, patient)
+    resp = client.post(f"{API}/patients/{patient_id}/vitals/batch", json=[dict(r, ipfs_hash=root) for r in batch])
+    assert resp.status_code == 200
+    record_id = resp.json()["ids"][3]
+
+    # The gateway's claim is only queued; the worker finds the root on-chain and sends nothing
+    anchor = client.get(f"{API}/vitals/{record_id}/anchor").json()
+    assert anchor["status"] == "pending"
+    anchor_worker.worker._send(anchor["anchor_id"])
+    assert client.get(f"{API}/vitals/{record_id}/anchor").json()["status"] == "external"
+
+    proof = client.get(f"{API}/vitals/{record_id}/verify").json()
+    assert proof["merkle_root"] == root
+    assert proof["proof_valid"] and proof["anchored"] and proof["verified"]
+    assert chain.gas_report()["transactions"] == minted
+
+def test_unminted_gateway_root_is_anchored_by_backend(chain, client, monkeypatch):
+    import anchor_worker, models
+    patient = Account.create()
+    authorize(chain, patient, chain.hospital)
+    patient_id = register(client, patient)
+
+    # The gateway claims a root it never minted: the worker must not trust it
+    batch = readings(3)
+    root, _ = merkle.build_tree([merkle.vitals_leaf(r["bpm"], r["spo2"], r["timestamp"], r["is_critical"]) for r in batch])
+    record_id = client.post(f"{API}/patients/{patient_id}/vitals/batch", json=[dict(r, ipfs_hash=root) for r in batch]).json()["ids"][0]
+    anchor_id = client.get(f"{API}/vitals/{record_id}/anchor").json()["anchor_id"]
+    sent = chain.gas_report()["transactions"]
+
+    # Within the grace window it waits for the gateway's transaction to land
+    anchor_worker.worker._send(anchor_id)
+    assert client.get(f"{API}/vitals/{record_id}/anchor").json()["status"] == "pending"
+    assert chain.gas_report()["transactions"] == sent
+
+    # After it the backend anchors the root itself
+    monkeypatch.setattr(anchor_worker, "ANCHOR_MINT_GRACE", 0)
+    with anchor_worker.worker.session_factory() as db:
+        db.get(models.AnchorOutbox, anchor_id).next_attempt_at = 0
+        db.commit()
+    anchor_worker.worker._send(anchor_id)
+    anchor_worker.worker.confirm_sent()
+    assert client.get(f"{API}/vitals/{record_id}/anchor").json()["status"] == "confirmed"
+    assert client.get(f"{API}/vitals/{record_id}/verify").json()["verified"] is True
+
+def test_backend_anchor_verifies_against_chain(chain, client):
+    import anchor_worker
+    patient = Account.create()
+    authorize(chain, patient, chain.hospital)
+    patient_id = register(client, patient)
+
+    resp = client.post(f"{API}/patients/{patient_id}/vitals/", json=readings(1)[0])
+    assert resp.status_code == 200
+    record_id = resp.json()["id"]
+    anchor = client.get(f"{API}/vitals/{record_id}/anchor").json()
+    assert anchor["status"] == "pending"
+
+    anchor_worker.worker._send(anchor["anchor_id"])
+    anchor_worker.worker.confirm_sent()
+    assert client.get(f"{API}/vitals/{record_id}/anchor").json()["status"] == "confirmed"
+    assert client.get(f"{API}/vitals/{record_id}/verify").json()["verified"] is True
+
+def test_unauthorized_anchor_fails_without_sending(chain, client):
+    import anchor_worker
+    patient_id = register(client, Account.create()) # never authorized the hospital
+    record_id = client.post(f"{API}/patients/{patient_id}/vitals/", json=readings(1)[0]).json()["id"]
+    anchor_id = client.get(f"{API}/vitals/{record_id}/anchor").json()["anchor_id"]
+    sent = chain.gas_report()["transactions"]
+
+    anchor_worker.worker._send(anchor_id)
+    anchor = client.get(f"{API}/vitals/{record_id}/anchor").json()
+    assert anchor["status"] == "failed" and anchor["attempts"] == 1
+    assert chain.gas_report()["transactions"] == sent
+
+    assert client.post(f"{API}/anchors/retry", json={"anchor_ids": [anchor_id]}).json()["requeued_count"] == 1
+    assert client.get(f"{API}/vitals/{record_id}/anchor").json()["status"] == "pending"
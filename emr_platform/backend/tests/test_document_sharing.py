@@ -0,0 +1,52 @@
+from eth_account import Account
+
+API = "/api/v1"
+
+def add_documents(patient: str, n: int) -> list[int]:
+    import models
+    from database import WriteSessionLocal
+    with WriteSessionLocal() as db:
+        docs = [models.MedicalDocument(patient_wallet=patient, file_name=f"report-{i}.pdf", description="test")
+                for i in range(n)]
+        db.add_all(docs)
+        db.commit()
+        return [d.id for d in docs]
+
+def grants(viewer: str) -> list[tuple]:
+    import models
+    from database import WriteSessionLocal
+    with WriteSessionLocal() as db:
+        return sorted((p.doc_id, p.viewer_wallet) for p in db.query(models.DocumentPermission)
+                      if p.viewer_wallet.lower() == viewer.lower())
+
+def visible(client, patient: str, viewer: str) -> list[int]:
+    resp = client.get(f"{API}/patients/by-wallet/{patient}/documents", params={"viewer_wallet": viewer})
+    assert resp.status_code == 200
+    return sorted(d["id"] for d in resp.json())
+
+def test_grants_are_stored_lowercase_and_match_any_case(client):
+    patient, viewer = Account.create().address, Account.create().address # checksummed (mixed case)
+    doc_ids = add_documents(patient, 3)
+
+    share = lambda wallet, ids: client.post(f"{API}/documents/share", json={"recipient_wallet": wallet, "doc_ids": ids}).json()
+    assert share(viewer, doc_ids[:2])["granted_count"] == 2
+    assert share(viewer.lower(), doc_ids)["granted_count"] == 1 # same viewer: only the new document
+    assert grants(viewer) == [(i, viewer.lower()) for i in doc_ids]
+    assert visible(client, patient, viewer) == doc_ids
+
+    revoke = {"recipient_wallet": viewer.upper().replace("0X", "0x"), "doc_ids": doc_ids[:1], "patient_wallet": patient}
+    assert client.post(f"{API}/documents/revoke", json=revoke).json()["revoked_count"] == 1
+    assert visible(client, patient, viewer.lower()) == doc_ids[1:]
+
+def test_startup_dedupe_lowercases_legacy_grants(client):
+    import crud, models
+    from database import WriteSessionLocal, engine
+    patient, viewer = Account.create().address, Account.create().address
+    doc_id = add_documents(patient, 1)[0]
+    with WriteSessionLocal() as db:
+        db.execute(models.DocumentPermission.__table__.insert().values(doc_id=doc_id, viewer_wallet=viewer))
+        db.commit()
+
+    crud.dedupe_document_permissions(engine)
+    assert grants(viewer) == [(doc_id, viewer.lower())]
+    assert client.post(f"{API}/documents/revoke", json={"recipient_wallet": viewer, "doc_ids": []}).json()["revoked_count"] == 1
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+from eth_account import Account
+from web3 import EthereumTesterProvider, Web3
+
+from nonce_manager import NonceManager
+
+@pytest.fixture
+def w3():
+    return Web3(EthereumTesterProvider())
+
+def sender(w3):
+    return w3.provider.ethereum_tester.backend.account_keys[0].to_hex(), w3.eth.accounts[0]
+
+def transfer(w3):
+    return lambda nonce: {"to": w3.eth.accounts[1], "value": 1, "gas": 21000, "gasPrice": w3.to_wei(1, "gwei"),
+                          "nonce": nonce, "chainId": w3.eth.chain_id}
+
+def test_concurrent_sends_get_consecutive_nonces(w3):
+    key, address = sender(w3)
+    manager = NonceManager(w3)
+    hashes = []
+    lock = threading.Lock()
+
+    def send():
+        tx_hash = manager.send_transaction(key, transfer(w3))
+        with lock:
+            hashes.append(tx_hash)
+
+    threads = [threading.Thread(target=send) for _ in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    nonces = sorted(w3.eth.get_transaction(h)["nonce"] for h in hashes)
+    assert nonces == list(range(40))
+    assert all(w3.eth.get_transaction_receipt(h)["status"] == 1 for h in hashes)
+
+def test_resyncs_after_out_of_band_transaction(w3):
+    key, address = sender(w3)
+    manager = NonceManager(w3)
+    manager.send_transaction(key, transfer(w3))
+    w3.eth.send_transaction({"from": address, "to": w3.eth.accounts[1], "value": 1}) # nonce 1, behind the manager's back
+
+    tx_hash = manager.send_transaction(key, transfer(w3))
+    assert w3.eth.get_transaction(tx_hash)["nonce"] == 2
+
+class FakeEth:
+    """Node that rejects the first raw send with `error`, then accepts."""
+
+    def __init__(self, error: str):
+        self.error = error
+        self.sent = []
+        self.count_calls = 0
+
+    def get_transaction_count(self, address, block):
+        self.count_calls += 1
+        return 7
+
+    def send_raw_transaction(self, raw):
+        self.sent.append(raw)
+        if len(self.sent) == 1:
+            raise ValueError({"code": -32000, "message": self.error})
+        return b"\x01" * 32
+
+class FakeWeb3:
+    def __init__(self, error: str):
+        self.eth = FakeEth(error)
+
+def tx(nonce):
+    return {"to": "0x" + "22" * 20, "value": 0, "gas": 21000, "gasPrice": 1, "nonce": nonce, "chainId": 1}
+
+KEY = "0x" + "11" * 32
+
+@pytest.mark.parametrize("error", ["already known", "known transaction"])
+def test_known_transaction_is_sent_not_resigned(error):
+    w3 = FakeWeb3(error)
+    manager = NonceManager(w3)
+    built = []
+
+    def build(nonce):
+        built.append(nonce)
+        return tx(nonce)
+
+    tx_hash = manager.send_transaction(KEY, build)
+    assert built == [7] and len(w3.eth.sent) == 1 # no second signature at another nonce
+    assert tx_hash == Account.from_key(KEY).sign_transaction(tx(7)).hash # the tx the node already has
+
+    manager.send_transaction(KEY, build)
+    assert built == [7, 8] and w3.eth.count_calls == 1 # the nonce counts as used, no resync
+
+def test_nonce_error_resyncs_and_resends():
+    w3 = FakeWeb3("nonce too low")
+    assert NonceManager(w3).send_transaction(KEY, tx) == b"\x01" * 32
+    assert len(w3.eth.sent) == 2 and w3.eth.count_calls == 2
+
+def test_other_errors_are_raised():
+    w3 = FakeWeb3("insufficient funds for gas * price + value")
+    with pytest.raises(ValueError):
+        NonceManager(w3).send_transaction(KEY, tx)
+    assert len(w3.eth.sent) == 1
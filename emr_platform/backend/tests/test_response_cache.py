@@ -0,0 +1,55 @@
+from eth_account import Account
+
+from response_cache import ResponseCache, patient_tag, wallet_tag
+
+API = "/api/v1"
+
+def load_with(cache: ResponseCache, name: str, body, tags, during=lambda: None):
+    """`cache.get` with a loader that runs `during` (a concurrent write) before returning."""
+    def loader():
+        during()
+        return body, tags
+    return cache.get(name, "key", loader)
+
+def test_unrelated_invalidation_does_not_discard_a_load():
+    cache = ResponseCache()
+    load_with(cache, "a", b"{}", [wallet_tag("0xA")], during=lambda: cache.invalidate(patient_tag(7)))
+    assert cache.lookup("a", "key")[0].body == b"{}"
+
+def test_invalidation_of_its_own_tag_discards_a_load():
+    cache = ResponseCache()
+    load_with(cache, "a", b"{}", [wallet_tag("0xA")], during=lambda: cache.invalidate(wallet_tag("0xa")))
+    assert cache.lookup("a", "key")[0] is None
+
+def test_full_invalidation_discards_every_load():
+    cache = ResponseCache()
+    load_with(cache, "a", b"{}", [wallet_tag("0xA")], during=cache.invalidate)
+    assert cache.lookup("a", "key")[0] is None
+
+def test_forgotten_tags_are_treated_as_invalidated():
+    cache = ResponseCache(max_entries=2)
+    during = lambda: cache.invalidate(patient_tag(1), patient_tag(2), patient_tag(3))
+    load_with(cache, "a", b"{}", [patient_tag(1)], during=during)
+    assert cache.lookup("a", "key")[0] is None
+
+def test_not_found_expires_after_the_negative_ttl():
+    cache = ResponseCache(negative_ttl=0)
+    entry = load_with(cache, "a", None, [wallet_tag("0xA")])
+    assert not entry.found and entry.etag is None
+    assert cache.lookup("a", "key")[0] is None
+
+def test_patient_404_is_cached_until_the_wallet_registers(client):
+    import response_cache
+    wallet = Account.create().address
+    url = f"{API}/patients/by-wallet/{wallet}"
+    stats = lambda: response_cache.cache.metrics()["routes"]["patient_by_wallet"]
+
+    assert client.get(url).status_code == 404
+    hits = stats()["hits"]
+    assert client.get(url).status_code == 404
+    assert stats()["hits"] == hits + 1 # served from the cache, no query
+
+    created = client.post(f"{API}/patients/", json={"name": "Ada", "age": 36, "wallet_address": wallet})
+    assert created.status_code == 200
+    resp = client.get(url)
+    assert resp.status_code == 200 and resp.json()["id"] == created.json()["id"]
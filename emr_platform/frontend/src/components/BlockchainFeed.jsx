@@ -4,6 +4,7 @@ import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Button } from '@/components/ui/button';
 import { Tooltip, TooltipContent, TooltipProvider, TooltipTrigger } from '@/components/ui/tooltip';
+import api from '../api';
 
 const BlockchainFeed = ({ records }) => {
   const anchoredRecords = records?.filter(r => r.ipfs_hash) || [];
@@ -17,24 +18,13 @@ const BlockchainFeed = ({ records }) => {
     await new Promise(r => setTimeout(r, 700));
 
     try {
-      // 1. Reconstruct Payload (MUST MATCH PYTHON LOGIC)
-      // Logic: f"{bpm}-{timestamp}"
-      const payload = `${record.bpm}-${record.timestamp}`;
-      const encoder = new TextEncoder();
-      const data = encoder.encode(payload);
+      // Backend recomputes the leaf, folds the Merkle proof up to the root
+      // and checks that the root is anchored on-chain.
+      const res = await api.get(`/vitals/${record.id}/verify`);
+      const isValid = res.data.verified;
 
-      // 2. Calculate Hash
-      const hashBuffer = await window.crypto.subtle.digest('SHA-256', data);
-      const hashArray = Array.from(new Uint8Array(hashBuffer));
-      const hashHex = hashArray.map(b => b.toString(16).padStart(2, '0')).join('');
-
-      // 3. Compare
-      // Note: Python logic might produce different hash if types mismatch (e.g. float vs int timestamp)
-      // In main app, we ensure timestamp is Int.
-      const isValid = hashHex === record.ipfs_hash;
-
-      if (!isValid) {
-        console.warn("Mismatch!", { payload, calculated: hashHex, stored: record.ipfs_hash });
+      if (!res.data.proof_valid) {
+        console.warn("Mismatch!", res.data);
       }
 
       setVerificationResults(prev => ({ ...prev, [record.id]: isValid ? 'valid' : 'invalid' }));
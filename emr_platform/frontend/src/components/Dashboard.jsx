@@ -49,27 +49,68 @@ const Dashboard = () => {
     setDoctorWallet("");
   };
 
-  // 2. Polling: Vitals & Blockchain Data (Only if patient is selected)
+  // 2. Live Vitals: newest page over REST, then server-pushed (SSE) readings
   useEffect(() => {
     if (!patient) return;
 
-    const pollVitals = async () => {
+    let source = null;
+    let cancelled = false;
+    const WINDOW = 200;
+
+    const loadLatest = async () => {
+      const res = await api.get(`/patients/${patient.id}/vitals/?order=desc&limit=${WINDOW}`);
+      return res.data.sort((a, b) => a.timestamp - b.timestamp);
+    };
+
+    const connect = async () => {
       try {
-        const res = await api.get(`/patients/${patient.id}/vitals/`);
-        const sortedData = res.data.sort((a, b) => a.timestamp - b.timestamp);
-        setVitals(sortedData);
+        const latest = await loadLatest();
+        if (cancelled) return;
+        setVitals(latest);
+        const since = latest.length ? latest[latest.length - 1].timestamp : Date.now() / 1000;
+
+        // EventSource reconnects by itself and resumes via Last-Event-ID
+        source = new EventSource(`${api.defaults.baseURL}/patients/${patient.id}/vitals/stream?since=${since}`);
+        source.addEventListener('vitals', (e) => {
+          const reading = JSON.parse(e.data);
+          setVitals((prev) => {
+            if (prev.some((v) => v.id === reading.id)) return prev;
+            return [...prev, reading].slice(-WINDOW);
+          });
+        });
+        // Readings were dropped for this (slow) client -> resync from REST
+        source.addEventListener('overflow', async () => {
+          const fresh = await loadLatest();
+          if (!cancelled) setVitals(fresh);
+        });
+      } catch (err) {
+        console.error("Vitals stream error", err);
+      }
+    };
 
-        // Fetch Documents (Filtered by Doctor Wallet)
+    connect();
+    return () => {
+      cancelled = true;
+      if (source) source.close();
+    };
+  }, [patient]);
+
+  // 3. Polling: Documents (Filtered by Doctor Wallet)
+  useEffect(() => {
+    if (!patient) return;
+
+    const pollDocuments = async () => {
+      try {
         const docRes = await api.get(`/patients/by-wallet/${patient.wallet_address}/documents?viewer_wallet=${doctorWallet}`);
         setDocuments(docRes.data || []);
       } catch (err) {
-        console.error("Vitals/Docs poll error", err);
+        console.error("Docs poll error", err);
       }
     };
 
-    pollVitals();
+    pollDocuments();
     // Poll every 2 seconds
-    const interval = setInterval(pollVitals, 2000);
+    const interval = setInterval(pollDocuments, 2000);
 
     return () => clearInterval(interval);
   }, [patient, doctorWallet]);
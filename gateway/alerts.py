@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Per-device clinical alert rules over NumPy ring buffers.
+#
+# The batcher hands every device's newly arrived readings to `AlertEngine.evaluate`
+# in one call. Each rule turns the window into a metric series with array ops
+# (raw value, rolling mean, rate of change, drop below a rolling baseline) and
+# runs a hysteresis state machine over it:
+#
+#   raise  after `debounce` consecutive readings past `threshold`
+#   clear  after `clear_after` consecutive readings back past `threshold -/+ hysteresis`
+#
+# A reading is critical while any critical rule is active, but only the device
+# going from no active critical rule to at least one triggers a CRITICAL
+# flush/mint, so one noisy spike or a long episode no longer mints on every reading.
+
+ALERT_BUFFER_SIZE = int(os.getenv("GATEWAY_ALERT_BUFFER_SIZE", "4096")) # readings of history kept per device
+
+# Sensors report 0 when the finger is off the probe
+VALID_RANGE = {"bpm": (1, 300), "spo2": (1, 100)}
+
+DEFAULT_RULES = [
+    # name, metric over field, comparison, threshold, hysteresis, debounce, clear_after
+    {"name": "tachycardia", "field": "bpm", "op": ">", "threshold": 140, "hysteresis": 10, "debounce": 3, "clear_after": 3},
+    {"name": "bradycardia", "field": "bpm", "op": "<", "threshold": 40, "hysteresis": 5, "debounce": 3, "clear_after": 3},
+    {"name": "sustained_tachycardia", "field": "bpm", "kind": "mean", "window": 30, "op": ">", "threshold": 120,
+     "hysteresis": 5, "debounce": 1, "clear_after": 5},
+    {"name": "heart_rate_jump", "field": "bpm", "kind": "rate", "window": 10, "op": ">=", "threshold": 40,
+     "hysteresis": 10, "debounce": 2, "clear_after": 3},
+    {"name": "hypoxemia", "field": "spo2", "op": "<", "threshold": 90, "hysteresis": 2, "debounce": 3, "clear_after": 3},
+    {"name": "desaturation", "field": "spo2", "kind": "drop", "window": 60, "op": ">=", "threshold": 4,
+     "hysteresis": 1, "debounce": 2, "clear_after": 3},
+]
+
+class Rule:
+    """
+    One alert rule. `kind` picks the metric computed over `field`:
+      value  the reading itself
+      mean   rolling mean over the last `window` seconds
+      rate   absolute change versus the oldest reading in the last `window` seconds
+      drop   rolling mean over `window` seconds minus the reading (desaturation)
+    """
+
+    KINDS = ("value", "mean", "rate", "drop")
+
+    def __init__(self, name: str, field: str, op: str, threshold: float, kind: str = "value", window: float = 0,
+                 hysteresis: float = 0, debounce: int = 1, clear_after: int = 1, critical: bool = True):
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown rule kind '{kind}'")
+        if op not in (">", ">=", "<", "<="):
+            raise ValueError(f"unknown comparison '{op}'")
+        if field not in VALID_RANGE:
+            raise ValueError(f"unknown field '{field}'")
+        self.name = name
+        self.field = field
+        self.op = op
+        self.threshold = float(threshold)
+        self.kind = kind
+        self.window = float(window)
+        self.hysteresis = float(hysteresis)
+        self.debounce = max(1, int(debounce))
+        self.clear_after = max(1, int(clear_after))
+        self.critical = critical
+
+    def metric(self, ts, values, start, new):
+        """Metric for the last `new` readings; `start[i]` is the first index inside reading i's window."""
+        current = values[-new:]
+        if self.kind == "value":
+            return current
+        if self.kind == "rate":
+            return np.abs(current - values[start])
+        # Rolling mean via prefix sums; invalid readings (NaN) are left out
+        valid = ~np.isnan(values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(valid)))
+        end = np.arange(len(values) - new, len(values)) + 1
+        n = counts[end] - counts[start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, (sums[end] - sums[start]) / np.maximum(n, 1), np.nan)
+        return mean if self.kind == "mean" else mean - current
+
+    def conditions(self, metric):
+        """(raise condition, clear condition); NaN satisfies neither."""
+        if self.op in (">", ">="):
+            on = metric > self.threshold if self.op == ">" else metric >= self.threshold
+            off = metric <= self.threshold - self.hysteresis if self.op == ">" else metric < self.threshold - self.hysteresis
+        else:
+            on = metric < self.threshold if self.op == "<" else metric <= self.threshold
+            off = metric >= self.threshold + self.hysteresis if self.op == "<" else metric > self.threshold + self.hysteresis
+        return on, off
+
+    def to_dict(self):
+        return {"name": self.name, "field": self.field, "kind": self.kind, "op": self.op, "threshold": self.threshold,
+                "window": self.window, "hysteresis": self.hysteresis, "debounce": self.debounce,
+                "clear_after": self.clear_after, "critical": self.critical}
+
+def load_rules(path: str = None):
+    """Rules from a JSON list (same keys as DEFAULT_RULES), or the defaults."""
+    specs = DEFAULT_RULES
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            specs = json.load(f)
+    return [Rule(**spec) for spec in specs]
+
+def _run_lengths(cond, carry: int):
+    """Length of the run of True ending at each index, continuing a run of `carry` from the previous window."""
+    idx = np.arange(len(cond))
+    last_false = np.maximum.accumulate(np.where(cond, -1, idx))
+    runs = idx - last_false
+    return np.where(last_false < 0, runs + carry, runs)
+
+class RingBuffer:
+    """
+    Fixed-capacity history of (timestamp, bpm, spo2). Backed by arrays of twice
+    the capacity so the newest `capacity` readings are always one contiguous
+    slice (no per-window copy); the tail is moved to the front when it fills up.
+    """
+
+    def __init__(self, capacity: int = ALERT_BUFFER_SIZE):
+        self.capacity = capacity
+        self.ts = np.empty(2 * capacity)
+        self.columns = {field: np.empty(2 * capacity) for field in VALID_RANGE}
+        self.start = 0
+        self.end = 0
+
+    def extend(self, ts, columns: dict):
+        n = len(ts)
+        if n > self.capacity:
+            ts = ts[-self.capacity:]
+            columns = {k: v[-self.capacity:] for k, v in columns.items()}
+            n = self.capacity
+        if self.end + n > len(self.ts):
+            keep = min(self.end - self.start, self.capacity - n)
+            for arr in (self.ts, *self.columns.values()):
+                arr[:keep] = arr[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        self.ts[self.end:self.end + n] = ts
+        for field, arr in self.columns.items():
+            arr[self.end:self.end + n] = columns[field]
+        self.end += n
+        self.start = max(self.start, self.end - self.capacity)
+
+    def view(self):
+        return self.ts[self.start:self.end], {k: v[self.start:self.end] for k, v in self.columns.items()}
+
+    def __len__(self):
+        return self.end - self.start
+
+class DeviceState:
+    __slots__ = ("ring", "rules", "critical")
+
+    def __init__(self, capacity: int, rules):
+        self.ring = RingBuffer(capacity)
+        self.rules = {rule.name: RuleState() for rule in rules}
+        self.critical = False # any critical rule active after the last window
+
+class RuleState:
+    __slots__ = ("active", "run_on", "run_off", "raised")
+
+    def __init__(self):
+        self.active = False
+        self.run_on = 0
+        self.run_off = 0
+        self.raised = 0
+
+class AlertResult:
+    """Outcome of one window: per-reading flags plus the rules raised/cleared in it."""
+
+    def __init__(self, critical, active, raised, cleared, raised_at):
+        self.critical = critical    # bool array, one per reading
+        self.active = active        # list of active rule names, one per reading
+        self.raised = raised        # [(rule name, timestamp, metric value)]
+        self.cleared = cleared
+        self.raised_at = raised_at  # indices of readings where the device became critical
+
+    @property
+    def raised_critical(self) -> bool:
+        return bool(self.raised_at)
+
+class AlertEngine:
+    def __init__(self, rules=None, capacity: int = ALERT_BUFFER_SIZE):
+        self.rules = rules if rules is not None else load_rules()
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._devices = {}
+
+    def _state(self, key):
+        state = self._devices.get(key)
+        if state is None:
+            state = DeviceState(self.capacity, self.rules)
+            self._devices[key] = state
+        return state
+
+    def forget(self, key):
+        with self._lock:
+            self._devices.pop(key, None)
+
+    def evaluate(self, key, readings) -> AlertResult:
+        """Runs every rule over one device's new readings (in arrival order)."""
+        n = len(readings)
+        if not n:
+            return AlertResult(np.zeros(0, dtype=bool), [], [], [], set())
+        ts = np.fromiter((r.get("timestamp", 0) for r in readings), dtype=float, count=n)
+        columns = {}
+        for field, (low, high) in VALID_RANGE.items():
+            col = np.fromiter((r.get(field) or 0 for r in readings), dtype=float, count=n)
+            col[(col < low) | (col > high)] = np.nan
+            columns[field] = col
+
+        with self._lock:
+            device = self._state(key)
+            ring, states = device.ring, device.rules
+            ring.extend(ts, columns)
+            hist_ts, hist = ring.view()
+            new = min(n, len(ring))
+            window_start = {}
+
+            active_matrix = np.zeros((len(self.rules), new), dtype=bool)
+            raised, cleared = [], []
+            for r, rule in enumerate(self.rules):
+                if rule.window not in window_start:
+                    # Clamped: replayed (older) readings must not look past themselves
+                    first = np.searchsorted(hist_ts, hist_ts[-new:] - rule.window, side="left")
+                    window_start[rule.window] = np.minimum(first, np.arange(len(hist_ts) - new, len(hist_ts)))
+                metric = rule.metric(hist_ts, hist[rule.field], window_start[rule.window], new)
+                on, off = rule.conditions(metric)
+                state = states[rule.name]
+
+                run_on = _run_lengths(on, state.run_on)
+                run_off = _run_lengths(off, state.run_off)
+                # Latch: the most recent raise/clear event decides the state
+                events = np.where(run_on >= rule.debounce, 1, np.where(run_off >= rule.clear_after, 0, -1))
+                idx = np.arange(new)
+                last = np.maximum.accumulate(np.where(events >= 0, idx, -1))
+                active = np.where(last >= 0, events[np.maximum(last, 0)] == 1, state.active)
+
+                before = np.concatenate(([state.active], active[:-1]))
+                for i in np.flatnonzero(active & ~before):
+                    raised.append((rule.name, float(hist_ts[len(hist_ts) - new + i]), float(metric[i])))
+                    state.raised += 1
+                for i in np.flatnonzero(~active & before):
+                    cleared.append((rule.name, float(hist_ts[len(hist_ts) - new + i]), float(metric[i])))
+
+                state.active = bool(active[-1])
+                state.run_on = int(run_on[-1])
+                state.run_off = int(run_off[-1])
+                if rule.critical:
+                    active_matrix[r] = active
+
+            # Readings dropped from a window larger than the buffer count as not critical
+            critical = np.zeros(n, dtype=bool)
+            critical[n - new:] = active_matrix.any(axis=0)
+            before = np.concatenate(([device.critical], critical[:-1]))
+            raised_at = set(np.flatnonzero(critical & ~before).tolist())
+            device.critical = bool(critical[-1])
+
+        names = [rule.name for rule in self.rules]
+        active_names = [[]] * (n - new) + [[names[r] for r in np.flatnonzero(col)] for col in active_matrix.T]
+        return AlertResult(critical, active_names, raised, cleared, raised_at)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                key: {name: {"active": s.active, "raised": s.raised} for name, s in device.rules.items()}
+                for key, device in self._devices.items()
+            }
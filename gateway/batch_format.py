@@ -0,0 +1,248 @@
+import glob
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+
+try:
+    import numpy as np
+except ImportError: # NumPy is optional, memoryview columns work without it
+    np = None
+
+# Compact columnar binary format for sensor batches (replaces batch_*.json).
+#
+#   header   magic "CRXB" | version u8 | flags u8 | device_id_len u16 | count u32 | base_ts f64
+#            device_id (utf-8), zero-padded to a 4-byte boundary
+#   columns  ts_delta    u32[count]   (float64 bit pattern minus base_ts's; u64 when flags & WIDE_TS)
+#            bpm         u8[count]    (u16 when flags & WIDE_BPM)
+#            spo2        u8[count]    (u16 when flags & WIDE_SPO2)
+#            critical    bitmap, ceil(count / 8) bytes, reading i -> bit i % 8 of byte i // 8
+#            zero padding to a 4-byte boundary
+#   trailer  crc32 u32 over everything before it
+#
+# All integers are little-endian. Encoding is deterministic, so `batch_hash`
+# over the bytes is a canonical hash of the batch.
+#
+# Timestamps round-trip bit for bit (positive doubles order like their bit
+# patterns, so the delta is an exact non-negative integer; u32 covers ~17 min
+# of batch span at current epoch values). Together with the critical bit every
+# reading yields the same merkle.vitals_leaf the gateway anchored.
+#
+# Size: ~6.1 bytes per reading plus ~40 bytes of header/trailer, against ~86
+# bytes per reading in JSON. The fixed overhead dominates small batches, so the
+# 10x target is NOT met on the repo's batch_*.json files: the 13-reading batch
+# goes 1118 -> 116 bytes (9.6x), the 1-reading ones 86 -> 44 (2x). It is met
+# from 18 readings up (a full BATCH_SIZE_LIMIT of 50 is ~14x).
+#
+# Nothing in the gateway or backend reads or writes .crxb yet: the segment log
+# is the gateway's durable store; this is the archive/export format.
+
+MAGIC = b"CRXB"
+VERSION = 2
+WIDE_BPM = 0x01
+WIDE_SPO2 = 0x02
+WIDE_TS = 0x04
+
+HEADER = struct.Struct("<4sBBHId")
+F64 = struct.Struct("<d")
+U64 = struct.Struct("<Q")
+TRAILER = struct.Struct("<I")
+U32_MAX = 0xFFFFFFFF
+STRUCT_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"} # column width -> struct / memoryview format
+
+class BatchFormatError(ValueError):
+    pass
+
+def _pad4(n: int) -> int:
+    return (4 - n % 4) % 4
+
+def _f64_bits(value: float) -> int:
+    return U64.unpack(F64.pack(value))[0]
+
+def _bits_f64(bits: int) -> float:
+    return F64.unpack(U64.pack(bits))[0]
+
+def encode_batch(readings, device_id: str = None) -> bytes:
+    """Packs a list of {"bpm", "spo2", "timestamp"(seconds), "is_critical"} readings into canonical bytes."""
+    if device_id is None:
+        device_id = readings[0].get("device_id", "") if readings else ""
+    device_bytes = device_id.encode("utf-8")
+
+    times = [float(r["timestamp"]) for r in readings]
+    if any(not t > 0 or t == float("inf") for t in times):
+        raise BatchFormatError("timestamps must be positive and finite")
+    bits = [_f64_bits(t) for t in times]
+    bpm = [int(r["bpm"]) for r in readings]
+    spo2 = [int(r["spo2"]) for r in readings]
+    base = min(bits) if bits else 0
+    deltas = [b - base for b in bits]
+    if any(v < 0 or v > 0xFFFF for v in bpm + spo2):
+        raise BatchFormatError("bpm/spo2 out of range for uint16")
+
+    critical = bytearray((len(readings) + 7) // 8)
+    for i, r in enumerate(readings):
+        if r.get("is_critical"):
+            critical[i // 8] |= 1 << (i % 8)
+
+    flags = 0
+    if bpm and max(bpm) > 0xFF:
+        flags |= WIDE_BPM
+    if spo2 and max(spo2) > 0xFF:
+        flags |= WIDE_SPO2
+    if deltas and max(deltas) > U32_MAX:
+        flags |= WIDE_TS
+    count = len(readings)
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, flags, len(device_bytes), count, _bits_f64(base) if bits else 0.0))
+    out += device_bytes + b"\0" * _pad4(HEADER.size + len(device_bytes))
+    out += struct.pack(f"<{count}{'Q' if flags & WIDE_TS else 'I'}", *deltas)
+    out += struct.pack(f"<{count}{'H' if flags & WIDE_BPM else 'B'}", *bpm)
+    out += struct.pack(f"<{count}{'H' if flags & WIDE_SPO2 else 'B'}", *spo2)
+    out += critical
+    out += b"\0" * _pad4(len(out))
+    out += TRAILER.pack(zlib.crc32(out))
+    return bytes(out)
+
+def batch_hash(data) -> str:
+    """SHA-256 (hex) of the canonical encoded bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+class BatchView:
+    """
+    Read-only view over an encoded batch. Columns are slices of the original
+    buffer (memoryview, or NumPy arrays via `to_numpy`), nothing is copied.
+    """
+
+    def __init__(self, data):
+        buf = memoryview(data).cast("B")
+        if len(buf) < HEADER.size + TRAILER.size:
+            raise BatchFormatError("truncated batch")
+        magic, version, flags, id_len, count, base_ts = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise BatchFormatError("not a CRXB batch")
+        if version != VERSION:
+            raise BatchFormatError(f"unsupported batch version {version}")
+        (crc,) = TRAILER.unpack_from(buf, len(buf) - TRAILER.size)
+        if zlib.crc32(buf[:len(buf) - TRAILER.size]) != crc:
+            raise BatchFormatError("checksum mismatch")
+
+        self.buffer = buf
+        self.version = version
+        self.flags = flags
+        self.count = count
+        self.base_ts = base_ts # the float64 timestamp whose bit pattern the deltas are relative to
+        self.device_id = bytes(buf[HEADER.size:HEADER.size + id_len]).decode("utf-8")
+
+        pos = HEADER.size + id_len
+        pos += _pad4(pos)
+        self._layout = {}
+        for name, width in (("ts_delta", 8 if flags & WIDE_TS else 4),
+                            ("bpm", 2 if flags & WIDE_BPM else 1),
+                            ("spo2", 2 if flags & WIDE_SPO2 else 1)):
+            self._layout[name] = (pos, width)
+            pos += count * width
+        self._critical = pos
+        pos += (count + 7) // 8
+        if pos + _pad4(pos) + TRAILER.size != len(buf):
+            raise BatchFormatError("column sizes do not match the header")
+
+    def _raw(self, name):
+        start, width = self._layout[name]
+        return self.buffer[start:start + self.count * width], width
+
+    def column(self, name) -> memoryview:
+        """Zero-copy typed memoryview of one column (native byte order must be little-endian)."""
+        raw, width = self._raw(name)
+        if width == 1:
+            return raw
+        if sys.byteorder != "little":
+            raise BatchFormatError("zero-copy columns need a little-endian host, use readings()")
+        return raw.cast(STRUCT_CODES[width])
+
+    @property
+    def ts_delta(self):
+        return self.column("ts_delta")
+
+    @property
+    def bpm(self):
+        return self.column("bpm")
+
+    @property
+    def spo2(self):
+        return self.column("spo2")
+
+    def to_numpy(self) -> dict:
+        """NumPy views over the columns (no copy)."""
+        if np is None:
+            raise RuntimeError("NumPy is not installed")
+        arrays = {}
+        for name, (start, width) in self._layout.items():
+            dtype = {1: np.uint8, 2: np.dtype("<u2"), 4: np.dtype("<u4"), 8: np.dtype("<u8")}[width]
+            arrays[name] = np.frombuffer(self.buffer, dtype=dtype, count=self.count, offset=start)
+        return arrays
+
+    def timestamps(self):
+        """Absolute timestamps in seconds, exactly as encoded."""
+        base = _f64_bits(self.base_ts)
+        return [_bits_f64(base + d) for d in self._unpack("ts_delta")]
+
+    def critical(self):
+        bitmap = self.buffer[self._critical:self._critical + (self.count + 7) // 8]
+        return [bool(bitmap[i // 8] >> (i % 8) & 1) for i in range(self.count)]
+
+    def _unpack(self, name):
+        raw, width = self._raw(name)
+        return struct.unpack(f"<{self.count}{STRUCT_CODES[width]}", raw)
+
+    def readings(self):
+        return [
+            {"bpm": b, "spo2": s, "device_id": self.device_id, "timestamp": t, "is_critical": c}
+            for b, s, t, c in zip(self._unpack("bpm"), self._unpack("spo2"), self.timestamps(), self.critical())
+        ]
+
+    def __len__(self):
+        return self.count
+
+def decode_batch(data) -> BatchView:
+    return BatchView(data)
+
+def write_batch(path: str, readings, device_id: str = None) -> str:
+    """Writes the encoded batch and returns its canonical hash."""
+    data = encode_batch(readings, device_id)
+    with open(path, "wb") as f:
+        f.write(data)
+    return batch_hash(data)
+
+def read_batch(path: str) -> BatchView:
+    with open(path, "rb") as f:
+        return BatchView(f.read())
+
+def convert_json(path: str, out_dir: str = None) -> str:
+    """Converts one legacy batch_*.json file to <name>.crxb, returns the new path."""
+    with open(path, "r") as f:
+        readings = json.load(f)
+    out_path = os.path.splitext(path)[0] + ".crxb"
+    if out_dir:
+        out_path = os.path.join(out_dir, os.path.basename(out_path))
+    digest = write_batch(out_path, readings)
+    before, after = os.path.getsize(path), os.path.getsize(out_path)
+    print(f"📦 {path} -> {out_path}: {before} -> {after} bytes "
+          f"({before / after:.1f}x, {len(readings)} readings) sha256={digest[:16]}...")
+    return out_path
+
+if __name__ == "__main__":
+    # python gateway/batch_format.py [batch_*.json ...] [--out-dir DIR]
+    args = sys.argv[1:]
+    out_dir = None
+    if "--out-dir" in args:
+        i = args.index("--out-dir")
+        out_dir = args[i + 1]
+        del args[i:i + 2]
+        os.makedirs(out_dir, exist_ok=True)
+    paths = args or sorted(glob.glob("batch_*.json"))
+    if not paths:
+        print("⚠️ No batch_*.json files found.")
+    for path in paths:
+        convert_json(path, out_dir)
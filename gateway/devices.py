@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+
+import serial
+import serial.tools.list_ports
+from eth_account import Account
+
+from pipeline import DeviceStats
+from reading_buffer import ReadingBuffer
+from segment_log import SegmentLog
+from sources import SerialSource
+
+# Common names for Arduino on different OS
+ARDUINO_HINTS = ["Arduino", "CH340", "USB Serial", "usbmodem", "ttyACM"]
+
+def find_arduinos():
+    """All serial ports that look like a sensor (replaces the old first-match find_arduino)."""
+    return [
+        p for p in serial.tools.list_ports.comports()
+        if any(x in (p.description or "") for x in ARDUINO_HINTS)
+    ]
+
+def load_device_map(path: str) -> dict:
+    """
+    Optional JSON file mapping a sensor to its patient:
+        {"<usb serial number or port>": {"name": "...", "age": 30,
+                                         "wallet_address": "0x...", "private_key": "0x..."}}
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _safe_name(key: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in key)
+
+class Device:
+    """One sensor, its patient identity, its batching state, its durable log and its stats."""
+
+    def __init__(self, key: str, port: str, index: int, wallet_address: str, private_key: str,
+                 name: str = "Unknown Patient", age: int = 0, log: SegmentLog = None):
+        self.key = key          # stable identity (USB serial number, else port path)
+        self.port = port
+        self.index = index
+        self.wallet_address = wallet_address
+        self.private_key = private_key
+        self.name = name
+        self.age = age
+
+        self.ser = None
+        self.connected = False
+        self.patient_id = None  # EMR id, resolved on first upload
+        self.ready = False      # on-chain handshake done
+        self.lock = threading.Lock()
+
+        self.log = log
+
+        # Batching state (owned by the Batcher thread)
+        self.buffer = ReadingBuffer() # columnar, swapped for a pooled buffer on every flush
+        self.batch_started = time.perf_counter()
+        self.last_upload_time = time.time()
+
+        self.stats = DeviceStats()
+
+class DeviceManager(threading.Thread):
+    """
+    Discovers sensors and keeps one open reader per port.
+    Rescans every `scan_interval` seconds, so sensors can be plugged in or out
+    without restarting the gateway. A re-plugged sensor keeps its patient mapping.
+    With `log_dir` set, each sensor gets a SegmentLog (and its identity is saved
+    next to it) so un-acked readings are replayed to the same patient after a restart.
+    """
+
+    def __init__(self, pipeline, device_map: dict, fallback_wallet=None, scan_interval: float = 5,
+                 max_devices: int = 64, baudrate: int = 9600, log_dir: str = None, log_options: dict = None,
+                 source=None):
+        super().__init__(name="device-manager", daemon=True)
+        self.pipeline = pipeline
+        self.device_map = device_map
+        self.fallback_wallet = fallback_wallet # (address, key) of the legacy single-sensor session wallet
+        self.scan_interval = scan_interval
+        self.max_devices = max_devices
+        self.baudrate = baudrate
+        self.log_dir = log_dir
+        self.log_options = log_options or {}
+        self.source = source or SerialSource() # where ports come from (see sources.py)
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def run(self):
+        while not self.pipeline.stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"⚠️ Device scan failed: {e}")
+            self.pipeline.stop_event.wait(self.scan_interval)
+
+    def connected_count(self):
+        return sum(1 for d in self.devices.values() if d.connected)
+
+    def scan(self):
+        for port in self.source.ports():
+            key = port.serial_number or port.device
+            with self._lock:
+                device = self.devices.get(key)
+                if device and device.connected:
+                    continue
+                if self.connected_count() >= self.max_devices:
+                    print(f"⚠️ Device limit reached ({self.max_devices}), ignoring {port.device}")
+                    continue
+                is_new = device is None
+                if is_new:
+                    device = self._register(key, port.device)
+                device.port = port.device
+                try:
+                    device.ser = self.source.open(port, self.baudrate)
+                    device.ser.reset_input_buffer()
+                except Exception as e:
+                    print(f"❌ Could not open {port.device}: {e}")
+                    continue
+                device.connected = True
+            print(f"✅ Found {'Arduino' if self.source.name == 'serial' else self.source.name + ' sensor'} on {port.device} -> Patient {device.wallet_address}")
+            self.pipeline.attach(device, on_disconnect=self._disconnected)
+            if is_new:
+                self.pipeline.replay(device)
+
+    def _register(self, key: str, port: str) -> Device:
+        log_path = os.path.join(self.log_dir, _safe_name(key)) if self.log_dir else None
+        identity_path = os.path.join(log_path, "identity.json") if log_path else None
+        entry = self.device_map.get(key) or self.device_map.get(port)
+        if not entry and identity_path and os.path.exists(identity_path):
+            # Same sensor as before a restart -> same patient, so replayed readings land correctly
+            with open(identity_path, "r") as f:
+                entry = json.load(f)
+        if entry:
+            wallet, private_key = entry["wallet_address"], entry["private_key"]
+            name, age = entry.get("name", "Unknown Patient"), entry.get("age", 0)
+        elif self.fallback_wallet and not any(d.wallet_address == self.fallback_wallet[0] for d in self.devices.values()):
+            # First unmapped sensor keeps the legacy single-patient session wallet
+            wallet, private_key = self.fallback_wallet
+            name, age = "Subir Nath Bhowmik", 30 # Placeholder
+        else:
+            # Privacy mode: a fresh session wallet per unknown sensor
+            account = Account.create()
+            wallet, private_key = account.address, account.key.hex()
+            name, age = f"Unassigned Patient ({key})", 0
+
+        log = None
+        if log_path:
+            log = SegmentLog(log_path, **self.log_options)
+            with open(identity_path, "w") as f:
+                json.dump({"wallet_address": wallet, "private_key": private_key, "name": name, "age": age}, f)
+
+        device = Device(key, port, len(self.devices), wallet, private_key, name=name, age=age, log=log)
+        self.devices[key] = device
+        return device
+
+    def _disconnected(self, device: Device):
+        with self._lock:
+            device.connected = False
+            try:
+                device.ser.close()
+            except Exception:
+                pass
+        print(f"🔌 Sensor {device.key} disconnected ({device.port})")
@@ -0,0 +1,284 @@
+import asyncio
+import gzip
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+try:
+    import httpx
+except ImportError: # the async face falls back to the sync client in threads
+    httpx = None
+
+# Shared HTTP client for the EMR API (gateway/service.py, and seed_data.py as gateway.emr_client).
+#
+#   keep-alive pool     one Session / AsyncClient, connections reused across calls
+#   bounded in-flight   at most `max_in_flight` concurrent requests per client
+#   gzip bodies         request bodies above `gzip_min_bytes` are sent gzip-encoded
+#                       (the backend decodes them, see gzip_request.py)
+#   retry with jitter   connection errors, 429 and 5xx; POSTs only when the request
+#                       cannot have reached the handler (connect errors, 502/503/504)
+#   circuit breaker     after `breaker_threshold` consecutive failures calls fail fast
+#                       for `breaker_reset` seconds, then one trial call is let through
+
+EMR_API_URL = os.getenv("EMR_API_URL", "http://localhost:8000/api/v1")
+EMR_TIMEOUT = float(os.getenv("EMR_TIMEOUT", "30"))
+EMR_CONNECT_TIMEOUT = float(os.getenv("EMR_CONNECT_TIMEOUT", "3.05"))
+EMR_POOL_SIZE = int(os.getenv("EMR_POOL_SIZE", "16"))
+EMR_MAX_IN_FLIGHT = int(os.getenv("EMR_MAX_IN_FLIGHT", "8"))
+EMR_RETRIES = int(os.getenv("EMR_RETRIES", "3"))
+EMR_BACKOFF = float(os.getenv("EMR_BACKOFF", "0.5"))               # seconds, doubled per attempt (full jitter)
+EMR_GZIP_MIN_BYTES = int(os.getenv("EMR_GZIP_MIN_BYTES", "4096"))  # 0 = never compress
+EMR_BREAKER_THRESHOLD = int(os.getenv("EMR_BREAKER_THRESHOLD", "5"))
+EMR_BREAKER_RESET = float(os.getenv("EMR_BREAKER_RESET", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+UNPROCESSED_STATUS = {502, 503, 504} # safe to resend a POST
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class EMRClientError(Exception):
+    pass
+
+class CircuitOpenError(EMRClientError):
+    pass
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half-open after `reset` seconds."""
+
+    def __init__(self, threshold: int = EMR_BREAKER_THRESHOLD, reset: float = EMR_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset = reset
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset else "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == "open" or (state == "half-open" and self._trial):
+                raise CircuitOpenError(f"EMR backend unavailable, retrying in {self.reset - (time.monotonic() - self.opened_at):.0f}s")
+            if state == "half-open":
+                self._trial = True # only one call probes the backend
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+def backoff_delay(attempt: int, base: float = EMR_BACKOFF) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, base * (2 ** attempt))
+
+def encode_body(payload, gzip_min_bytes: int = EMR_GZIP_MIN_BYTES):
+    """(body bytes, headers) for a JSON payload or already-serialized JSON bytes."""
+    body = payload if isinstance(payload, (bytes, bytearray)) else json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"Content-Type": "application/json"}
+    if gzip_min_bytes and len(body) >= gzip_min_bytes:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return bytes(body), headers
+
+def _should_retry(method: str, status: int = None, connect_error: bool = False) -> bool:
+    if connect_error:
+        return True
+    if status is None: # read timeout / reset after sending: the server may have handled it
+        return method in IDEMPOTENT
+    if status in UNPROCESSED_STATUS:
+        return True
+    return status in RETRY_STATUS and method in IDEMPOTENT
+
+class EMRClient:
+    """Synchronous face (requests.Session). Thread-safe; share one per process."""
+
+    def __init__(self, base_url: str = EMR_API_URL, timeout: float = EMR_TIMEOUT, pool_size: int = EMR_POOL_SIZE,
+                 max_in_flight: int = EMR_MAX_IN_FLIGHT, retries: int = EMR_RETRIES, gzip_min_bytes: int = EMR_GZIP_MIN_BYTES,
+                 breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (EMR_CONNECT_TIMEOUT, timeout)
+        self.retries = retries
+        self.gzip_min_bytes = gzip_min_bytes
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, max_in_flight), max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, payload=None, params=None, expect=(200,)) -> requests.Response:
+        """Sends with retries; returns the response when its status is in `expect` (else raises)."""
+        method = method.upper()
+        body, headers = encode_body(payload, self.gzip_min_bytes) if payload is not None else (None, {})
+        url = path if path.startswith("http") else self.base_url + path
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            status, error, connect_error = None, None, False
+            try:
+                with self._slots:
+                    resp = self.session.request(method, url, data=body, params=params, headers=headers, timeout=self.timeout)
+                status = resp.status_code
+            except requests.ConnectionError as e:
+                # Refused / unreachable: the request never reached the server
+                reason = getattr(e.args[0], "reason", None) if e.args else None
+                error, connect_error = e, isinstance(e, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+            except requests.Timeout as e:
+                error = e
+
+            if status is not None and status < 500 and status != 429:
+                self.breaker.success() # backend is up, even if it rejected this request
+                if status in expect:
+                    return resp
+                raise EMRClientError(f"{method} {path} -> {status}: {resp.text[:200]}")
+            self.breaker.failure()
+            if attempt >= self.retries or not _should_retry(method, status, connect_error):
+                raise EMRClientError(f"{method} {path} failed: {error or status}")
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def get_json(self, path: str, params=None):
+        return self.request("GET", path, params=params).json()
+
+    def post_json(self, path: str, payload):
+        return self.request("POST", path, payload).json()
+
+    # --- EMR API -------------------------------------------------------
+
+    def health(self) -> bool:
+        try:
+            self.request("GET", self.base_url.rsplit("/api/", 1)[0] + "/")
+            return True
+        except EMRClientError:
+            return False
+
+    def get_patient_by_wallet(self, wallet_address: str):
+        """Patient summary, or None when the wallet is not registered."""
+        resp = self.request("GET", f"/patients/by-wallet/{wallet_address}", expect=(200, 404))
+        return resp.json() if resp.status_code == 200 else None
+
+    def create_patient(self, name: str, age: int, wallet_address: str):
+        return self.post_json("/patients/", {"name": name, "age": age, "wallet_address": wallet_address})
+
+    def ensure_patient(self, name: str, age: int, wallet_address: str):
+        """Existing patient for the wallet, else a newly registered one."""
+        return self.get_patient_by_wallet(wallet_address) or self.create_patient(name, age, wallet_address)
+
+    def post_vitals(self, patient_id: int, vitals: dict):
+        return self.post_json(f"/patients/{patient_id}/vitals/", vitals)
+
+    def post_vitals_batch(self, patient_id: int, vitals):
+        """`vitals` is a list of dicts or pre-serialized JSON bytes (e.g. ReadingBatch.to_json)."""
+        return self.post_json(f"/patients/{patient_id}/vitals/batch", vitals)
+
+    def close(self):
+        self.session.close()
+
+class AsyncEMRClient:
+    """
+    asyncio face with the same retry / breaker / gzip policy. Uses httpx when
+    installed, otherwise runs a pooled EMRClient in worker threads.
+    """
+
+    def __init__(self, base_url: str = EMR_API_URL, timeout: float = EMR_TIMEOUT, pool_size: int = EMR_POOL_SIZE,
+                 max_in_flight: int = EMR_MAX_IN_FLIGHT, retries: int = EMR_RETRIES, gzip_min_bytes: int = EMR_GZIP_MIN_BYTES,
+                 breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.gzip_min_bytes = gzip_min_bytes
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._sync = None
+        self.client = None
+        if httpx is not None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout, connect=EMR_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=max(pool_size, max_in_flight), max_keepalive_connections=pool_size),
+            )
+        else:
+            self._sync = EMRClient(base_url, timeout, pool_size, max_in_flight, retries, gzip_min_bytes, self.breaker)
+
+    async def request(self, method: str, path: str, payload=None, params=None, expect=(200,)):
+        if self._sync is not None:
+            async with self._slots:
+                return await asyncio.to_thread(self._sync.request, method, path, payload, params, expect)
+
+        method = method.upper()
+        body, headers = encode_body(payload, self.gzip_min_bytes) if payload is not None else (None, {})
+        url = path if path.startswith("http") else self.base_url + path
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            status, error, connect_error = None, None, False
+            try:
+                async with self._slots:
+                    resp = await self.client.request(method, url, content=body, params=params, headers=headers)
+                status = resp.status_code
+            except httpx.ConnectError as e:
+                error, connect_error = e, True
+            except httpx.TransportError as e:
+                error = e
+
+            if status is not None and status < 500 and status != 429:
+                self.breaker.success()
+                if status in expect:
+                    return resp
+                raise EMRClientError(f"{method} {path} -> {status}: {resp.text[:200]}")
+            self.breaker.failure()
+            if attempt >= self.retries or not _should_retry(method, status, connect_error):
+                raise EMRClientError(f"{method} {path} failed: {error or status}")
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def get_json(self, path: str, params=None):
+        return (await self.request("GET", path, params=params)).json()
+
+    async def post_json(self, path: str, payload):
+        return (await self.request("POST", path, payload)).json()
+
+    async def get_patient_by_wallet(self, wallet_address: str):
+        resp = await self.request("GET", f"/patients/by-wallet/{wallet_address}", expect=(200, 404))
+        return resp.json() if resp.status_code == 200 else None
+
+    async def create_patient(self, name: str, age: int, wallet_address: str):
+        return await self.post_json("/patients/", {"name": name, "age": age, "wallet_address": wallet_address})
+
+    async def ensure_patient(self, name: str, age: int, wallet_address: str):
+        return await self.get_patient_by_wallet(wallet_address) or await self.create_patient(name, age, wallet_address)
+
+    async def post_vitals_batch(self, patient_id: int, vitals):
+        return await self.post_json(f"/patients/{patient_id}/vitals/batch", vitals)
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+        if self._sync is not None:
+            self._sync.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
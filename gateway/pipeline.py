@@ -0,0 +1,435 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from reading_buffer import BufferPool
+
+# Producer/consumer pipeline for the hardware gateway:
+#
+#   SerialReader (one per device) --(bounded reading queue)--> Batcher --(bounded batch queue)--> UploadWorkers
+#
+# Readers only block on their serial port and never on uploads, so every
+# Arduino's buffer keeps draining while a batch is being minted/synced.
+# Each device keeps its own columnar buffer (reading_buffer.py) and batching state; the upload pool is shared.
+# Every reading is appended to the device's SegmentLog before it is buffered and
+# acknowledged only after its batch uploads, so nothing is lost on a crash.
+
+class StageStats:
+    """Latency accumulator for one pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg_ms": round(1000 * self.total / self.count, 3) if self.count else 0.0,
+                "max_ms": round(1000 * self.max, 3),
+                "last_ms": round(1000 * self.last, 3)
+            }
+
+class DeviceStats:
+    """Per-device counters and throughput."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.readings = 0
+        self.dropped = 0
+        self.batches = 0
+        self.upload_errors = 0
+        self.alerts = 0
+        self.first_seen = None
+        self.last_seen = None
+
+    def incr(self, name: str, by: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + by)
+
+    def seen(self, ts: float):
+        with self._lock:
+            self.readings += 1
+            if self.first_seen is None:
+                self.first_seen = ts
+            self.last_seen = ts
+
+    def snapshot(self):
+        with self._lock:
+            span = (self.last_seen - self.first_seen) if self.first_seen is not None else 0
+            return {
+                "readings": self.readings,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "upload_errors": self.upload_errors,
+                "alerts": self.alerts,
+                "readings_per_sec": round(self.readings / span, 3) if span > 0 else 0.0,
+                "last_seen": self.last_seen
+            }
+
+class PipelineStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "readings_in": 0,
+            "parse_errors": 0,
+            "dropped_readings": 0,
+            "batches_queued": 0,
+            "batches_uploaded": 0,
+            "upload_errors": 0,
+            "upload_retries": 0,
+            "replayed_readings": 0,
+            "alerts_raised": 0,
+            "alerts_cleared": 0
+        }
+        self.stages = {
+            "parse": StageStats(),       # serial line -> reading
+            "queue_wait": StageStats(),  # reading queued -> picked up by batcher
+            "alerts": StageStats(),      # rule evaluation per device window
+            "upload": StageStats(),      # upload_fn duration per batch
+            "end_to_end": StageStats()   # first reading of a batch -> batch uploaded
+        }
+        self.queues = {}
+        self.pool = None
+        self.devices = {}
+
+    def incr(self, name: str, by: int = 1):
+        with self._lock:
+            self.counters[name] += by
+
+    def watch_queue(self, name: str, q: queue.Queue):
+        self.queues[name] = q
+
+    def watch_pool(self, pool: BufferPool):
+        self.pool = pool
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "counters": counters,
+            "queues": {name: {"depth": q.qsize(), "capacity": q.maxsize} for name, q in self.queues.items()},
+            "stages": {name: s.snapshot() for name, s in self.stages.items()},
+            "buffers": self.pool.snapshot() if self.pool else None,
+            "devices": {
+                key: dict(device.stats.snapshot(), port=device.port, connected=device.connected,
+                          buffered=len(device.buffer), unacked=device.log.pending() if device.log else 0)
+                for key, device in list(self.devices.items())
+            }
+        }
+
+class SerialReader(threading.Thread):
+    """
+    Blocking reader for one device: `readline()` waits on the port (pyserial
+    timeout) instead of spinning on `in_waiting`. Parsed readings are appended to
+    the device log, then go to the shared bounded queue; when it is full the
+    reading is dropped and counted rather than stalling the port, and its log
+    offset is marked skipped so it cannot hold back log compaction.
+    Exits when the port goes away (sensor unplugged).
+    """
+
+    def __init__(self, device, readings: queue.Queue, stats: PipelineStats, stop_event: threading.Event, on_disconnect=None):
+        super().__init__(name=f"reader-{device.key}", daemon=True)
+        self.device = device
+        self.ser = device.ser
+        self.readings = readings
+        self.stats = stats
+        self.stop_event = stop_event
+        self.on_disconnect = on_disconnect
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                raw = self.ser.readline()
+            except Exception as e:
+                print(f"❌ Serial/IO Error on {self.device.port}: {e}")
+                break
+            if not raw:
+                continue # read timeout, nothing arrived
+
+            started = time.perf_counter()
+            line = raw.decode('utf-8', errors='ignore').rstrip()
+            if not line:
+                continue
+            try:
+                reading = json.loads(line)
+            except json.JSONDecodeError as je:
+                self.stats.incr("parse_errors")
+                print(f"⚠️ JSON Parse Error: {je} | Raw: {line}")
+                self.ser.reset_input_buffer() # Flush to re-sync
+                continue
+            reading['timestamp'] = time.time()
+            self.stats.stages["parse"].observe(time.perf_counter() - started)
+            self.stats.incr("readings_in")
+            self.device.stats.seen(reading['timestamp'])
+            offset = self.device.log.append(reading) if self.device.log else None
+
+            try:
+                self.readings.put_nowait((self.device, reading, offset, time.perf_counter()))
+            except queue.Full:
+                self.stats.incr("dropped_readings")
+                self.device.stats.incr("dropped")
+                if offset is not None:
+                    self.device.log.skip([offset])
+
+        if self.on_disconnect:
+            self.on_disconnect(self.device)
+
+class Batcher(threading.Thread):
+    """
+    Accumulates readings per device and hands complete batches to the upload queue:
+      1. CRITICAL alert   -> flush that device when a critical rule is raised (see alerts.py)
+      2. BATCH FULL       -> flush at `batch_size`
+      3. TIME SYNC        -> flush when `batch_time` has passed since the device's last flush
+    Readings are taken off the queue in arrival windows (everything waiting, up to
+    `window_size`) so the alert rules run once per device per window.
+    Blocks on a full upload queue, which pushes back onto the reading queue.
+    """
+
+    def __init__(self, readings: queue.Queue, batches: queue.Queue, stats: PipelineStats, stop_event: threading.Event,
+                 batch_size: int, batch_time: float, alert_engine, pool: BufferPool, window_size: int = 500):
+        super().__init__(name="batcher", daemon=True)
+        self.readings = readings
+        self.batches = batches
+        self.stats = stats
+        self.stop_event = stop_event
+        self.batch_size = batch_size
+        self.batch_time = batch_time
+        self.alert_engine = alert_engine
+        self.pool = pool
+        self.window_size = window_size
+        self.last_time_check = time.time()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            window = []
+            try:
+                window.append(self.readings.get(timeout=0.5))
+                while len(window) < self.window_size:
+                    window.append(self.readings.get_nowait())
+            except queue.Empty:
+                pass
+
+            if window:
+                self.add_window(window)
+
+            # TIME SYNC sweep over all devices, at most twice a second
+            now = time.time()
+            if now - self.last_time_check >= 0.5:
+                self.last_time_check = now
+                for dev in list(self.stats.devices.values()):
+                    if dev.log:
+                        dev.log.sync_if_due()
+                    if dev.buffer and now - dev.last_upload_time > self.batch_time:
+                        self.flush(dev, "TIME SYNC")
+
+        for dev in list(self.stats.devices.values()):
+            if dev.buffer:
+                self.flush(dev, "SHUTDOWN")
+
+    def add_window(self, window):
+        by_device = {}
+        for device, reading, offset, queued_at in window:
+            self.stats.stages["queue_wait"].observe(time.perf_counter() - queued_at)
+            by_device.setdefault(device, []).append((reading, offset))
+        for device, items in by_device.items():
+            self.add(device, [r for r, _ in items], [o for _, o in items])
+
+    def add(self, device, readings, offsets):
+        started = time.perf_counter()
+        result = self.alert_engine.evaluate(device.key, readings)
+        self.stats.stages["alerts"].observe(time.perf_counter() - started)
+
+        if result.raised:
+            self.stats.incr("alerts_raised", len(result.raised))
+            device.stats.incr("alerts", len(result.raised))
+            for name, ts, value in result.raised:
+                print(f"🔴 ALERT [{device.key}]: {name} ({value:.1f})")
+        for i, (reading, offset) in enumerate(zip(readings, offsets)):
+            if not device.buffer:
+                device.batch_started = time.perf_counter()
+            device.buffer.append(reading.get('timestamp', 0.0), reading.get('bpm'), reading.get('spo2'),
+                                 result.critical[i], offset, device.index)
+            if i in result.raised_at:
+                print(f"🔴 CRITICAL [{device.key}]: {reading.get('bpm')} BPM (Buffer: {len(device.buffer)})")
+                self.flush(device, "CRITICAL")
+            elif len(device.buffer) >= self.batch_size:
+                self.flush(device, "BATCH FULL")
+
+        if result.cleared:
+            self.stats.incr("alerts_cleared", len(result.cleared))
+            for name, ts, value in result.cleared:
+                print(f"🟢 CLEARED [{device.key}]: {name} ({value:.1f})")
+        if not result.raised_critical:
+            print(f"🟢 Stable [{device.key}]: {readings[-1].get('bpm', 0)} BPM (Buffer: {len(device.buffer)})", end='\r')
+
+    def flush(self, device, reason: str):
+        # The filled buffer travels with the batch (zero-copy views), the device continues in a pooled one
+        batch, device.buffer = device.buffer.batch(), self.pool.acquire()
+        device.last_upload_time = time.time()
+        self.batches.put((device, batch, batch.offsets(), reason, device.batch_started, 0))
+        self.stats.incr("batches_queued")
+
+class UploadWorkers:
+    """
+    Fixed pool of threads running `upload_fn(device, batch, reason)` off the shared
+    batch queue. A successful upload acknowledges the batch in the device log and
+    returns its buffer to the pool; a failed one is retried with backoff and
+    otherwise replayed on the next start.
+    """
+
+    def __init__(self, batches: queue.Queue, stats: PipelineStats, upload_fn, workers: int = 2,
+                 max_retries: int = 3, retry_delay: float = 5.0):
+        self.batches = batches
+        self.stats = stats
+        self.upload_fn = upload_fn
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.threads = [
+            threading.Thread(target=self._run, name=f"uploader-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+
+    def _run(self):
+        while True:
+            item = self.batches.get()
+            if item is None:
+                break
+            device, batch, offsets, reason, batch_started, attempt = item
+            started = time.perf_counter()
+            try:
+                self.upload_fn(device, batch, reason)
+                if device.log:
+                    device.log.ack([o for o in offsets if o is not None])
+                batch.release()
+                self.stats.incr("batches_uploaded")
+                device.stats.incr("batches")
+            except Exception as e:
+                self.stats.incr("upload_errors")
+                device.stats.incr("upload_errors")
+                print(f"❌ Upload Error [{device.key}] ({reason}): {e}")
+                if attempt < self.max_retries:
+                    self.stats.incr("upload_retries")
+                    retry = (device, batch, offsets, reason, batch_started, attempt + 1)
+                    timer = threading.Timer(self.retry_delay * (2 ** attempt), self.batches.put, args=(retry,))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    batch.release() # still un-acked in the log, replayed on restart
+            finally:
+                done = time.perf_counter()
+                self.stats.stages["upload"].observe(done - started)
+                self.stats.stages["end_to_end"].observe(done - batch_started)
+                self.batches.task_done()
+
+    def stop(self, timeout: float = 30):
+        for _ in self.threads:
+            self.batches.put(None)
+        for t in self.threads:
+            t.join(timeout=timeout)
+
+def start_metrics_server(stats: PipelineStats, port: int):
+    """Serves `stats.snapshot()` as JSON on http://0.0.0.0:<port>/metrics."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = json.dumps(stats.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📊 Gateway metrics on http://localhost:{port}/metrics")
+    return server
+
+class GatewayPipeline:
+    def __init__(self, upload_fn, alert_engine, batch_size: int, batch_time: float,
+                 queue_size: int = 1000, batch_queue_size: int = 8, upload_workers: int = 2):
+        self.stats = PipelineStats()
+        self.stop_event = threading.Event()
+        self.readings = queue.Queue(maxsize=queue_size)
+        self.batches = queue.Queue(maxsize=batch_queue_size)
+        self.stats.watch_queue("readings", self.readings)
+        self.stats.watch_queue("batches", self.batches)
+
+        self.pool = BufferPool(batch_size)
+        self.stats.watch_pool(self.pool)
+
+        self.readers = {}
+        self.batcher = Batcher(self.readings, self.batches, self.stats, self.stop_event,
+                               batch_size, batch_time, alert_engine, self.pool)
+        self.uploaders = UploadWorkers(self.batches, self.stats, upload_fn, workers=upload_workers)
+
+    def attach(self, device, on_disconnect=None):
+        """Starts a reader for a newly opened device (hot-plug safe)."""
+        self.stats.devices[device.key] = device
+        reader = SerialReader(device, self.readings, self.stats, self.stop_event, on_disconnect=on_disconnect)
+        self.readers[device.key] = reader
+        reader.start()
+
+    def replay(self, device):
+        """Re-queues readings the device log holds but never acknowledged (crash recovery)."""
+        if not device.log:
+            return 0
+        count = 0
+        for offset, reading in device.log.replay():
+            self.readings.put((device, reading, offset, time.perf_counter()))
+            count += 1
+        if count:
+            self.stats.incr("replayed_readings", count)
+            print(f"♻️ Replaying {count} un-acked readings for {device.key}")
+        return count
+
+    def start(self):
+        self.uploaders.start()
+        self.batcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for reader in list(self.readers.values()):
+            reader.join(timeout=2)
+        self.batcher.join(timeout=5)
+        self.uploaders.stop()
+        for device in list(self.stats.devices.values()):
+            if device.log:
+                device.log.close()
+
+    def run_forever(self, stats_interval: float = 30):
+        try:
+            while True:
+                time.sleep(stats_interval)
+                snap = self.stats.snapshot()
+                c = snap["counters"]
+                connected = sum(1 for d in snap["devices"].values() if d["connected"])
+                print(f"\n📊 devices={connected} in={c['readings_in']} dropped={c['dropped_readings']} "
+                      f"queue={snap['queues']['readings']['depth']} batches={c['batches_uploaded']} "
+                      f"upload_avg={snap['stages']['upload']['avg_ms']}ms")
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping gateway, flushing buffered readings...")
+            self.stop()
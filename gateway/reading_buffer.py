@@ -0,0 +1,143 @@
+import json
+import threading
+
+import numpy as np
+
+# Columnar per-device reading buffer (replaces the list of reading dicts).
+#
+#   timestamp  float64   seconds, exact (the Merkle leaf hashes float(timestamp))
+#   bpm        uint16
+#   spo2       uint16
+#   critical   bool      set by the alert engine
+#   device     uint16    device index (several sensors can share a buffer)
+#   offset     int64     segment log offset, -1 when the reading is not logged
+#
+# ~23 bytes per reading instead of a dict per reading. Appends write into
+# preallocated columns; a flush hands the filled buffer itself to the upload
+# queue as a ReadingBatch (views, no copy) and the device continues in a buffer
+# from the pool. Buffers go back to the pool once their batch is acknowledged,
+# so memory stays flat however many devices/batches are in flight.
+
+DTYPES = {
+    "timestamp": np.float64,
+    "bpm": np.uint16,
+    "spo2": np.uint16,
+    "critical": np.bool_,
+    "device": np.uint16,
+    "offset": np.int64,
+}
+
+class ReadingBuffer:
+    def __init__(self, capacity: int = 64, pool=None):
+        self.capacity = capacity
+        self.pool = pool
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in DTYPES.items()}
+
+    def _grow(self):
+        # Only hit when a batch outgrows batch_size (e.g. a large replay window)
+        self.capacity *= 2
+        for name, col in self.columns.items():
+            grown = np.empty(self.capacity, dtype=col.dtype)
+            grown[:self.size] = col[:self.size]
+            self.columns[name] = grown
+
+    def append(self, timestamp: float, bpm, spo2, critical: bool = False, offset: int = None, device: int = 0):
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        c = self.columns
+        c["timestamp"][i] = timestamp
+        c["bpm"][i] = min(max(int(bpm or 0), 0), 0xFFFF)
+        c["spo2"][i] = min(max(int(spo2 or 0), 0), 0xFFFF)
+        c["critical"][i] = critical
+        c["device"][i] = device
+        c["offset"][i] = -1 if offset is None else offset
+        self.size += 1
+
+    def append_reading(self, reading: dict, offset: int = None, device: int = 0):
+        self.append(reading.get("timestamp", 0.0), reading.get("bpm"), reading.get("spo2"),
+                    reading.get("is_critical", False), offset, device)
+
+    def batch(self) -> "ReadingBatch":
+        return ReadingBatch(self)
+
+    def clear(self):
+        self.size = 0
+
+    def release(self):
+        """Returns the buffer to its pool (after its batch was uploaded)."""
+        self.clear()
+        if self.pool is not None:
+            self.pool.release(self)
+
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self.columns.values())
+
+    def __len__(self):
+        return self.size
+
+class ReadingBatch:
+    """Read-only views over the first `len` rows of a ReadingBuffer (zero-copy)."""
+
+    def __init__(self, buffer: ReadingBuffer, start: int = 0, stop: int = None):
+        self.buffer = buffer
+        stop = buffer.size if stop is None else stop
+        for name, col in buffer.columns.items():
+            view = col[start:stop]
+            view.flags.writeable = False
+            setattr(self, name, view)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, s: slice) -> "ReadingBatch":
+        start, stop, _ = s.indices(len(self))
+        return ReadingBatch(self.buffer, start, stop)
+
+    def offsets(self) -> list:
+        return [int(o) for o in self.offset[self.offset >= 0]]
+
+    def rows(self):
+        """(bpm, spo2, timestamp, is_critical) tuples as Python scalars."""
+        return zip(self.bpm.tolist(), self.spo2.tolist(), self.timestamp.tolist(), self.critical.tolist())
+
+    def readings(self):
+        return [{"bpm": b, "spo2": s, "timestamp": t, "is_critical": c} for b, s, t, c in self.rows()]
+
+    def to_json(self, ipfs_hash: str) -> bytes:
+        """EMR /vitals/batch payload, written straight from the columns (no dict per reading)."""
+        suffix = f',"ipfs_hash":{json.dumps(ipfs_hash)}}}'
+        return ("[" + ",".join(
+            f'{{"bpm":{b},"spo2":{s},"is_critical":{"true" if c else "false"},"timestamp":{t!r}' + suffix
+            for b, s, t, c in self.rows()
+        ) + "]").encode()
+
+    def release(self):
+        self.buffer.release()
+
+class BufferPool:
+    """Free list of ReadingBuffers sized for one batch."""
+
+    def __init__(self, capacity: int, max_free: int = 256):
+        self.capacity = capacity
+        self.max_free = max_free
+        self._lock = threading.Lock()
+        self._free = []
+        self.allocated = 0
+
+    def acquire(self) -> ReadingBuffer:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return ReadingBuffer(self.capacity, pool=self)
+
+    def release(self, buffer: ReadingBuffer):
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"allocated": self.allocated, "free": len(self._free), "buffer_capacity": self.capacity}
@@ -0,0 +1,226 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Append-only, crash-safe log of sensor readings (one log per device).
+#
+#   <dir>/<base_offset:020d>.seg   records: [u32 length][u32 crc32][payload]
+#   <dir>/ack.json                 {"committed": N, "acked": [[start, end], ...]}
+#
+# Offsets are record sequence numbers. Readings are appended BEFORE they are
+# buffered, fsync'd in groups, and acknowledged once their batch is uploaded.
+# Readings dropped on overload are marked skipped, which counts like an ack.
+# On restart every reading that was never acknowledged is replayed; segments
+# that lie entirely below the committed offset are deleted (compaction).
+
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".seg"
+ACK_FILE = "ack.json"
+
+class SegmentLog:
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024, fsync_every: int = 100,
+                 fsync_interval: float = 0.5, use_mmap: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.use_mmap = use_mmap
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.committed, self.acked = self._load_acks()
+        self.segments = self._list_segments() # base offsets, ascending
+        self.next_offset = self._recover_tail()
+
+        self._file = None
+        self._file_size = 0
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self._open_active()
+
+    # --- layout -------------------------------------------------------
+
+    def _segment_path(self, base: int) -> str:
+        return os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def _list_segments(self):
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _read_records(self, base: int):
+        """Yields (offset, payload, end_position) for every intact record of a segment."""
+        path = self._segment_path(base)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.use_mmap else f.read()
+            try:
+                pos, offset = 0, base
+                while pos + RECORD_HEADER.size <= size:
+                    length, crc = RECORD_HEADER.unpack_from(data, pos)
+                    start, end = pos + RECORD_HEADER.size, pos + RECORD_HEADER.size + length
+                    if end > size:
+                        break # torn write
+                    payload = bytes(data[start:end])
+                    if zlib.crc32(payload) != crc:
+                        break # corrupted tail
+                    yield offset, payload, end
+                    pos, offset = end, offset + 1
+            finally:
+                if self.use_mmap:
+                    data.close()
+
+    def _recover_tail(self) -> int:
+        """Finds the next offset and truncates a torn/corrupted tail left by a crash."""
+        if not self.segments:
+            self.segments = [self.committed]
+            return self.committed
+        base = self.segments[-1]
+        next_offset, valid_end = base, 0
+        for offset, _, end in self._read_records(base):
+            next_offset, valid_end = offset + 1, end
+        path = self._segment_path(base)
+        if os.path.exists(path) and os.path.getsize(path) > valid_end:
+            print(f"🩹 Truncating torn tail of {path}")
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+        return max(next_offset, self.committed)
+
+    def _open_active(self):
+        path = self._segment_path(self.segments[-1])
+        self._file = open(path, "ab")
+        self._file_size = self._file.tell()
+
+    def _roll(self):
+        self._sync_locked()
+        self._file.close()
+        self.segments.append(self.next_offset)
+        self._open_active()
+
+    # --- write path ---------------------------------------------------
+
+    def append(self, reading: dict) -> int:
+        payload = json.dumps(reading, separators=(",", ":")).encode()
+        with self._lock:
+            if self._file_size >= self.segment_bytes:
+                self._roll()
+            self._file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self._file.write(payload)
+            self._file_size += RECORD_HEADER.size + len(payload)
+            offset = self.next_offset
+            self.next_offset += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+            return offset
+
+    def _sync_locked(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.time()
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def sync_if_due(self):
+        """Group-commit timer: bounds how long an appended reading can stay un-fsync'd."""
+        with self._lock:
+            if self._unsynced and time.time() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    # --- acknowledgements ----------------------------------------------
+
+    def _load_acks(self):
+        path = os.path.join(self.directory, ACK_FILE)
+        if not os.path.exists(path):
+            return 0, []
+        with open(path, "r") as f:
+            state = json.load(f)
+        return state["committed"], [tuple(r) for r in state["acked"]]
+
+    def _save_acks(self):
+        path = os.path.join(self.directory, ACK_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"committed": self.committed, "acked": self.acked}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _mark_locked(self, offsets):
+        ranges = []
+        for offset in sorted(offsets):
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1][1] = offset + 1
+            else:
+                ranges.append([offset, offset + 1])
+        merged = sorted(self.acked + [tuple(r) for r in ranges])
+        self.acked = []
+        for start, end in merged:
+            if self.acked and start <= self.acked[-1][1]:
+                self.acked[-1] = (self.acked[-1][0], max(self.acked[-1][1], end))
+            else:
+                self.acked.append((start, end))
+        while self.acked and self.acked[0][0] <= self.committed:
+            self.committed = max(self.committed, self.acked.pop(0)[1])
+
+    def ack(self, offsets):
+        """Marks offsets as uploaded; advances the committed offset over contiguous acks."""
+        if not offsets:
+            return
+        with self._lock:
+            self._mark_locked(offsets)
+            self._save_acks()
+            self._compact_locked()
+
+    def skip(self, offsets):
+        """
+        Marks offsets that will never be uploaded (dropped on overload) so they
+        do not leave a gap below `committed` that stops compaction. Kept in
+        memory until the next ack persists it: no fsync per dropped reading, and
+        after a crash the skipped readings are simply replayed.
+        """
+        if not offsets:
+            return
+        with self._lock:
+            self._mark_locked(offsets)
+
+    def _compact_locked(self):
+        # A segment can go once the next segment starts at or below the committed offset
+        while len(self.segments) > 1 and self.segments[1] <= self.committed:
+            os.remove(self._segment_path(self.segments.pop(0)))
+
+    # --- replay --------------------------------------------------------
+
+    def _is_acked(self, offset: int) -> bool:
+        return offset < self.committed or any(s <= offset < e for s, e in self.acked)
+
+    def replay(self):
+        """Yields (offset, reading) for every durable reading that was never acknowledged."""
+        self.sync()
+        for base in list(self.segments):
+            if not os.path.exists(self._segment_path(base)):
+                continue
+            for offset, payload, _ in self._read_records(base):
+                if not self._is_acked(offset):
+                    yield offset, json.loads(payload)
+
+    def pending(self) -> int:
+        acked_above = sum(e - s for s, e in self.acked)
+        return self.next_offset - self.committed - acked_above
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
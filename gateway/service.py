@@ -1,13 +1,18 @@
-import serial
-import serial.tools.list_ports
 import json
 import time
 import os
-import secrets
-import requests
-import hashlib
+import sys
 from web3 import Web3
-from eth_account import Account
+
+from emr_client import EMRClient
+# Merkle hashing must match the EMR backend's exactly: use its module rather than a copy
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../emr_platform/backend"))
+import merkle
+from nonce_manager import NonceManager
+from pipeline import GatewayPipeline, start_metrics_server
+from devices import DeviceManager, load_device_map
+from alerts import AlertEngine, load_rules
+from sources import make_source
 
 # --- ⚙️ CONFIGURATION (FILL THESE IN) ---
 from dotenv import load_dotenv
@@ -17,7 +22,6 @@ load_dotenv()
 BLOCKCHAIN_URL = os.getenv("BLOCKCHAIN_URL", "http://127.0.0.1:7545")
 EMR_API_URL = os.getenv("EMR_API_URL", "http://localhost:8000/api/v1")
 
-# 1. PASTE YOUR NEW CONTRACT ADDRESS HERE
 # 1. PASTE YOUR NEW CONTRACT ADDRESS HERE
 CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
 
@@ -25,43 +29,67 @@ CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
 PRIVATE_KEY = os.getenv("GATEWAY_PRIVATE_KEY")
 
 # 3. SESSION WALLET (Privacy Mode)
-# 3. SESSION WALLET (Fixed Demo Account - Index 3)
+# Fixed Demo Account (Index 3) - used by the first sensor that has no entry in the device map.
+# Every other unmapped sensor gets a fresh session wallet.
 SESSION_PATIENT_ADDRESS = os.getenv("SESSION_PATIENT_ADDRESS")
 SESSION_PATIENT_KEY = os.getenv("SESSION_PATIENT_KEY")
 
+# 4. DEVICE MAP (Sensor -> Patient), see devices.load_device_map
+DEVICE_MAP_PATH = os.getenv("GATEWAY_DEVICE_MAP", os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json"))
+
 print(f"🔒 PRIVACY MODE ACTIVE: {SESSION_PATIENT_ADDRESS}")
 
 # BATCH CONFIG
 BATCH_SIZE_LIMIT = 50       # Upload after 50 readings
 BATCH_TIME_LIMIT = 100       # Upload every 10 seconds if data exists
+
+# PIPELINE CONFIG
+READING_QUEUE_SIZE = int(os.getenv("GATEWAY_READING_QUEUE_SIZE", "1000"))  # Readings buffered between readers and batcher
+BATCH_QUEUE_SIZE = int(os.getenv("GATEWAY_BATCH_QUEUE_SIZE", "8"))         # Batches waiting for an upload worker
+UPLOAD_WORKERS = int(os.getenv("GATEWAY_UPLOAD_WORKERS", "2"))
+METRICS_PORT = int(os.getenv("GATEWAY_METRICS_PORT", "0"))                 # 0 = metrics endpoint disabled
+
+# MULTI-DEVICE CONFIG
+MAX_DEVICES = int(os.getenv("GATEWAY_MAX_DEVICES", "64"))
+SCAN_INTERVAL = float(os.getenv("GATEWAY_SCAN_INTERVAL", "5"))              # Seconds between hot-plug scans
+
+# ALERT CONFIG (rule engine, see alerts.py; JSON list of rules overrides alerts.DEFAULT_RULES)
+ALERT_RULES_PATH = os.getenv("GATEWAY_ALERT_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "alert_rules.json"))
+
+# INPUT CONFIG (sources.py): serial | pty | replay | synthetic -> no hardware needed for the last three
+SOURCE = os.getenv("GATEWAY_SOURCE", "serial")
+SOURCE_DEVICES = int(os.getenv("GATEWAY_SOURCE_DEVICES", "10"))                # pty / synthetic sensors
+SOURCE_RATE = float(os.getenv("GATEWAY_SOURCE_RATE", "100"))                   # readings/s per virtual sensor (hardware: 1)
+REPLAY_FILES = os.getenv("GATEWAY_REPLAY_FILES", "batch_*.json")
+REPLAY_SPEED = float(os.getenv("GATEWAY_REPLAY_SPEED", "100"))                 # x real time
+REPLAY_LOOP = os.getenv("GATEWAY_REPLAY_LOOP", "1") == "1"
+
+# DURABILITY CONFIG (per-sensor append-only segment log, see segment_log.py)
+LOG_DIR = os.getenv("GATEWAY_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "segments"))
+LOG_OPTIONS = {
+    "segment_bytes": int(os.getenv("GATEWAY_LOG_SEGMENT_BYTES", str(4 * 1024 * 1024))),
+    "fsync_every": int(os.getenv("GATEWAY_LOG_FSYNC_EVERY", "100")),          # Group commit: fsync every N readings...
+    "fsync_interval": float(os.getenv("GATEWAY_LOG_FSYNC_INTERVAL", "0.5")),  # ...or after this many seconds
+    "use_mmap": os.getenv("GATEWAY_LOG_MMAP", "0") == "1",                    # mmap segments when replaying
+}
 # ----------------------------------------
 
-# Global Patient ID (fetched from EMR)
-PATIENT_ID = None
+# Pooled keep-alive client shared by the upload workers (retries, gzip, circuit breaker)
+emr = EMRClient(EMR_API_URL)
 
-def sync_patient():
-    global PATIENT_ID
-    print(f"🔄 Syncing Patient {SESSION_PATIENT_ADDRESS} with EMR...")
+def sync_patient(device):
+    print(f"🔄 Syncing Patient {device.wallet_address} with EMR...")
     try:
         # Check if exists
-        resp = requests.get(f"{EMR_API_URL}/patients/by-wallet/{SESSION_PATIENT_ADDRESS}")
-        if resp.status_code == 200:
-            PATIENT_ID = resp.json()['id']
-            print(f"   ✅ Patient Found! ID: {PATIENT_ID}")
+        patient = emr.get_patient_by_wallet(device.wallet_address)
+        if patient:
+            device.patient_id = patient['id']
+            print(f"   ✅ Patient Found! ID: {device.patient_id}")
         else:
             # Create
             print(f"   ⚠️ Patient not found. Registering...")
-            new_patient = {
-                "name": "Subir Nath Bhowmik", # Placeholder
-                "age": 30,
-                "wallet_address": SESSION_PATIENT_ADDRESS
-            }
-            create_resp = requests.post(f"{EMR_API_URL}/patients/", json=new_patient)
-            if create_resp.status_code == 200:
-                PATIENT_ID = create_resp.json()['id']
-                print(f"   ✅ Patient Registered! ID: {PATIENT_ID}")
-            else:
-                print(f"   ❌ Failed to register patient: {create_resp.text}")
+            device.patient_id = emr.create_patient(device.name, device.age, device.wallet_address)['id']
+            print(f"   ✅ Patient Registered! ID: {device.patient_id}")
     except Exception as e:
         print(f"   ⚠️ EMR Sync Failed (System Offline): {e}")
 
@@ -85,193 +113,141 @@ except FileNotFoundError:
     exit()
 
 contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+# Newer artifacts store the Merkle root as raw bytes32 (2 storage slots per record instead of a 64-char string)
+HASH_IS_BYTES32 = any(
+    item.get("name") == "addRecord" and item["inputs"][1]["type"] == "bytes32" for item in abi
+)
 gateway_account = w3.eth.account.from_key(PRIVATE_KEY)
 
+# Local nonce allocation: no get_transaction_count round trip per transaction
+nonces = NonceManager(w3)
+
 # 3. Authorize Handshake (Patient authorizes Gateway) - FUNDING NEEDED
 # Note: In a real mainnet, the patient needs ETH to pay for gas to authorize.
 # On Ganache, we can send them some ETH from the Gateway first.
-def authorize_handshake():
-    print("🤝 Initiating Secure Handshake...")
-    try:
-        # A. Fund the Patient (Mocking 'Gas Station')
-        print(f"   💸 Funding Patient session wallet...")
-        tx_fund = {
-            'to': SESSION_PATIENT_ADDRESS,
-            'value': w3.to_wei(1, 'ether'),
-            'gas': 21000,
-            'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(gateway_account.address),
-            'chainId': 1337
-        }
-        signed_fund = w3.eth.account.sign_transaction(tx_fund, PRIVATE_KEY)
-        w3.eth.send_raw_transaction(signed_fund.raw_transaction)
-        print("   ✅ Patient Funded.")
-        time.sleep(1) # Wait for mining
-
-        # B. Patient calls authorizeDevice(Gateway)
-        print(f"   🔑 Authorizing Device {gateway_account.address}...")
-        tx_auth = contract.functions.authorizeDevice(gateway_account.address).build_transaction({
-            'from': SESSION_PATIENT_ADDRESS,
-            'gas': 2000000,
-            'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(SESSION_PATIENT_ADDRESS),
-            'chainId': 1337
-        })
-        signed_auth = w3.eth.account.sign_transaction(tx_auth, SESSION_PATIENT_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed_auth.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        print("   ✅ Device Authorized! Secure Link Established.")
-        
-    except Exception as e:
-        print(f"   ❌ Handshake Failed: {e}")
-        exit()
-
-authorize_handshake()
-
-# 3. Auto-Detect Arduino
-def find_arduino():
-    ports = list(serial.tools.list_ports.comports())
-    for p in ports:
-        # Common names for Arduino on different OS
-        if any(x in p.description for x in ["Arduino", "CH340", "USB Serial", "usbmodem", "ttyACM"]):
-            return p.device
-    return None
-
-arduino_port = find_arduino()
-if arduino_port:
-    print(f"✅ Found Arduino on {arduino_port}")
-    ser = serial.Serial(arduino_port, 9600, timeout=1)
-    ser.reset_input_buffer()
-else:
-    print("❌ Arduino not found! Plug it in and check connection.")
-    # For testing without hardware, you might want to comment out the exit() and simulate data
-    exit()
-
-# Data Management
-data_buffer = []
-last_upload_time = time.time()
+def authorize_handshake(device):
+    print(f"🤝 Initiating Secure Handshake for {device.key}...")
+    # A. Fund the Patient (Mocking 'Gas Station')
+    print(f"   💸 Funding Patient session wallet...")
+    fund_hash = nonces.send_transaction(PRIVATE_KEY, lambda nonce: {
+        'to': device.wallet_address,
+        'value': w3.to_wei(1, 'ether'),
+        'gas': 21000,
+        'gasPrice': w3.to_wei('20', 'gwei'),
+        'nonce': nonce,
+        'chainId': 1337
+    })
+    w3.eth.wait_for_transaction_receipt(fund_hash) # Wait for mining
+    print("   ✅ Patient Funded.")
+
+    # B. Patient calls authorizeDevice(Gateway)
+    print(f"   🔑 Authorizing Device {gateway_account.address}...")
+    tx_hash = nonces.send_transaction(device.private_key, lambda nonce: contract.functions.authorizeDevice(gateway_account.address).build_transaction({
+        'from': device.wallet_address,
+        'gas': 2000000,
+        'gasPrice': w3.to_wei('20', 'gwei'),
+        'nonce': nonce,
+        'chainId': 1337
+    }))
+    w3.eth.wait_for_transaction_receipt(tx_hash)
+    print("   ✅ Device Authorized! Secure Link Established.")
+
+def ensure_device_ready(device):
+    """Lazy per-sensor onboarding (handshake + EMR registration) on its first upload."""
+    with device.lock:
+        if not device.ready:
+            try:
+                authorize_handshake(device)
+                device.ready = True
+            except Exception as e:
+                print(f"   ❌ Handshake Failed: {e}")
+        if not device.patient_id:
+            sync_patient(device)
+
+def upload_and_mint(device, batch_data, reason):
+    print(f"\n🚀 TRIGGER [{device.key}]: {reason} [{len(batch_data)} records]")
 
-def upload_and_mint(batch_data, reason):
-    print(f"\n🚀 TRIGGER: {reason} [{len(batch_data)} records]")
-    
     if not batch_data:
         return
 
+    ensure_device_ready(device)
+
     # A. Calculate Real Cryptographic Hash (Integrity Proof)
-    # We sign the specific data point that triggered the event (the last one)
-    target_record = batch_data[-1] 
-    
-    # Format: "BPM-TIMESTAMP" (Simple deterministic format for demo)
-    # in production, this would be the hash of the PDF file or entire dataset
-    integrity_payload = f"{target_record.get('bpm')}-{target_record.get('timestamp')}"
-    ipfs_hash = hashlib.sha256(integrity_payload.encode()).hexdigest()
-    
-    print(f"   🔐 Generating Proof for: '{integrity_payload}'")
+    # Every reading becomes a Merkle leaf; only the root goes on-chain.
+    # The EMR stores each reading's inclusion proof so any single one can be verified.
+    # is_critical was set per reading by the alert engine in the batcher
+    leaves = [merkle.vitals_leaf(bpm, spo2, ts, critical) for bpm, spo2, ts, critical in batch_data.rows()]
+    ipfs_hash, _ = merkle.build_tree(leaves)
+
+    print(f"   🔐 Merkle Root over {len(leaves)} readings")
     print(f"   📝 Calculated Hash: 0x{ipfs_hash[:10]}...")
 
-    # B. Create the Batch File (Mocking IPFS Logic)
-    filename = f"batch_{int(time.time())}.json"
-    with open(filename, 'w') as f:
-        json.dump(batch_data, f)
-    print(f"   📦 IPFS Batch Created: {filename}")
+    # B. The readings are already durable in the device's segment log (no batch_*.json needed)
 
     # C. Mint to Blockchain
+    minted = False
     try:
         print("   ⚡ Sending to Blockchain...")
-        tx = contract.functions.addRecord(
-            SESSION_PATIENT_ADDRESS,
-            ipfs_hash, # REAL HASH NOW
+        call = contract.functions.addRecord(
+            device.wallet_address,
+            bytes.fromhex(ipfs_hash) if HASH_IS_BYTES32 else ipfs_hash, # REAL HASH NOW
             reason == "CRITICAL" # True if Critical, False if Routine
-        ).build_transaction({
+        )
+        gas = call.estimate_gas({'from': gateway_account.address}) * 12 // 10
+        tx_hash = nonces.send_transaction(PRIVATE_KEY, lambda nonce: call.build_transaction({
             'chainId': 1337, # Standard Ganache Chain ID
-            'gas': 2000000,
+            'gas': gas,
             'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(gateway_account.address)
-        })
-        
-        signed_tx = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        
+            'nonce': nonce
+        }))
+
+        minted = True
         print(f"   ✅ Transaction Confirmed! Hash: {w3.to_hex(tx_hash)}\n")
     except Exception as e:
         print(f"   ❌ Minting Failed: {e}")
 
     # D. Upload to EMR (SQL DB)
-    global PATIENT_ID
-    if not PATIENT_ID:
-        sync_patient()
-
-    if PATIENT_ID:
-        print("   💾 Syncing to EMR Database...")
-        try:
-             # Sync all records, but attach the blockchain hash to them
-             for reading in batch_data:
-                 vitals_payload = {
-                    "bpm": reading.get('bpm'),
-                    "spo2": reading.get('spo2'),
-                    "is_critical": (reading.get('bpm') > 140), 
-                    "ipfs_hash": ipfs_hash, # Store the hash so we can verify later!
-                    "timestamp": reading.get('timestamp')
-                }
-                 requests.post(f"{EMR_API_URL}/patients/{PATIENT_ID}/vitals/", json=vitals_payload)
-             print(f"   ✅ Synced {len(batch_data)} records to EMR")
-        except Exception as e:
-            print(f"   ❌ EMR Sync Failed: {e}")
-
-    # Cleanup
-    if os.path.exists(filename):
-        os.remove(filename)
-
-# Initial Sync
-sync_patient()
-
-print("🏥 C.A.R.E. System Active. Waiting for vitals...\n")
+    # Raising keeps the batch un-acked in the segment log, so it is retried / replayed
+    if not device.patient_id:
+        raise RuntimeError("EMR patient not registered yet")
+    print("   💾 Syncing to EMR Database...")
+    # Sync all records in ONE request, serialized straight from the buffer columns.
+    # The root goes along only if we minted it: the EMR then checks the chain instead of
+    # anchoring it again; after a failed mint the EMR anchors the batch itself.
+    result = emr.post_vitals_batch(device.patient_id, batch_data.to_json(ipfs_hash if minted else None))
+    print(f"   ✅ Synced {result['count']} records to EMR")
 
 # --- MAIN LOOP ---
-while True:
-    if ser.in_waiting > 0:
-        try:
-            line = ser.readline().decode('utf-8', errors='ignore').rstrip()
-            if line:
-                # print(f"DEBUG: {line}") 
-                try:
-                    data = json.loads(line)
-                    bpm = data.get('bpm', 0)
-                    
-                    # Add to buffer
-                    data['timestamp'] = time.time()
-                    data_buffer.append(data)
-                    
-                    # Visual Feed
-                    if bpm > 140:
-                        print(f"🔴 CRITICAL: {bpm} BPM (Buffer: {len(data_buffer)})")
-                    else:
-                        print(f"🟢 Stable: {bpm} BPM (Buffer: {len(data_buffer)})", end='\r')
-
-                    # LOGIC 1: CRITICAL BYPASS (Instant Mint)
-                    if bpm > 140:
-                        upload_and_mint(data_buffer, "CRITICAL")
-                        data_buffer = [] # Reset
-                        last_upload_time = time.time()
-                    
-                    # LOGIC 2: SIZE LIMIT (Batch Mint)
-                    elif len(data_buffer) >= BATCH_SIZE_LIMIT:
-                        upload_and_mint(data_buffer, "BATCH FULL")
-                        data_buffer = [] # Reset
-                        last_upload_time = time.time()
-
-                except json.JSONDecodeError as je:
-                    print(f"⚠️ JSON Parse Error: {je} | Raw: {line}")
-                    ser.reset_input_buffer() # Flush to re-sync
-                except Exception as e:
-                    print(f"❌ Processing Error: {e}")
-
-        except Exception as e:
-            print(f"❌ Serial/IO Error: {e}")
-
-    # LOGIC 3: TIME SYNC (Routine Mint)
-    # If we have data and it's been >10 seconds, sync it.
-    if len(data_buffer) > 0 and (time.time() - last_upload_time > BATCH_TIME_LIMIT):
-        upload_and_mint(data_buffer, "TIME SYNC")
-        data_buffer = [] # Reset
-        last_upload_time = time.time()
\ No newline at end of file
+# Readers (one per sensor) -> bounded queue -> batcher -> shared upload workers
+pipeline = GatewayPipeline(
+    upload_fn=upload_and_mint,
+    alert_engine=AlertEngine(load_rules(ALERT_RULES_PATH)),
+    batch_size=BATCH_SIZE_LIMIT,
+    batch_time=BATCH_TIME_LIMIT,
+    queue_size=READING_QUEUE_SIZE,
+    batch_queue_size=BATCH_QUEUE_SIZE,
+    upload_workers=UPLOAD_WORKERS
+)
+if METRICS_PORT:
+    start_metrics_server(pipeline.stats, METRICS_PORT)
+
+# 3. Auto-Detect Arduinos (every matching port, rescanned for hot-plug) or virtual sensors
+devices = DeviceManager(
+    pipeline,
+    device_map=load_device_map(DEVICE_MAP_PATH),
+    fallback_wallet=(SESSION_PATIENT_ADDRESS, SESSION_PATIENT_KEY) if SESSION_PATIENT_ADDRESS else None,
+    scan_interval=SCAN_INTERVAL,
+    max_devices=MAX_DEVICES,
+    log_dir=LOG_DIR,
+    log_options=LOG_OPTIONS,
+    source=make_source(SOURCE, devices=SOURCE_DEVICES, rate_hz=SOURCE_RATE, replay_files=REPLAY_FILES,
+                       replay_speed=REPLAY_SPEED, replay_loop=REPLAY_LOOP)
+)
+devices.scan()
+if not devices.connected_count():
+    print(f"⚠️ No Arduino found yet. Plug one in, the gateway rescans every {SCAN_INTERVAL:.0f}s.")
+
+print("🏥 C.A.R.E. System Active. Waiting for vitals...\n")
+pipeline.start()
+devices.start()
+pipeline.run_forever()
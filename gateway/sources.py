@@ -0,0 +1,243 @@
+import glob
+import json
+import os
+import random
+import threading
+import time
+
+import serial
+
+# Pluggable input layer for the gateway. A source discovers ports and opens
+# serial-like objects (`readline()` with a timeout, `reset_input_buffer()`,
+# `close()`), so readers, batching and uploads run unchanged without hardware:
+#
+#   serial     real Arduinos (default)
+#   pty        virtual sensors on pseudo-terminals, read through pyserial like a real port
+#   replay     batch_*.json files played back per device_id at `speed`x real time
+#   synthetic  in-memory generators, cheap enough for thousands of devices
+#
+# Every virtual source writes the exact sensor.ino line protocol.
+
+def sensor_line(bpm: int, spo2: int, device_id: str) -> bytes:
+    """One line exactly as hardware/sensor/sensor.ino prints it (Serial.println -> CRLF)."""
+    return f'{{"bpm":{bpm}, "spo2":{spo2}, "device_id": "{device_id}"}}\r\n'.encode()
+
+class VirtualPort:
+    """Stands in for a pyserial ListPortInfo."""
+
+    def __init__(self, device: str, serial_number: str, description: str):
+        self.device = device
+        self.serial_number = serial_number
+        self.description = description
+
+class VitalsGenerator:
+    """Random-walk vitals with an occasional tachycardia / desaturation episode."""
+
+    def __init__(self, seed=None, episode_rate: float = 0.002):
+        self.rng = random.Random(seed)
+        self.bpm = self.rng.uniform(65, 85)
+        self.spo2 = self.rng.uniform(96, 99)
+        self.episode_rate = episode_rate
+        self.episode = 0
+
+    def next(self):
+        if self.episode <= 0 and self.rng.random() < self.episode_rate:
+            self.episode = self.rng.randint(5, 30)
+        if self.episode > 0:
+            self.episode -= 1
+            target_bpm, target_spo2 = 150, 88
+        else:
+            target_bpm, target_spo2 = 75, 97.5
+        self.bpm += 0.2 * (target_bpm - self.bpm) + self.rng.gauss(0, 2)
+        self.spo2 += 0.2 * (target_spo2 - self.spo2) + self.rng.gauss(0, 0.3)
+        return int(round(self.bpm)), int(round(min(100, self.spo2)))
+
+class Schedule:
+    """Paces (delay, line) pairs from an iterator in real time."""
+
+    def __init__(self, items):
+        self.items = iter(items)
+        self.next_due = time.monotonic()
+        self.pending = None
+        self.exhausted = False
+
+    def wait_next(self, timeout: float):
+        """Next line once it is due, or None after `timeout` (or when exhausted)."""
+        if self.pending is None:
+            item = next(self.items, None)
+            if item is None:
+                self.exhausted = True
+                return None
+            delay, line = item
+            self.next_due += delay
+            self.pending = line
+        wait = self.next_due - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return None
+        if wait > 0:
+            time.sleep(wait)
+        line, self.pending = self.pending, None
+        return line
+
+class VirtualSerial:
+    """Serial-like object fed by a Schedule; `readline()` honours the port timeout."""
+
+    def __init__(self, schedule: Schedule, timeout: float = 1):
+        self.schedule = schedule
+        self.timeout = timeout
+        self.closed = False
+
+    def readline(self) -> bytes:
+        if self.closed:
+            raise serial.SerialException("port closed")
+        line = self.schedule.wait_next(self.timeout)
+        if line is None and self.schedule.exhausted:
+            # Replay ran out: behave like an unplugged sensor
+            raise serial.SerialException("source exhausted")
+        return line or b""
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def synthetic_lines(device_id: str, rate_hz: float, seed=None):
+    gen = VitalsGenerator(seed)
+    interval = 1.0 / rate_hz
+    # Spread devices over the first interval so they do not all fire together
+    yield random.Random(seed).uniform(0, interval), sensor_line(*gen.next(), device_id)
+    while True:
+        yield interval, sensor_line(*gen.next(), device_id)
+
+def replay_lines(readings, device_id: str, speed: float, loop: bool):
+    while True:
+        previous = None
+        for r in readings:
+            delay = 0.0 if previous is None else max(0.0, (r["timestamp"] - previous) / speed)
+            previous = r["timestamp"]
+            yield delay, sensor_line(int(r["bpm"]), int(r["spo2"]), device_id)
+        if not loop:
+            return
+
+class SerialSource:
+    """Real hardware (the previous behaviour)."""
+
+    name = "serial"
+
+    def ports(self):
+        from devices import find_arduinos
+        return find_arduinos()
+
+    def open(self, port, baudrate: int):
+        return serial.Serial(port.device, baudrate, timeout=1)
+
+class SyntheticSource:
+    """`devices` in-memory sensors at `rate_hz` each (the real sensor sends 1 Hz)."""
+
+    name = "synthetic"
+
+    def __init__(self, devices: int = 10, rate_hz: float = 100, seed: int = 0):
+        self.rate_hz = rate_hz
+        self.seed = seed
+        self._ports = [
+            VirtualPort(f"synthetic://{i}", f"SYN_{i:05d}", "Synthetic sensor")
+            for i in range(devices)
+        ]
+
+    def ports(self):
+        return self._ports
+
+    def open(self, port, baudrate: int):
+        index = self._ports.index(port)
+        return VirtualSerial(Schedule(synthetic_lines(port.serial_number, self.rate_hz, self.seed + index)))
+
+class ReplaySource:
+    """One virtual sensor per device_id found in the batch files, played back at `speed`x."""
+
+    name = "replay"
+
+    def __init__(self, pattern: str = "batch_*.json", speed: float = 100, loop: bool = True):
+        self.speed = speed
+        self.loop = loop
+        streams = {}
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "r") as f:
+                for r in json.load(f):
+                    streams.setdefault(r.get("device_id", "SENSOR_001"), []).append(r)
+        if not streams:
+            raise FileNotFoundError(f"no replay files match {pattern}")
+        self.streams = {k: sorted(v, key=lambda r: r["timestamp"]) for k, v in streams.items()}
+        self._ports = {
+            key: VirtualPort(f"replay://{key}", f"REPLAY_{key}", f"Replay of {key}")
+            for key in self.streams
+        }
+        self._opened = set()
+
+    def ports(self):
+        # Without looping a finished stream is not offered again (no re-plug)
+        return [p for key, p in self._ports.items() if self.loop or key not in self._opened]
+
+    def open(self, port, baudrate: int):
+        key = port.serial_number[len("REPLAY_"):]
+        self._opened.add(key)
+        return VirtualSerial(Schedule(replay_lines(self.streams[key], key, self.speed, self.loop)))
+
+class PtySource:
+    """
+    Virtual sensors on pseudo-terminals (POSIX only). A writer thread per sensor
+    writes sensor.ino lines to the master side; the gateway opens the slave
+    side with pyserial exactly like a USB port, so parsing and serial I/O are
+    exercised end to end.
+    """
+
+    name = "pty"
+
+    def __init__(self, devices: int = 1, rate_hz: float = 100, seed: int = 0):
+        import tty # fails early on platforms without pseudo-terminals
+        self.rate_hz = rate_hz
+        self.seed = seed
+        self.stop_event = threading.Event()
+        self._ports = []
+        for i in range(devices):
+            master, slave = os.openpty()
+            tty.setraw(slave) # no echo / line editing, bytes pass through like a USB CDC port
+            path = os.ttyname(slave)
+            key = f"PTY_{i:05d}"
+            self._ports.append(VirtualPort(path, key, "Virtual sensor (pty)"))
+            threading.Thread(target=self._write, args=(master, slave, key, i), name=f"pty-{key}", daemon=True).start()
+
+    def _write(self, master: int, slave: int, key: str, index: int):
+        schedule = Schedule(synthetic_lines(key, self.rate_hz, self.seed + index))
+        try:
+            while not self.stop_event.is_set():
+                line = schedule.wait_next(0.5)
+                if line:
+                    os.write(master, line)
+        except OSError:
+            pass # reader side gone
+        finally:
+            os.close(master)
+            os.close(slave)
+
+    def ports(self):
+        return self._ports
+
+    def open(self, port, baudrate: int):
+        return serial.Serial(port.device, baudrate, timeout=1)
+
+    def stop(self):
+        self.stop_event.set()
+
+def make_source(kind: str = "serial", devices: int = 10, rate_hz: float = 100,
+                replay_files: str = "batch_*.json", replay_speed: float = 100, replay_loop: bool = True):
+    if kind == "serial":
+        return SerialSource()
+    if kind == "synthetic":
+        return SyntheticSource(devices, rate_hz)
+    if kind == "pty":
+        return PtySource(devices, rate_hz)
+    if kind == "replay":
+        return ReplaySource(replay_files, replay_speed, replay_loop)
+    raise ValueError(f"unknown gateway source '{kind}' (serial, pty, replay, synthetic)")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Gateway modules are imported flat (as service.py runs them from gateway/)
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GATEWAY_DIR)
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from alerts import AlertEngine, RingBuffer, Rule, load_rules
+
+def window(bpms, start: float = 1000.0, spo2: int = 98):
+    return [{"bpm": b, "spo2": spo2, "timestamp": start + i} for i, b in enumerate(bpms)]
+
+def tachycardia(**kwargs):
+    spec = dict(name="tachycardia", field="bpm", op=">", threshold=140, hysteresis=10, debounce=3, clear_after=2)
+    return Rule(**dict(spec, **kwargs))
+
+def test_debounce_ignores_short_spikes():
+    engine = AlertEngine(rules=[tachycardia()])
+    result = engine.evaluate("dev", window([80, 150, 150, 80, 150, 80]))
+    assert result.raised == [] and not result.raised_critical
+    assert not result.critical.any()
+
+def test_raises_after_debounce_consecutive_readings():
+    engine = AlertEngine(rules=[tachycardia()])
+    result = engine.evaluate("dev", window([80, 150, 150, 150, 155]))
+    assert [(name, ts) for name, ts, _ in result.raised] == [("tachycardia", 1003.0)]
+    assert result.raised_at == {3}
+    assert result.critical.tolist() == [False, False, False, True, True]
+    assert result.active[4] == ["tachycardia"]
+
+def test_debounce_carries_across_windows():
+    engine = AlertEngine(rules=[tachycardia()])
+    assert engine.evaluate("dev", window([150, 150], start=1000)).raised == []
+    result = engine.evaluate("dev", window([150], start=1002))
+    assert result.raised_at == {0}
+
+def test_hysteresis_keeps_the_alert_until_clearly_back():
+    engine = AlertEngine(rules=[tachycardia()])
+    engine.evaluate("dev", window([150, 150, 150]))
+
+    # Below the threshold but inside the hysteresis band (131-140): still active, not re-raised
+    result = engine.evaluate("dev", window([135, 132, 138, 131], start=1003))
+    assert result.cleared == [] and result.raised == []
+    assert result.critical.all()
+
+    # Two readings at or below 130 clear it
+    result = engine.evaluate("dev", window([130, 120, 80], start=1007))
+    assert [(name, ts) for name, ts, _ in result.cleared] == [("tachycardia", 1008.0)]
+    assert result.critical.tolist() == [True, False, False]
+
+def test_a_long_episode_flushes_once():
+    engine = AlertEngine(rules=[tachycardia()])
+    flushes = 0
+    for start in range(1000, 1100, 10):
+        flushes += len(engine.evaluate("dev", window([160] * 10, start=start)).raised_at)
+    assert flushes == 1
+    assert engine.snapshot()["dev"]["tachycardia"] == {"active": True, "raised": 1}
+
+def test_devices_are_independent():
+    engine = AlertEngine(rules=[tachycardia(debounce=1)])
+    assert engine.evaluate("a", window([160])).raised_critical
+    assert not engine.evaluate("b", window([80])).raised_critical
+    assert engine.evaluate("a", window([160], start=1001)).critical.tolist() == [True]
+
+def test_invalid_readings_do_not_alert():
+    bradycardia = Rule("bradycardia", "bpm", "<", 40, debounce=1)
+    engine = AlertEngine(rules=[bradycardia])
+    result = engine.evaluate("dev", window([0, 0, 0])) # finger off the probe
+    assert result.raised == [] and not result.critical.any()
+
+def test_rolling_mean_rule():
+    sustained = Rule("sustained", "bpm", ">", 120, kind="mean", window=5, debounce=1, clear_after=1)
+    engine = AlertEngine(rules=[sustained])
+    result = engine.evaluate("dev", window([100, 100, 100, 160, 160, 160]))
+    # means over the last 5 s: 100, 100, 100, 115, 124, 136
+    assert result.raised_at == {4}
+
+def test_non_critical_rules_do_not_flush():
+    engine = AlertEngine(rules=[tachycardia(debounce=1, critical=False)])
+    result = engine.evaluate("dev", window([160]))
+    assert [name for name, _, _ in result.raised] == ["tachycardia"]
+    assert not result.raised_critical and not result.critical.any()
+
+def test_default_rules_load():
+    assert {rule.name for rule in load_rules()} >= {"tachycardia", "bradycardia", "hypoxemia"}
+    with pytest.raises(ValueError):
+        Rule("bad", "bpm", "!=", 1)
+
+def test_ring_buffer_keeps_the_newest_readings():
+    ring = RingBuffer(capacity=4)
+    for start in range(0, 10, 3):
+        ts = np.arange(start, start + 3, dtype=float)
+        ring.extend(ts, {"bpm": ts + 100, "spo2": ts})
+    ts, columns = ring.view()
+    assert ts.tolist() == [8.0, 9.0, 10.0, 11.0]
+    assert columns["bpm"].tolist() == [108.0, 109.0, 110.0, 111.0]
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+import batch_format
+from batch_format import BatchFormatError, decode_batch, encode_batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def readings(n: int, start: float = 1767971161.123456):
+    return [{"bpm": 60 + i % 90, "spo2": 90 + i % 10, "timestamp": start + i * 0.37, "is_critical": i % 3 == 0,
+             "device_id": "ESP32-Node-01"} for i in range(n)]
+
+def test_round_trip_is_exact():
+    batch = readings(37) # > 32 readings: the critical bitmap spans several bytes
+    view = decode_batch(encode_batch(batch))
+    assert view.device_id == "ESP32-Node-01"
+    assert view.timestamps() == [r["timestamp"] for r in batch] # bit for bit, not rounded
+    assert view.critical() == [r["is_critical"] for r in batch]
+    assert view.readings() == batch
+
+def test_wide_columns_round_trip():
+    batch = readings(3, start=1.5) + [{"bpm": 300, "spo2": 1000, "timestamp": 1767971161.0, "is_critical": True,
+                                         "device_id": "ESP32-Node-01"}]
+    view = decode_batch(encode_batch(batch))
+    assert view.flags == batch_format.WIDE_BPM | batch_format.WIDE_SPO2 | batch_format.WIDE_TS
+    assert view.readings() == batch
+
+def test_empty_batch():
+    data = encode_batch([], device_id="ESP32-Node-01")
+    view = decode_batch(data)
+    assert len(view) == 0
+    assert view.readings() == [] and view.critical() == [] and view.timestamps() == []
+    assert view.device_id == "ESP32-Node-01"
+
+def test_encoding_is_canonical():
+    batch = readings(5)
+    assert encode_batch(batch) == encode_batch([dict(r) for r in batch])
+    flipped = [dict(r, is_critical=not r["is_critical"]) if i == 4 else r for i, r in enumerate(batch)]
+    assert batch_format.batch_hash(encode_batch(batch)) != batch_format.batch_hash(encode_batch(flipped))
+
+@pytest.mark.parametrize("corrupt", [
+    lambda d: d[:10],                             # truncated
+    lambda d: b"JSON" + d[4:],                    # wrong magic
+    lambda d: d[:4] + bytes([1]) + d[5:],         # old version 1
+    lambda d: d[:20] + bytes([d[20] ^ 1]) + d[21:], # flipped bit -> checksum
+    lambda d: d[:-4] + b"\0" * 4,                 # zeroed trailer
+])
+def test_corrupt_input_is_rejected(corrupt):
+    with pytest.raises(BatchFormatError):
+        decode_batch(corrupt(encode_batch(readings(8))))
+
+def test_invalid_readings_are_rejected():
+    with pytest.raises(BatchFormatError):
+        encode_batch([dict(readings(1)[0], bpm=70000)])
+    with pytest.raises(BatchFormatError):
+        encode_batch([dict(readings(1)[0], timestamp=0)])
+
+def test_repo_batch_files_round_trip():
+    path = os.path.join(ROOT, "batch_1767971161.json")
+    with open(path, "r") as f:
+        batch = json.load(f)
+    view = decode_batch(encode_batch(batch))
+    assert [(r["bpm"], r["spo2"], r["timestamp"]) for r in view.readings()] == \
+        [(r["bpm"], r["spo2"], r["timestamp"]) for r in batch]
+
+def test_numpy_views_share_the_buffer():
+    np = pytest.importorskip("numpy")
+    batch = readings(10)
+    view = decode_batch(encode_batch(batch))
+    columns = view.to_numpy()
+    assert columns["bpm"].tolist() == [r["bpm"] for r in batch]
+    assert np.shares_memory(columns["bpm"], np.frombuffer(view.buffer, dtype=np.uint8))
@@ -0,0 +1,116 @@
+import json
+import queue
+import threading
+import time
+
+from alerts import AlertEngine, Rule
+from devices import Device
+from pipeline import Batcher, GatewayPipeline, PipelineStats, SerialReader
+from reading_buffer import BufferPool
+from segment_log import SegmentLog
+
+class FakeSerial:
+    """Serves sensor lines, then read timeouts (b"") once they run out."""
+
+    def __init__(self, lines, stop_event=None):
+        self.lines = [json.dumps(line).encode() + b"\r\n" if isinstance(line, dict) else line for line in lines]
+        self.stop_event = stop_event
+
+    def readline(self):
+        if self.lines:
+            return self.lines.pop(0)
+        if self.stop_event:
+            self.stop_event.set()
+        return b""
+
+    def reset_input_buffer(self):
+        pass
+
+def device(tmp_path, key="sensor-1"):
+    return Device(key, f"/dev/{key}", 0, "0x0", "0x0", log=SegmentLog(str(tmp_path / key)))
+
+def vitals(n, bpm=75):
+    return [{"bpm": bpm, "spo2": 98, "device_id": "ESP32"} for _ in range(n)]
+
+def batcher(stats, batches, batch_size=4, rules=()):
+    return Batcher(queue.Queue(), batches, stats, threading.Event(), batch_size=batch_size, batch_time=60,
+                   alert_engine=AlertEngine(rules=list(rules)), pool=BufferPool(batch_size))
+
+def test_reader_drops_on_full_queue_and_skips_in_log(tmp_path):
+    dev = device(tmp_path)
+    stop = threading.Event()
+    dev.ser = FakeSerial(vitals(5) + [b"not json\r\n"], stop)
+    readings, stats = queue.Queue(maxsize=3), PipelineStats()
+
+    SerialReader(dev, readings, stats, stop).run()
+
+    assert readings.qsize() == 3
+    assert stats.counters["readings_in"] == 5
+    assert stats.counters["dropped_readings"] == 2 and dev.stats.dropped == 2
+    assert stats.counters["parse_errors"] == 1
+    # Every reading hit the log first; the dropped ones are skipped and do not count as pending
+    assert dev.log.next_offset == 5
+    assert dev.log.pending() == 3
+    assert [readings.get()[2] for _ in range(3)] == [0, 1, 2]
+
+def test_batcher_flushes_full_batches(tmp_path):
+    dev, stats, batches = device(tmp_path), PipelineStats(), queue.Queue()
+    b = batcher(stats, batches, batch_size=4)
+    readings = [dict(r, timestamp=1000.0 + i) for i, r in enumerate(vitals(10))]
+
+    b.add(dev, readings, list(range(10)))
+
+    flushed = [batches.get_nowait() for _ in range(batches.qsize())]
+    assert [(len(batch), offsets, reason) for _, batch, offsets, reason, _, _ in flushed] == [
+        (4, [0, 1, 2, 3], "BATCH FULL"), (4, [4, 5, 6, 7], "BATCH FULL")]
+    assert [r["timestamp"] for r in flushed[1][1].readings()] == [1004.0, 1005.0, 1006.0, 1007.0]
+    assert len(dev.buffer) == 2 # the rest waits for the next batch
+
+def test_batcher_flushes_on_critical_alert(tmp_path):
+    dev, stats, batches = device(tmp_path), PipelineStats(), queue.Queue()
+    rule = Rule("tachycardia", "bpm", ">", 140, debounce=2, clear_after=2)
+    b = batcher(stats, batches, batch_size=50, rules=[rule])
+    readings = [dict(r, timestamp=1000.0 + i) for i, r in enumerate(vitals(3) + vitals(3, bpm=160))]
+
+    b.add(dev, readings, list(range(6)))
+
+    _, batch, offsets, reason, _, _ = batches.get_nowait()
+    assert reason == "CRITICAL" and offsets == [0, 1, 2, 3, 4] # flushed at the 2nd high reading
+    assert [r["is_critical"] for r in batch.readings()] == [False, False, False, False, True]
+    assert stats.counters["alerts_raised"] == 1
+    assert batches.empty() and len(dev.buffer) == 1
+
+def test_full_upload_queue_pushes_back_to_readers(tmp_path):
+    release, uploaded = threading.Event(), []
+
+    def upload(dev, batch, reason):
+        release.wait(10)
+        uploaded.extend(r["bpm"] for r in batch.readings())
+
+    pipeline = GatewayPipeline(upload, AlertEngine(rules=[]), batch_size=2, batch_time=60,
+                               queue_size=4, batch_queue_size=1, upload_workers=1)
+    dev = device(tmp_path)
+    pipeline.stats.devices[dev.key] = dev
+    pipeline.start()
+
+    # With the upload stuck, the batch queue fills, the batcher blocks, and then the reading queue fills
+    accepted = 0
+    while accepted < 100:
+        reading = {"bpm": 60 + accepted, "spo2": 98, "timestamp": 1000.0 + accepted}
+        try:
+            pipeline.readings.put((dev, reading, dev.log.append(reading), time.perf_counter()), timeout=0.2)
+        except queue.Full:
+            dev.log.skip([dev.log.next_offset - 1])
+            break
+        accepted += 1
+    assert accepted < 100 and pipeline.readings.full() and pipeline.batches.full()
+    assert uploaded == []
+
+    # Released, everything accepted drains in order and is acknowledged in the log
+    release.set()
+    deadline = time.time() + 5
+    while not pipeline.readings.empty() and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop() # flushes the partial batch
+    assert uploaded == [60 + i for i in range(accepted)]
+    assert dev.log.pending() == 0
@@ -0,0 +1,71 @@
+import os
+
+from segment_log import SegmentLog
+
+def reading(i: int) -> dict:
+    return {"bpm": 60 + i, "spo2": 98, "timestamp": 1000.0 + i}
+
+def fill(log: SegmentLog, n: int):
+    return [log.append(reading(i)) for i in range(n)]
+
+def segment_files(path) -> list:
+    return sorted(name for name in os.listdir(path) if name.endswith(".seg"))
+
+def test_replays_unacked_readings_after_a_crash(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync_every=1)
+    offsets = fill(log, 10)
+    log.ack(offsets[:3] + offsets[5:7])
+    # Crash: no close(), the process just goes away
+
+    reopened = SegmentLog(str(tmp_path))
+    assert [(o, r["bpm"]) for o, r in reopened.replay()] == [(3, 63), (4, 64), (7, 67), (8, 68), (9, 69)]
+    assert reopened.pending() == 5
+    assert reopened.append(reading(10)) == 10 # offsets continue after the recovered tail
+
+def test_torn_tail_is_truncated(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync_every=1)
+    fill(log, 3)
+    log.close()
+    with open(os.path.join(tmp_path, segment_files(tmp_path)[-1]), "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage") # header of a record that was never fully written
+
+    reopened = SegmentLog(str(tmp_path))
+    assert [o for o, _ in reopened.replay()] == [0, 1, 2]
+    assert reopened.append(reading(3)) == 3
+    reopened.close()
+    assert [o for o, _ in SegmentLog(str(tmp_path)).replay()] == [0, 1, 2, 3]
+
+def test_skipped_readings_count_as_acked(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=200) # a few records per segment
+    offsets = fill(log, 20)
+    assert len(segment_files(tmp_path)) > 2
+
+    # Dropped on overload: skipped, never uploaded
+    log.skip([offsets[4], offsets[11]])
+    assert log.pending() == 18
+    log.ack([o for o in offsets if o not in (4, 11)])
+
+    assert log.committed == 20 and log.pending() == 0
+    assert list(log.replay()) == []
+    assert len(segment_files(tmp_path)) == 1 # compacted past the skipped offsets
+
+def test_gap_below_committed_blocks_compaction_until_skipped(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=200)
+    offsets = fill(log, 20)
+    segments = len(segment_files(tmp_path))
+
+    log.ack(offsets[1:])
+    assert log.committed == 0 and len(segment_files(tmp_path)) == segments
+    log.skip([offsets[0]])
+    assert log.committed == 20 and len(segment_files(tmp_path)) == segments # skip neither persists nor compacts
+    log.ack([offsets[-1]])
+    assert len(segment_files(tmp_path)) == 1
+
+def test_skips_are_not_persisted_before_the_next_ack(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync_every=1)
+    offsets = fill(log, 4)
+    log.ack(offsets[:2])
+    log.skip([offsets[2]])
+    # Crash before any further ack: the skipped reading is replayed, not lost
+
+    assert [o for o, _ in SegmentLog(str(tmp_path)).replay()] == [2, 3]
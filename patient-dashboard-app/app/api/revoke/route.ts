@@ -3,19 +3,20 @@ import { NextResponse } from 'next/server'
 export async function POST(req: Request) {
     try {
         const body = await req.json()
-        const { doctorAddress } = body
+        const { doctorAddress, patientAddress } = body
 
         if (!doctorAddress) {
             return NextResponse.json({ error: 'Missing parameters' }, { status: 400 })
         }
 
         // Proxy to Python Backend
-        // Although schema expects 'doc_ids', we can send empty list as backend revokes ALL by wallet in crud.py
+        // Empty doc_ids revokes every grant the doctor holds on this patient's documents
         const backendRes = await fetch('http://localhost:8000/api/v1/documents/revoke', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 recipient_wallet: doctorAddress,
+                patient_wallet: patientAddress,
                 doc_ids: []
             })
         })
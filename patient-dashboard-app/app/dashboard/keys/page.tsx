@@ -83,7 +83,7 @@ export default function KeysPage() {
       // Call backend to clear granular permissions
       await fetch('/api/revoke', {
         method: 'POST',
-        body: JSON.stringify({ doctorAddress })
+        body: JSON.stringify({ doctorAddress, patientAddress: user.walletAddress })
       });
 
     } catch (e: any) {
@@ -19,6 +19,21 @@ import HealthRecordArtifact from "@/config/HealthRecord.json"
 
 const CONTRACT_ADDRESS = process.env.NEXT_PUBLIC_CONTRACT_ADDRESS || "";
 const GANACHE_URL = process.env.NEXT_PUBLIC_BLOCKCHAIN_URL || "http://127.0.0.1:7545";
+// Records per getRecordsPage call (a whole-history getRecords eventually hits the node's eth_call gas cap)
+const RECORDS_PAGE_SIZE = 100;
+
+// Reads the patient's records page by page; falls back to getRecords for contracts deployed before paging
+const fetchRecords = async (contract: ethers.Contract, patient: string) => {
+    if (!contract.interface.getFunction("getRecordsPage")) {
+        return Array.from(await contract.getRecords(patient));
+    }
+    const records: any[] = [];
+    for (let offset = 0; ; offset += RECORDS_PAGE_SIZE) {
+        const page = await contract.getRecordsPage(patient, offset, RECORDS_PAGE_SIZE);
+        records.push(...page);
+        if (page.length < RECORDS_PAGE_SIZE) return records;
+    }
+}
 
 export default function DashboardPage() {
     const { user, isLoading: authLoading } = useAuth()
@@ -52,8 +67,8 @@ export default function DashboardPage() {
             const contract = getContract();
             const myAddress = user!.walletAddress;
 
-            // 1. Fetch Records from Blockchain
-            const result = await contract.getRecords(myAddress);
+            // 1. Fetch Records from Blockchain, one bounded page at a time
+            const result = await fetchRecords(contract, myAddress);
             const parsedRecords = result.map((r: any) => ({
                 ipfsHash: r.ipfsHash,
                 timestamp: Number(r.timestamp),